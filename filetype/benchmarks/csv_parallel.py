@@ -0,0 +1,64 @@
+"""
+Scaling of the parallel CSV scan (--jobs) with the number of worker processes.
+
+Usage:
+    python benchmarks/csv_parallel.py --rows 2000000 --jobs 1 2 4 8
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from ufh_v2 import CSVHandler
+
+
+def generate(path, rows, seed=0):
+    """
+    Write a synthetic CSV file, including quoted fields with embedded newlines.
+    """
+    rnd = random.Random(seed)
+    with open(path, mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(['id', 'user', 'host', 'message'])
+        for r in range(rows):
+            message = 'line one\nline "two"' if r % 97 == 0 else f'event {rnd.random():.6f}'
+            writer.writerow([r, f'user{rnd.randrange(10000)}', f'host-{rnd.randrange(500)}.example.com', message])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the CSV scan with an increasing number of workers.")
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument('--pattern', default=r'host-42\.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.csv')
+        generate(path, args.rows)
+        size_mb = os.path.getsize(path) / 1e6
+        handler = CSVHandler(path)
+        baseline = None
+        for jobs in sorted(set(args.jobs)):
+            start = time.perf_counter()
+            matches = handler.search_csv(args.pattern, jobs=jobs)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(json.dumps({
+                'jobs': jobs,
+                'seconds': round(elapsed, 3),
+                'rows_per_s': round(args.rows / elapsed),
+                'mb_per_s': round(size_mb / elapsed, 1),
+                'speedup': round(baseline / elapsed, 2),
+                'matches': len(matches),
+            }))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Row engine against vectorized engine (--engine vectorized) on the same files.
+
+For every format and pattern, search_csv / search_ods is run with each engine
+on a synthetic file (see suite.py); the results of the two engines must be
+identical, and the time of each is reported as JSON.
+
+Usage:
+    python benchmarks/engines.py --rows 200000 --cols 8 --formats csv xlsx
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from suite import FORMATS, generate  # noqa: E402
+from ufh_v2 import UniversalHandler  # noqa: E402
+
+PATTERNS = (
+    ('literal', ['v3-17'], False),
+    ('literals', ['v1-7', 'v2-11', 'v5-999'], False),
+    ('ignore_case', ['V4-42'], True),
+    ('regex', [r'v\d-1\d$'], False),
+)
+
+
+def timed_search(path, patterns, ignore_case, engine):
+    from ufh_match import compile_matcher
+    handler = UniversalHandler(path, use_cache=False).handler
+    search = getattr(handler, 'search_ods', None) or handler.search_csv
+    matcher = compile_matcher(patterns, ignore_case=ignore_case)
+    start = time.perf_counter()
+    result = search(matcher, engine=engine)
+    seconds = time.perf_counter() - start
+    if isinstance(result, str):
+        raise RuntimeError(result)
+    return seconds, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the row and vectorized matching engines.")
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--cols', type=int, default=8)
+    parser.add_argument('--cardinality', type=int, default=1000)
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=['csv'])
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        for file_format in args.formats:
+            try:
+                path = generate(tmp, file_format, args.rows, args.cols, args.cardinality)
+            except ImportError as e:
+                print(json.dumps({'format': file_format, 'skipped': str(e)}))
+                continue
+            for name, patterns, ignore_case in PATTERNS:
+                row_seconds, row_result = timed_search(path, patterns, ignore_case, 'row')
+                vector_seconds, vector_result = timed_search(path, patterns, ignore_case, 'vectorized')
+                same = row_result == vector_result
+                failed = failed or not same
+                print(json.dumps({
+                    'format': file_format,
+                    'patterns': name,
+                    'matches': len(row_result),
+                    'row_s': round(row_seconds, 4),
+                    'vectorized_s': round(vector_seconds, 4),
+                    'speedup': round(row_seconds / vector_seconds, 2) if vector_seconds else None,
+                    'identical': same,
+                }), flush=True)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
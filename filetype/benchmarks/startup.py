@@ -0,0 +1,77 @@
+"""
+Start-up cost of a command-line run on a small CSV file, for ufh.py and
+ufh_v2.py.
+
+Each script is run repeatedly on a tiny CSV file and the median wall time of
+the whole process is reported, along with the spreadsheet libraries that a CSV
+search loaded (there should be none).
+
+Usage:
+    python benchmarks/startup.py --runs 20
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+HEAVY_MODULES = ('openpyxl', 'xlrd', 'odf')
+COMMANDS = {
+    'ufh': ['--search', 'x', '--pattern', 'evil'],
+    'ufh_v2': ['--search', 'evil'],
+}
+PROBE = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import {module} as ufh
+imported = time.perf_counter() - start
+ufh.UniversalHandler({path!r}).handler.search_csv('evil')
+print(json.dumps({{'import_s': imported, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def probe(module, path):
+    """
+    Import a script as a module in a fresh interpreter, run a CSV search, and
+    report its import time and the spreadsheet libraries it loaded.
+    """
+    code = PROBE.format(root=ROOT, module=module, path=path, heavy=HEAVY_MODULES)
+    completed = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the start-up of a CSV run of each script.")
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'small.csv')
+        with open(path, mode='w', encoding='utf-8') as file:
+            file.write('name,host\nalice,evil.com\nbob,good.org\n')
+        for module, options in COMMANDS.items():
+            command = [sys.executable, os.path.join(ROOT, f'{module}.py'), path] + options
+            timings = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                subprocess.run(command, stdout=subprocess.DEVNULL, check=True)
+                timings.append(time.perf_counter() - start)
+            found = probe(module, path)
+            print(json.dumps({
+                'script': f'{module}.py',
+                'median_run_s': round(statistics.median(timings), 4),
+                'min_run_s': round(min(timings), 4),
+                'import_s': round(found['import_s'], 4),
+                'spreadsheet_modules_loaded': found['loaded'],
+            }))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+"""
+Throughput and memory of every handler operation, for ufh.py and ufh_v2.py.
+
+Synthetic CSV, XLSX, XLS and ODS files of the requested size and cardinality
+are generated once, then extract_columns, search_csv / search_ods and
+search_column are timed for every implementation and format. Each case runs
+in its own interpreter so that its peak RSS is measured alone.
+
+Results are printed as one JSON object per case and can be saved with
+--output; passing a previous results file as --baseline reports the change in
+time of every case, so regressions between versions can be tracked.
+
+XLS files are written with xlwt and skipped when it is not installed.
+
+Usage:
+    python benchmarks/suite.py --rows 100000 --cols 8 --cardinality 1000 --output results.json
+    python benchmarks/suite.py --rows 100000 --baseline results.json
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+FORMATS = ('csv', 'xlsx', 'xls', 'ods')
+OPERATIONS = ('extract', 'search', 'searchcol')
+# ufh_v2_cached reads spreadsheets from a columnar cache built before timing
+IMPLEMENTATIONS = ('ufh', 'ufh_v2', 'ufh_v2_cached')
+# A slowdown larger than this against the baseline is flagged
+REGRESSION_THRESHOLD = 1.10
+
+
+def make_rows(rows, cols, cardinality, seed=0):
+    """
+    Yield a header row and synthetic data rows: an integer id followed by
+    string columns drawing from `cardinality` distinct values each.
+    """
+    rnd = random.Random(seed)
+    yield [f'col{c}' for c in range(cols)]
+    for r in range(rows):
+        yield [r] + [f'v{c}-{rnd.randrange(cardinality)}' for c in range(1, cols)]
+
+
+def generate_csv(path, rows):
+    with open(path, mode='w', newline='', encoding='utf-8') as file:
+        csv.writer(file).writerows(rows)
+
+
+def generate_xlsx(path, rows):
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+
+
+def generate_xls(path, rows):
+    import xlwt  # Optional; XLS cases are skipped without it
+    wb = xlwt.Workbook()
+    ws = wb.add_sheet('Sheet1')
+    for r, row in enumerate(rows):
+        for c, value in enumerate(row):
+            ws.write(r, c, value)
+    wb.save(path)
+
+
+def generate_ods(path, rows):
+    from ufh_writers import ODSRowWriter
+    with ODSRowWriter(path) as writer:
+        writer.writerows(rows)
+
+
+GENERATORS = {
+    'csv': generate_csv,
+    'xlsx': generate_xlsx,
+    'xls': generate_xls,
+    'ods': generate_ods,
+}
+
+
+def generate(directory, file_format, rows, cols, cardinality, seed=0):
+    """
+    Write a synthetic file in one format.
+
+    Returns:
+        str: The path of the file.
+
+    Raises:
+        ImportError: If the library needed to write the format is missing.
+    """
+    path = os.path.join(directory, f'bench.{file_format}')
+    GENERATORS[file_format](path, make_rows(rows, cols, cardinality, seed))
+    return path
+
+
+def _arguments(implementation, file_format, operation):
+    # Each handler takes columns in its own way: names, letters or indexes
+    if operation == 'extract':
+        if implementation != 'ufh' and file_format != 'csv':
+            return ([0, 1],)
+        return (['col0', 'col1'],)
+    if operation == 'searchcol':
+        if file_format == 'csv' or (implementation == 'ufh' and file_format == 'xls'):
+            return ('col1',)
+        return ('B',) if implementation == 'ufh' else (1,)
+    return ()
+
+
+def _handler(implementation, path):
+    if implementation == 'ufh':
+        from ufh import UniversalHandler
+        return UniversalHandler(path).handler
+    from ufh_v2 import UniversalHandler
+    return UniversalHandler(path, use_cache=implementation == 'ufh_v2_cached').handler
+
+
+def run_case(implementation, path, operation, pattern, out_dir):
+    """
+    Run one operation once and return the number of results.
+    """
+    handler = _handler(implementation, path)
+    file_format = path.rsplit('.', 1)[1]
+    args = _arguments(implementation, file_format, operation)
+    if operation == 'extract':
+        extension = 'xlsx' if implementation == 'ufh' and file_format != 'csv' else 'csv'
+        result = handler.extract_columns(*args, os.path.join(out_dir, f'extract.{extension}'))
+        count = None
+    elif operation == 'search':
+        search = getattr(handler, 'search_ods', None) or handler.search_csv
+        result = search(pattern)
+        count = len(result)
+    else:
+        result = handler.search_column(*args, pattern, output_choice=None)
+        count = len(result)
+    if isinstance(result, str) and result.startswith('Error occurred'):
+        raise RuntimeError(result)
+    return count
+
+
+def measure(implementation, path, operation, pattern, rows, repeat):
+    """
+    Time one case in the current interpreter and print its result as JSON.
+    """
+    # Import the handler (and openpyxl/xlrd) before the clock starts
+    _handler(implementation, path)
+    if implementation == 'ufh_v2_cached':
+        for _ in _handler(implementation, path).iter_rows():
+            pass
+    timings = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            count = run_case(implementation, path, operation, pattern, out_dir)
+            timings.append(time.perf_counter() - start)
+    seconds = min(timings)
+    size_mb = os.path.getsize(path) / 1e6
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        'seconds': round(seconds, 4),
+        'rows_per_s': round(rows / seconds) if seconds else None,
+        'mb_per_s': round(size_mb / seconds, 2) if seconds else None,
+        'peak_rss_mb': round(peak_kb / 1024, 1),
+        'results': count,
+    }))
+
+
+def _supported(implementation, file_format):
+    if implementation == 'ufh' and file_format == 'ods':
+        return "ufh.py has no ODS handler"
+    if implementation == 'ufh_v2_cached' and file_format == 'csv':
+        return "CSV files are not cached"
+    return None
+
+
+def _case_key(case):
+    return case['implementation'], case['format'], case['operation']
+
+
+def _compare(cases, baseline_path):
+    # Annotate the cases with their baseline time and return the baseline parameters
+    with open(baseline_path, mode='r', encoding='utf-8') as file:
+        report = json.load(file)
+    baseline = {_case_key(case): case for case in report['cases']}
+    for case in cases:
+        before = baseline.get(_case_key(case), {}).get('seconds')
+        if before and case.get('seconds'):
+            case['baseline_seconds'] = before
+            case['ratio'] = round(case['seconds'] / before, 3)
+            case['regression'] = case['ratio'] > REGRESSION_THRESHOLD
+    return report.get('parameters')
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every handler operation on synthetic files.")
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--cols', type=int, default=6)
+    parser.add_argument('--cardinality', type=int, default=1000, help='Distinct values per string column')
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=list(FORMATS))
+    parser.add_argument('--operations', nargs='+', choices=OPERATIONS, default=list(OPERATIONS))
+    parser.add_argument('--implementations', nargs='+', choices=IMPLEMENTATIONS, default=list(IMPLEMENTATIONS))
+    parser.add_argument('--pattern', default=r'v1-7$')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per case; the fastest is reported')
+    parser.add_argument('--output', help='Write all results with their parameters to this JSON file')
+    parser.add_argument('--baseline', help='Previous --output file to compare against')
+    parser.add_argument('--case', nargs=4, metavar=('IMPL', 'PATH', 'OP', 'ROWS'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        implementation, path, operation, rows = args.case
+        measure(implementation, path, operation, args.pattern, int(rows), args.repeat)
+        return
+
+    cases = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for file_format in args.formats:
+            directory = os.path.join(tmp, file_format)
+            os.mkdir(directory)
+            try:
+                path = generate(directory, file_format, args.rows, args.cols, args.cardinality)
+            except ImportError as e:
+                path, skipped = None, f"cannot generate {file_format}: {e}"
+            for implementation in args.implementations:
+                for operation in args.operations:
+                    case = {'implementation': implementation, 'format': file_format, 'operation': operation}
+                    reason = skipped if path is None else _supported(implementation, file_format)
+                    if reason:
+                        case['skipped'] = reason
+                    else:
+                        case['mb'] = round(os.path.getsize(path) / 1e6, 2)
+                        command = [sys.executable, os.path.abspath(__file__), '--case', implementation, path,
+                                   operation, str(args.rows), '--pattern', args.pattern, '--repeat', str(args.repeat)]
+                        completed = subprocess.run(command, capture_output=True, text=True)
+                        if completed.returncode == 0:
+                            case.update(json.loads(completed.stdout.strip().splitlines()[-1]))
+                        else:
+                            case['error'] = completed.stderr.strip().splitlines()[-1]
+                    cases.append(case)
+                    print(json.dumps(case), flush=True)
+
+    parameters = {'rows': args.rows, 'cols': args.cols, 'cardinality': args.cardinality,
+                  'pattern': args.pattern, 'repeat': args.repeat}
+    if args.baseline:
+        if _compare(cases, args.baseline) != parameters:
+            print("# the baseline was run with other parameters; times are not comparable")
+        for case in cases:
+            if 'ratio' in case:
+                flag = '  REGRESSION' if case['regression'] else ''
+                print(f"# {case['implementation']} {case['format']} {case['operation']}: "
+                      f"{case['baseline_seconds']}s -> {case['seconds']}s (x{case['ratio']}){flag}")
+    if args.output:
+        report = {
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'parameters': parameters,
+            'cases': cases,
+        }
+        with open(args.output, mode='w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Peak memory of scanning an XLSX file with a full workbook load versus the
+streaming ExcelHandler.iter_rows path.
+
+Each mode runs in its own interpreter so that its peak RSS is measured alone.
+
+Usage:
+    python benchmarks/xlsx_memory.py --rows 200000 --cols 10
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+
+def generate(path, rows, cols):
+    """
+    Write a synthetic XLSX file with a header row and string/number cells.
+    """
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append([f'col{c}' for c in range(cols)])
+    for r in range(rows):
+        ws.append([f'value-{r}-{c}' if c % 2 else r * cols + c for c in range(cols)])
+    wb.save(path)
+
+
+def scan(path, mode):
+    """
+    Scan every cell of the file and report timings and peak RSS as JSON.
+    """
+    import openpyxl
+    from ufh_v2 import ExcelHandler, XLSX
+    start = time.perf_counter()
+    first_row = None
+    cells = 0
+    if mode == 'full':
+        rows = openpyxl.load_workbook(path).active.iter_rows(values_only=True)
+    else:
+        rows = ExcelHandler(path, XLSX).iter_rows()
+    for row in rows:
+        if first_row is None:
+            first_row = time.perf_counter() - start
+        cells += sum(1 for cell in row if 'value-1' in str(cell))
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        'mode': mode,
+        'first_row_s': round(first_row or 0.0, 3),
+        'total_s': round(time.perf_counter() - start, 3),
+        'peak_rss_mb': round(peak_kb / 1024, 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare peak RSS of full and streaming XLSX reads.")
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--cols', type=int, default=10)
+    parser.add_argument('--scan', nargs=2, metavar=('PATH', 'MODE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scan:
+        scan(*args.scan)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.xlsx')
+        generate(path, args.rows, args.cols)
+        print(f"# {args.rows} rows x {args.cols} cols, {os.path.getsize(path) / 1e6:.1f} MB")
+        for mode in ('full', 'stream'):
+            subprocess.run([sys.executable, __file__, '--scan', path, mode], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+A sheet read back from its .ufhcol cache must equal the rows it was built
+from, values and types alike.
+"""
+import datetime
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ufh_cache
+from ufh_cache import SheetCache
+
+
+def random_value(rng):
+    return rng.choice([
+        None,
+        '',
+        'plain',
+        'ünïcødé ✓',
+        'comma, "quote"\nnewline',
+        rng.randint(-10 ** 12, 10 ** 12),
+        rng.uniform(-1e6, 1e6),
+        0.1,
+        rng.random() < 0.5,
+        datetime.datetime(2024, 1, 2, 3, 4, 5, rng.randint(0, 999999)),
+        datetime.date(1999, 12, 31),
+        datetime.time(23, 59, rng.randint(0, 59)),
+    ])
+
+
+def random_rows(seed, rows=500):
+    rng = random.Random(seed)
+    # Ragged rows, and columns that only appear after the first rows
+    return [tuple(random_value(rng) for _ in range(rng.randint(0, 3 + i // 100))) for i in range(rows)]
+
+
+def typed(rows):
+    return [[(type(value), value) for value in row] for row in rows]
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'sheet.xlsx'
+    path.write_bytes(b'source')
+    return str(path)
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('buffer', [ufh_cache.BUILD_BUFFER, 64])
+def test_round_trip(monkeypatch, source, seed, buffer):
+    # A small build buffer spills the arrays in many chunks
+    monkeypatch.setattr(ufh_cache, 'BUILD_BUFFER', buffer)
+    rows = random_rows(seed)
+    cache = SheetCache(source)
+    cache.build(rows)
+    assert cache.is_fresh()
+    assert typed(cache.iter_rows()) == typed(rows)
+    width = max(map(len, rows))
+    for index in range(width + 1):
+        expected = [row[index] if index < len(row) else None for row in rows]
+        assert typed([list(cache.iter_column(index))]) == typed([expected])
+
+
+def test_cached_rows_reads_the_source_once(source):
+    rows = random_rows(0, 50)
+    reads = []
+
+    def read_rows():
+        reads.append(1)
+        return iter(rows)
+
+    cache = SheetCache(source, sheet='Feb 2024/x')
+    assert list(cache.cached_rows(read_rows)) == rows
+    assert typed(cache.cached_rows(read_rows)) == typed(rows)
+    assert len(reads) == 1
+
+    # A changed source makes the cache stale
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert not cache.is_fresh()
+    assert list(cache.cached_rows(read_rows)) == rows
+    assert len(reads) == 2
+
+
+def test_sheet_over_the_size_limit_is_not_cached(source):
+    cache = SheetCache(source, max_mb=0.001)
+    cache.build(random_rows(0))
+    assert not os.path.exists(cache.path)
+    assert not cache.is_fresh()
@@ -0,0 +1,87 @@
+"""
+The byte-level scans of ufh_csvscan must return exactly the rows csv.reader
+returns, whatever the quoting of the file.
+"""
+import csv
+import io
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ufh_csvscan import iter_parallel_column, iter_parallel_rows, iter_prefiltered_column, iter_prefiltered_rows
+from ufh_match import compile_matcher
+
+# Cells as written in the file: stray quotes in unquoted fields, quoted fields
+# with newlines, doubled quotes and delimiters, and a quoted field followed by
+# more text, which csv.reader also accepts
+UNQUOTED = ['a.org', 'evil.com', '12" pipe', 'ev"il', 'x"', 'plain evil', '']
+QUOTED = ['"line\nevil.com"', '"x ""q"" evil"', '"comma, evil"', '""', '"ab"c evil', '"two\r\nlines"']
+PATTERNS = ['evil', 'pipe', 'q"', '.org', 'line']
+
+
+def random_csv(seed, rows=300):
+    rng = random.Random(seed)
+    lines = ['id,desc,host\n']
+    for i in range(rows):
+        if rng.random() < 0.03:
+            lines.append('\n')
+            continue
+        cells = [str(i)] + [rng.choice(QUOTED if rng.random() < 0.4 else UNQUOTED) for _ in range(2)]
+        lines.append(','.join(cells) + rng.choice(['\n', '\n', '\r\n']))
+    return ''.join(lines)
+
+
+def write(tmp_path, text):
+    path = tmp_path / 'data.csv'
+    path.write_bytes(text.encode('utf-8'))
+    return str(path)
+
+
+def reference_rows(text):
+    return list(csv.reader(io.StringIO(text, newline='')))
+
+
+def test_stray_quote_before_a_multiline_field(tmp_path):
+    text = 'id,desc,host\n1,12" pipe,a.org\n2,"line\nevil.com",b.org\n'
+    path = write(tmp_path, text)
+    assert list(iter_prefiltered_rows(path, 'evil')) == [['2', 'line\nevil.com', 'b.org']]
+    assert list(iter_prefiltered_column(path, 'desc', 'evil')) == ['line\nevil.com']
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_prefiltered_rows_match_csv_reader(tmp_path, seed):
+    text = random_csv(seed)
+    path = write(tmp_path, text)
+    rows = reference_rows(text)
+    for pattern in PATTERNS:
+        matcher = compile_matcher(pattern, fixed_strings=True)
+        expected = [row for row in rows if matcher.search_row(row)]
+        assert list(iter_prefiltered_rows(path, matcher)) == expected, pattern
+        values = [row[1] for row in rows[1:] if len(row) > 1 and row[1] and matcher.search(row[1])]
+        assert list(iter_prefiltered_column(path, 'desc', matcher)) == values, pattern
+
+
+@pytest.mark.parametrize('seed', range(6))
+@pytest.mark.parametrize('pattern', ['evil', 'evi[l]', 'q"'])
+def test_parallel_scans_match_csv_reader(tmp_path, seed, pattern):
+    text = random_csv(seed)
+    path = write(tmp_path, text)
+    rows = reference_rows(text)
+    matcher = compile_matcher(pattern)
+    expected = [row for row in rows if matcher.search_row(row)]
+    assert list(iter_parallel_rows(path, matcher, 2, chunk_size=300)) == expected
+    values = {row[1] for row in rows[1:] if len(row) > 1 and row[1] and matcher.search(row[1])}
+    assert set(iter_parallel_column(path, 'desc', matcher, 2, chunk_size=300)) == values
+
+
+def test_split_inside_a_quoted_field(tmp_path):
+    # The quote count puts split points inside the quoted fields after 12" pipe
+    lines = ['id,desc,host\n', '1,12" pipe,a.org\n']
+    lines += [f'{i},"line {i}\nmore",h{i}.org\n' for i in range(2, 200)]
+    text = ''.join(lines)
+    path = write(tmp_path, text)
+    assert list(iter_parallel_rows(path, 'org', 2, chunk_size=300)) == reference_rows(text)[1:]
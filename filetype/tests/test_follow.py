@@ -0,0 +1,48 @@
+import csv
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ufh_follow import Checkpoint
+
+QUERY = {'operation': 'search'}
+
+
+def scan(path, state):
+    checkpoint = Checkpoint(path, QUERY, state)
+    rows = list(checkpoint.new_rows())
+    checkpoint.commit()
+    return rows
+
+
+def test_resumed_scans_read_every_record_once(tmp_path):
+    path = str(tmp_path / 'log.csv')
+    state = str(tmp_path / 'state.json')
+    parts = [
+        'id,desc,host\n1,12" pipe,a.org\n2,"line\nevil.com",b.org\n',
+        # A quoted field still being written is left for the next run
+        '3,plain,c.org\n4,"half',
+        ' done\nhere",d.org\n5,x" y,e.org\n',
+        '6,"a ""b""",f.org\n7,last',
+        '\n',
+    ]
+    seen = []
+    with open(path, mode='w', newline='', encoding='utf-8') as file:
+        for part in parts:
+            file.write(part)
+            file.flush()
+            seen += scan(path, state)
+    text = ''.join(parts)
+    assert seen == list(csv.reader(io.StringIO(text, newline='')))[1:]
+    assert scan(path, state) == []
+
+
+def test_header_with_a_stray_quote(tmp_path):
+    path = str(tmp_path / 'log.csv')
+    with open(path, mode='w', newline='', encoding='utf-8') as file:
+        file.write('id,pipe 12",host\n1,"two\nlines",a.org\n')
+    checkpoint = Checkpoint(path, QUERY, str(tmp_path / 'state.json'))
+    assert list(checkpoint.new_rows()) == [['1', 'two\nlines', 'a.org']]
+    assert checkpoint.header == ['id', 'pipe 12"', 'host']
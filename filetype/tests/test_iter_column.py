@@ -0,0 +1,68 @@
+"""
+iter_column feeds unique values, counts and column indexes, so it must give
+the same values for every format: the cells below the header row.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ufh_v2 import open_handler
+from ufh_writers import open_row_writer
+
+ROWS = [
+    ['id', 'host'],
+    [1, 'a.org'],
+    [2, 'b.org'],
+    [3, 'a.org'],
+]
+
+
+@pytest.fixture(params=['csv', 'xlsx', 'ods'])
+def sheet(request, tmp_path):
+    if request.param == 'xlsx':
+        pytest.importorskip('openpyxl')
+    filename = str(tmp_path / f'hosts.{request.param}')
+    with open_row_writer(filename) as writer:
+        writer.writerows(ROWS)
+    return filename
+
+
+@pytest.mark.parametrize('use_cache', [False, True])
+def test_iter_column_skips_the_header_row(sheet, tmp_path, use_cache):
+    handler = open_handler(sheet, cache_dir=str(tmp_path), use_cache=use_cache)
+    assert list(handler.iter_column('host')) == ['a.org', 'b.org', 'a.org']
+
+
+def test_unique_and_counts_leave_out_the_header(sheet, tmp_path):
+    handler = open_handler(sheet, cache_dir=str(tmp_path))
+    with handler.unique_values('host', '.') as unique:
+        assert list(unique) == ['a.org', 'b.org']
+    assert [row[0] for row in handler.count_values('host').most_common()] == ['a.org', 'b.org']
+
+
+def test_empty_cells_are_none(tmp_path):
+    pytest.importorskip('openpyxl')
+    filename = str(tmp_path / 'notes.xlsx')
+    with open_row_writer(filename) as writer:
+        writer.writerows([['id', 'note'], [1, 'on call'], [2, None], [3, 4.5]])
+    handler = open_handler(filename, use_cache=False)
+    assert list(handler.iter_column('note')) == ['on call', None, '4.5']
+    assert list(handler.iter_values('note', 'o|None')) == ['on call']
+    assert handler.count_values('note').most_common() == [('4.5', 1), ('on call', 1)]
+
+
+@pytest.mark.parametrize('extension', ['csv', 'xlsx', 'ods'])
+def test_empty_cells_are_the_same_in_every_format(tmp_path, extension):
+    if extension == 'xlsx':
+        pytest.importorskip('openpyxl')
+    filename = str(tmp_path / f'notes.{extension}')
+    with open_row_writer(filename) as writer:
+        writer.writerows([['id', 'note'], [1, 'on call'], [2, None], [3, ''], [4, 'on call'], [5]])
+    handler = open_handler(filename, use_cache=False)
+    assert list(handler.iter_column('note')) == ['on call', None, None, 'on call', None]
+    assert handler.count_values('note').most_common() == [('on call', 2)]
+    with handler.unique_values('note', '^$|on') as unique:
+        assert list(unique) == ['on call']
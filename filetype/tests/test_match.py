@@ -0,0 +1,102 @@
+"""
+The Matcher must find what `in` and re.search find, cell by cell, whichever of
+its paths (alternation, Aho-Corasick automaton, merged regexes) it takes.
+"""
+import os
+import random
+import re
+import sys
+from collections import Counter
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ufh_match
+from ufh_match import LITERAL_ALTERNATION_LIMIT, AhoCorasick, Matcher
+
+ALPHABET = 'abcAB.'
+
+
+@pytest.fixture(autouse=True)
+def pure_python(monkeypatch):
+    # The optional C automaton, when installed, would hide the Python one
+    monkeypatch.setattr(ufh_match, 'ahocorasick', None)
+
+
+def random_words(rng, n, max_length=4):
+    return [''.join(rng.choice(ALPHABET) for _ in range(rng.randint(1, max_length))) for _ in range(n)]
+
+
+def random_rows(rng, n=200):
+    rows = []
+    for _ in range(n):
+        row = random_words(rng, rng.randint(1, 4), 8)
+        if rng.random() < 0.2:
+            row.append(rng.randint(0, 99))
+        rows.append(row)
+    return rows
+
+
+def reference_hits(patterns, row, fixed_strings=False, ignore_case=False):
+    cells = [str(cell) for cell in row]
+    found = []
+    for pattern in patterns:
+        if fixed_strings or ufh_match.is_literal(pattern):
+            if ignore_case:
+                hit = any(pattern.lower() in cell.lower() for cell in cells)
+            else:
+                hit = any(pattern in cell for cell in cells)
+        else:
+            hit = any(re.search(pattern, cell, re.IGNORECASE if ignore_case else 0) for cell in cells)
+        if hit:
+            found.append(pattern)
+    return found
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_automaton_finds_every_occurrence(seed):
+    rng = random.Random(seed)
+    words = random_words(rng, 40)
+    automaton = AhoCorasick(words)
+    for text in random_words(rng, 50, 30):
+        expected = Counter(i for i, word in enumerate(words)
+                           for start in range(len(text)) if text.startswith(word, start))
+        assert Counter(automaton.iter_hits(text)) == expected
+        assert automaton.search(text) == bool(expected)
+
+
+CASES = [
+    # (number of literals, regexes, fixed_strings, ignore_case)
+    (3, [], False, False),
+    (3, [], False, True),
+    (LITERAL_ALTERNATION_LIMIT + 8, [], False, False),
+    (LITERAL_ALTERNATION_LIMIT + 8, [], False, True),
+    (2, ['a.c', 'B+a', r'(a)\1'], False, False),
+    (LITERAL_ALTERNATION_LIMIT + 8, ['^ab', 'c$'], False, True),
+    (5, ['a.', 'b.c'], True, False),
+]
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('literals, regexes, fixed_strings, ignore_case', CASES)
+def test_matcher_agrees_with_reference(seed, literals, regexes, fixed_strings, ignore_case):
+    rng = random.Random(seed)
+    patterns = [word.replace('.', 'a') for word in random_words(rng, literals)] + regexes
+    matcher = Matcher(patterns, fixed_strings=fixed_strings, ignore_case=ignore_case)
+    rows = random_rows(rng)
+    expected = [reference_hits(patterns, row, fixed_strings, ignore_case) for row in rows]
+
+    assert [matcher.row_hits(row) for row in rows] == expected
+    assert [matcher.search_row(row) for row in rows] == [bool(hits) for hits in expected]
+    assert matcher.matching_rows(rows) == {i for i, hits in enumerate(expected) if hits}
+    for row in rows:
+        for cell in row:
+            cell = str(cell)
+            assert matcher.search(cell) == bool(reference_hits(patterns, [cell], fixed_strings, ignore_case))
+
+
+def test_literals_do_not_span_cells():
+    matcher = Matcher(['ab'])
+    assert not matcher.search_row(['xa', 'bx'])
+    assert matcher.matching_rows([['xa', 'bx'], ['a', 'ab']]) == {1}
@@ -0,0 +1,91 @@
+"""
+The query modes of ufh_query must answer as a plain list of the results
+would, read no further than they need, and sample uniformly.
+"""
+import os
+import sys
+from collections import Counter
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ufh_query import any_result, count_results, reservoir_sample, take
+
+
+class Results:
+    # A stream of results that records how far it was read and its closing
+    def __init__(self, n):
+        self.n = n
+        self.read = 0
+        self.closed = False
+
+    def __iter__(self):
+        return self._generate()
+
+    def _generate(self):
+        try:
+            for i in range(self.n):
+                self.read += 1
+                yield i
+        finally:
+            self.closed = True
+
+
+@pytest.mark.parametrize('n', [0, 1, 5, 50])
+@pytest.mark.parametrize('limit', [0, 1, 5, 100])
+def test_take_reads_no_further(n, limit):
+    results = Results(n)
+    assert list(take(iter(results), limit)) == list(range(n))[:limit]
+    assert results.read == min(n, limit)
+    assert results.closed or results.read == 0
+
+
+@pytest.mark.parametrize('n', [0, 1, 50])
+def test_any_and_count(n):
+    results = Results(n)
+    assert any_result(iter(results)) == (n > 0)
+    assert results.read == min(n, 1)
+    assert results.closed or n == 0
+    assert count_results(iter(Results(n))) == n
+
+
+@pytest.mark.parametrize('n, k', [(0, 3), (2, 3), (3, 3), (10, 0), (10, -1)])
+def test_small_samples_keep_everything(n, k):
+    expected = list(range(n)) if k > 0 else []
+    assert reservoir_sample(range(n), k) == expected
+
+
+def test_sample_is_reproducible_and_in_order():
+    sample = reservoir_sample(range(10000), 50, seed=7)
+    assert sample == reservoir_sample(iter(range(10000)), 50, seed=7)
+    assert len(sample) == len(set(sample)) == 50
+    assert sample == sorted(sample)
+    assert set(sample) <= set(range(10000))
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_sample_keeps_the_order_of_the_results(seed):
+    results = [f'row {i}' for i in reversed(range(60))]
+    sample = reservoir_sample(results, 10, seed=seed)
+    assert sample == [result for result in results if result in sample]
+
+
+@pytest.mark.parametrize('n, k', [(20, 5), (1000, 3)])
+def test_sample_is_uniform(n, k):
+    # Every result is drawn with probability k / n; with many trials the
+    # observed frequency stays within five standard deviations of it
+    trials = 4000
+    hits = Counter()
+    for seed in range(trials):
+        hits.update(reservoir_sample(range(n), k, seed=seed))
+    p = k / n
+    tolerance = 5 * (p * (1 - p) / trials) ** 0.5
+    if n <= 20:
+        for i in range(n):
+            assert abs(hits[i] / trials - p) <= tolerance
+    # Over large n, each tenth of the stream gets a tenth of the draws
+    tenths = Counter(10 * i // n for i in hits.elements())
+    for tenth in range(10):
+        share = tenths[tenth] / (trials * k)
+        assert abs(share - 0.1) <= 5 * (0.1 * 0.9 / (trials * k)) ** 0.5
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ufh_rows import resolve_column
+
+HEADER = ['name', 'host', 'ID']
+
+
+@pytest.mark.parametrize('column, index', [('host', 1), ('ID', 2), ('1', 1), ('B', 1), ('C', 2), (0, 0)])
+def test_resolve_column(column, index):
+    assert resolve_column(HEADER, column) == index
+
+
+@pytest.mark.parametrize('column', ['Host', 'HST', 'D', '3', 'id', ''])
+def test_unknown_columns_are_errors(column):
+    with pytest.raises(KeyError):
+        resolve_column(HEADER, column)
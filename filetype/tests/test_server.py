@@ -0,0 +1,140 @@
+"""
+The server's SheetStore must parse and evict files exactly like a plain least
+recently used cache with the same budget, and parse a file once however many
+requests ask for it at the same time.
+"""
+import csv
+import os
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ufh_server import SheetStore
+
+
+class Handler:
+    # Reads a CSV file; with gates, the i-th parse sets started[i] and then
+    # waits for gates[i] before reading
+    parses = []
+
+    def __init__(self, filename, gates=None, started=None):
+        self.filename = filename
+        self.gates = gates
+        self.started = started
+
+    def iter_rows(self):
+        index = len(Handler.parses)
+        Handler.parses.append(self.filename)
+        if self.gates is not None:
+            self.started[index].set()
+            self.gates[index].wait(5)
+        with open(self.filename, newline='') as file:
+            yield from csv.reader(file)
+
+
+@pytest.fixture(autouse=True)
+def reset_parses():
+    Handler.parses = []
+
+
+def sheet_size(filename):
+    with open(filename, newline='') as file:
+        rows = [tuple(row) for row in csv.reader(file)]
+    return sum(sys.getsizeof(row) + sum(map(sys.getsizeof, row)) for row in rows) + sys.getsizeof(rows)
+
+
+def write_file(path, rows):
+    with open(path, 'w', newline='') as file:
+        csv.writer(file).writerows([['id', 'host']] + [[str(i), f'host{i}.org'] for i in range(rows)])
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_store_behaves_like_an_lru_cache(tmp_path, seed):
+    rng = random.Random(seed)
+    files = [str(tmp_path / f'f{i}.csv') for i in range(6)]
+    lengths = {name: rng.randint(10, 200) for name in files}
+    for name in files:
+        write_file(name, lengths[name])
+    budget = sheet_size(files[0]) * 3
+    store = SheetStore(Handler, budget / (1 << 20))
+
+    # Reference: an OrderedDict of sizes, the least recently used first
+    cached = OrderedDict()
+    expected_parses = 0
+    for _ in range(300):
+        name = rng.choice(files)
+        if rng.random() < 0.05:
+            # A file that changes is parsed again
+            lengths[name] += 1
+            write_file(name, lengths[name])
+            cached.pop(name, None)
+        if name in cached:
+            cached.move_to_end(name)
+        else:
+            expected_parses += 1
+            size = sheet_size(name)
+            if size <= budget:
+                while cached and sum(cached.values()) + size > budget:
+                    cached.popitem(last=False)
+                cached[name] = size
+
+        rows = store.rows(name)
+        assert len(rows) == lengths[name] + 1
+        assert len(Handler.parses) == expected_parses
+        assert [entry['file'] for entry in store.status()['files']] == list(cached)
+        assert store.used == sum(cached.values())
+
+
+def test_concurrent_requests_parse_once(tmp_path):
+    name = str(tmp_path / 'f.csv')
+    write_file(name, 100)
+    gates, started = [threading.Event()], [threading.Event()]
+    store = SheetStore(lambda filename: Handler(filename, gates, started))
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(store.rows(name))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    started[0].wait(5)
+    time.sleep(0.1)
+    gates[0].set()
+    for thread in threads:
+        thread.join()
+    assert Handler.parses == [name]
+    assert len(results) == 8 and all(rows is results[0] for rows in results)
+    assert store._loading == {}
+
+
+def test_waiting_request_keeps_the_lock_of_a_later_load(tmp_path):
+    # A file larger than the budget is parsed by every request; a request
+    # that waited for an earlier parse must not drop the lock of a later one
+    name = str(tmp_path / 'f.csv')
+    write_file(name, 100)
+    gates = [threading.Event() for _ in range(3)]
+    started = [threading.Event() for _ in range(3)]
+    store = SheetStore(lambda filename: Handler(filename, gates, started), budget_mb=0)
+
+    first = threading.Thread(target=store.rows, args=(name,))
+    first.start()
+    started[0].wait(5)
+    waiting = threading.Thread(target=store.rows, args=(name,))
+    waiting.start()
+    time.sleep(0.1)
+    gates[0].set()
+    first.join()
+    started[1].wait(5)
+    later = threading.Thread(target=store.rows, args=(name,))
+    later.start()
+    started[2].wait(5)
+    gates[1].set()
+    waiting.join()
+    assert name in store._loading
+    gates[2].set()
+    later.join()
+    assert store._loading == {}
+    assert len(Handler.parses) == 3
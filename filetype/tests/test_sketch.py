@@ -0,0 +1,98 @@
+"""
+The sketches of ufh_sketch must keep their guarantees against exact counts
+taken with collections.Counter.
+"""
+import os
+import random
+import sys
+from collections import Counter
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ufh_sketch import CountMinSketch, HyperLogLog, SpaceSaving, ValueCounter
+
+
+def skewed_stream(seed, n=20000, distinct=2000):
+    # A few heavy values over a long tail, as in a host or user column
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(distinct)]
+    return [f'v{i}' for i in rng.choices(range(distinct), weights, k=n)]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_exact_counts_equal_counter(seed):
+    values = skewed_stream(seed, 5000, 300)
+    counter = ValueCounter(max_exact=300).update(values)
+    expected = Counter(values)
+    assert counter.exact
+    assert counter.total == len(values)
+    assert counter.distinct() == len(expected)
+    assert counter.most_common() == sorted(expected.items(), key=lambda item: (-item[1], item[0]))
+    assert counter.most_common(5) == counter.most_common()[:5]
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('weighted', [False, True])
+def test_space_saving_bounds(seed, weighted):
+    rng = random.Random(seed)
+    capacity = 50
+    heavy = SpaceSaving(capacity)
+    expected = Counter()
+    for value in skewed_stream(seed, 10000, 500):
+        n = rng.randint(1, 5) if weighted else 1
+        heavy.add(value, n)
+        expected[value] += n
+    total = sum(expected.values())
+
+    assert len(heavy.counts) == capacity
+    assert sum(heavy.counts.values()) == total
+    assert heavy._min == min(heavy.counts.values())
+    for value, count, error in heavy.most_common():
+        assert expected[value] <= count <= expected[value] + error
+    # Every value above n / capacity is monitored
+    for value, count in expected.items():
+        if count > total / capacity:
+            assert value in heavy.counts
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_count_min_is_an_upper_bound(seed):
+    values = skewed_stream(seed)
+    sketch = CountMinSketch(width=1024, depth=4)
+    for value in values:
+        sketch.add(value)
+    expected = Counter(values)
+    estimates = {value: sketch.estimate(value) for value in expected}
+    assert all(estimates[value] >= count for value, count in expected.items())
+    # e * n / width, exceeded only with probability exp(-depth)
+    bound = 2.72 * len(values) / 1024
+    within = sum(estimates[value] - count <= bound for value, count in expected.items())
+    assert within >= 0.95 * len(expected)
+    assert sketch.estimate('never seen') <= bound
+
+
+@pytest.mark.parametrize('distinct', [10, 1000, 50000])
+def test_hyperloglog_estimate(distinct):
+    sketch = HyperLogLog()
+    for i in range(distinct):
+        sketch.add(f'value {i}')
+        sketch.add(f'value {i // 2}')
+    assert abs(sketch.estimate() - distinct) <= max(1, 0.03 * distinct)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_estimated_counts_past_max_exact(seed):
+    values = skewed_stream(seed, 30000, 3000)
+    counter = ValueCounter(max_exact=500, capacity=200).update(values)
+    expected = Counter(values)
+    assert not counter.exact
+    assert counter.total == len(values)
+    assert abs(counter.distinct() - len(expected)) <= 0.03 * len(expected)
+    top = counter.most_common(10)
+    assert len(top) == 10
+    for value, count in top:
+        assert count >= expected[value]
+    # The heaviest values stand far enough above the tail to be found
+    assert {value for value, _ in top[:3]} == {value for value, _ in expected.most_common(3)}
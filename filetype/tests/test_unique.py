@@ -0,0 +1,52 @@
+"""
+UniqueValues must give sorted(set(values)), whether it kept them in memory or
+spilled them to disk.
+"""
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ufh_unique
+from ufh_unique import UniqueValues
+
+# Values a CSV run must carry unchanged
+AWKWARD = ['', ' ', 'a,b', '"quoted"', 'line\nbreak', 'cr\r\nlf', 'ünïcødé', '\udcff', 'tab\t']
+
+
+def random_values(seed, n=3000):
+    rng = random.Random(seed)
+    values = [f'{rng.randint(0, 800):x}' + rng.choice(['', '.org', '.com']) for _ in range(n)]
+    values += rng.choices(AWKWARD, k=50)
+    rng.shuffle(values)
+    return values
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('max_runs', [ufh_unique.MAX_RUNS, 3])
+def test_spilled_values_equal_sorted_set(monkeypatch, tmp_path, seed, max_runs):
+    # Fewer runs are kept before merging them into one
+    monkeypatch.setattr(ufh_unique, 'MAX_RUNS', max_runs)
+    values = random_values(seed)
+    with UniqueValues(budget_mb=0.005, spill_dir=str(tmp_path)) as unique:
+        unique.update(values)
+        assert unique.spilled
+        assert list(unique) == sorted(set(values))
+        assert len(unique) == len(set(values))
+        # Iterating again reads the runs again
+        assert list(unique) == sorted(set(values))
+        assert len(unique._runs) < max_runs
+    assert os.listdir(tmp_path) == []
+
+
+def test_values_within_the_budget_stay_in_memory(tmp_path):
+    values = random_values(0)
+    with UniqueValues(spill_dir=str(tmp_path)) as unique:
+        unique.update(values)
+        assert not unique.spilled
+        assert list(unique) == sorted(set(values))
+        assert len(unique) == len(set(values))
+    assert os.listdir(tmp_path) == []
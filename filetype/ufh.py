@@ -1,8 +1,5 @@
 import csv
 import re
-import openpyxl
-import xlrd
-from openpyxl import Workbook
 import argparse
 import os
 import sys
@@ -148,6 +145,28 @@ class CSVHandler:
         except Exception as e:
             return f"Error occurred: {e}"
 
+def column_indexes(header, columns):
+    """
+    Find the position of each requested column in the header row.
+
+    Args:
+        header (sequence): The header row.
+        columns (list of str): Columns to find, by name.
+
+    Returns:
+        list of int: The index of each column, in the order requested.
+
+    Raises:
+        KeyError: If a column is not in the header row.
+    """
+    names = [str(cell) if cell is not None else '' for cell in header]
+    indexes = []
+    for column in columns:
+        if column not in names:
+            raise KeyError(column)
+        indexes.append(names.index(column))
+    return indexes
+
 class ExcelHandler:
     """
     A handler class for Excel (.xlsx and .xls) files to perform extract, search, and column search operations.
@@ -172,22 +191,32 @@ class ExcelHandler:
             str: Success or error message.
         """
         try:
+            from openpyxl import Workbook
             if self.file_type == XLSX:
-                wb = openpyxl.load_workbook(self.filename)
+                import openpyxl  # Spreadsheet libraries are only imported for spreadsheets
+                wb = openpyxl.load_workbook(self.filename, read_only=True)  # Stream rows instead of loading every cell
                 ws = wb.active
                 new_wb = Workbook()
                 new_ws = new_wb.active
-                for row in ws.iter_rows(values_only=True):
-                    new_ws.append([row[columns.index(col)] for col in columns if col in columns])
+                rows = ws.iter_rows(values_only=True)
+                # Columns are found by name in the header row, as for CSV files
+                indexes = column_indexes(next(rows, ()), columns)
+                new_ws.append(columns)
+                for row in rows:
+                    new_ws.append([row[i] if i < len(row) else None for i in indexes])
+                wb.close()
                 new_wb.save(new_filename)
             elif self.file_type == XLS:
-                workbook = xlrd.open_workbook(self.filename)
+                import xlrd
+                workbook = xlrd.open_workbook(self.filename, on_demand=True)
                 sheet = workbook.sheet_by_index(0)
                 new_wb = Workbook()
                 new_ws = new_wb.active
-                for rx in range(sheet.nrows):
-                    row = sheet.row(rx)
-                    new_ws.append([row[columns.index(col)].value for col in columns if col in columns])
+                indexes = column_indexes(sheet.row_values(0) if sheet.nrows else (), columns)
+                new_ws.append(columns)
+                for rx in range(1, sheet.nrows):
+                    row = sheet.row_values(rx)
+                    new_ws.append([row[i] if i < len(row) else None for i in indexes])
                 new_wb.save(new_filename)
             return f"Columns {columns} extracted to {new_filename} successfully."
         except Exception as e:
@@ -206,13 +235,16 @@ class ExcelHandler:
         matches = []
         try:
             if self.file_type == XLSX:
-                wb = openpyxl.load_workbook(self.filename)
+                import openpyxl
+                wb = openpyxl.load_workbook(self.filename, read_only=True)  # Stream rows instead of loading every cell
                 ws = wb.active
                 for row in ws.iter_rows(values_only=True):
                     if any(re.search(pattern, str(cell)) for cell in row):
                         matches.append(row)
+                wb.close()
             elif self.file_type == XLS:
-                workbook = xlrd.open_workbook(self.filename)
+                import xlrd
+                workbook = xlrd.open_workbook(self.filename, on_demand=True)
                 sheet = workbook.sheet_by_index(0)
                 for rx in range(sheet.nrows):
                     row = sheet.row(rx)
@@ -239,15 +271,18 @@ class ExcelHandler:
         unique_results = set()
         try:
             if self.file_type == XLSX:
-                wb = openpyxl.load_workbook(self.filename)
+                import openpyxl
+                wb = openpyxl.load_workbook(self.filename, read_only=True)  # Stream rows instead of loading every cell
                 ws = wb.active
                 col_idx = openpyxl.utils.cell.column_index_from_string(column) - 1
                 for row in ws.iter_rows(values_only=True):
                     cell_value = str(row[col_idx])
                     if re.search(pattern, cell_value):
                         unique_results.add(cell_value)
+                wb.close()
             elif self.file_type == XLS:
-                workbook = xlrd.open_workbook(self.filename)
+                import xlrd
+                workbook = xlrd.open_workbook(self.filename, on_demand=True)
                 sheet = workbook.sheet_by_index(0)
                 col_idx = None
                 for idx, col_val in enumerate(sheet.row_values(0)):
@@ -0,0 +1,228 @@
+"""
+Registry of file format backends.
+
+A backend knows how to recognise a file, by its extension or by its first
+bytes, and how to open a handler for it. Backends are only looked up when a
+file is opened, and the heavy spreadsheet libraries are imported by the
+handlers themselves when they first read a file, so processing a CSV file
+never imports openpyxl or xlrd.
+
+Files are recognised in this order:
+
+1. by content, for formats with a signature (XLS, XLSX, ODS), so that an
+   export with the wrong extension is still read correctly;
+2. by extension;
+3. by content again for formats without a signature (CSV, whose sniffer
+   looks through gzip, bzip2 and Zstandard compression).
+
+Third-party backends are added with register_backend, or from another
+package through an entry point in the 'ufh.backends' group whose target is
+called, without arguments, to register them. Entry points are only loaded
+when no registered backend recognises a file. Backends registered later take
+precedence over earlier ones.
+"""
+import csv
+import importlib
+import os
+
+from ufh_compress import compression_of, read_head
+
+ENTRY_POINT_GROUP = 'ufh.backends'
+SNIFF_SIZE = 4096
+
+ZIP_MAGIC = b'PK\x03\x04'
+OLE2_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+ODS_MIMETYPE = b'application/vnd.oasis.opendocument.spreadsheet'
+
+_backends = []
+_entry_points_loaded = False
+
+
+class Backend:
+    """
+    A file format known to the Universal File Handler.
+
+    Attributes:
+        name (str): Short name of the format, e.g. 'xlsx'.
+        extensions (tuple of str): Lower-case extensions, dot included.
+        cacheable (bool): Whether the columnar sheet cache applies.
+        weak (bool): Whether sniff only guesses, without a real signature.
+    """
+    def __init__(self, name, factory, extensions=(), sniff=None, cacheable=False, weak=False):
+        self.name = name
+        self.extensions = tuple(extension.lower() for extension in extensions)
+        self.cacheable = cacheable
+        self.weak = weak
+        self._factory = factory
+        self._sniff = sniff
+
+    def __repr__(self):
+        return f'Backend({self.name!r})'
+
+    def open(self, filename, cache=None):
+        """
+        Create the handler for a file.
+
+        Args:
+            filename (str): The file to open.
+            cache (SheetCache): Columnar cache for the handler, if cacheable.
+
+        Returns:
+            The handler.
+        """
+        if isinstance(self._factory, str):
+            # 'package.module:callable', imported on first use
+            module, _, attribute = self._factory.partition(':')
+            self._factory = getattr(importlib.import_module(module), attribute)
+        return self._factory(filename, cache)
+
+    def matches_extension(self, filename):
+        return filename.lower().endswith(self.extensions) if self.extensions else False
+
+    def matches_content(self, filename, head):
+        return self._sniff is not None and bool(self._sniff(filename, head))
+
+
+def register_backend(name, factory, extensions=(), sniff=None, cacheable=False, weak=False):
+    """
+    Add a backend, taking precedence over the ones registered before it.
+
+    Args:
+        name (str): Short name of the format.
+        factory (callable or str): Called as factory(filename, cache) to create
+            a handler, or a 'module:callable' string imported on first use.
+            The handler must provide iter_rows(); the handlers of ufh_v2.py
+            also provide extract_columns, search_csv and search_column.
+        extensions (iterable of str): Extensions of the format, e.g. ('.xlsx',).
+        sniff (callable): Called as sniff(filename, head) with the first bytes
+            of the file; returns True if the file is in this format.
+        cacheable (bool): Whether the columnar sheet cache applies.
+        weak (bool): The sniffer only guesses, so it is tried after the
+            extensions of every backend.
+
+    Returns:
+        Backend: The registered backend.
+    """
+    backend = Backend(name, factory, extensions, sniff, cacheable, weak)
+    _backends.insert(0, backend)
+    return backend
+
+
+def backends():
+    """
+    Return the registered backends, highest precedence first.
+    """
+    return list(_backends)
+
+
+def supported_extensions():
+    """
+    Return the extensions of every registered backend.
+    """
+    return tuple(extension for backend in _backends for extension in backend.extensions)
+
+
+def _read_head(filename):
+    try:
+        with open(filename, mode='rb') as file:
+            return file.read(SNIFF_SIZE)
+    except OSError:
+        return None
+
+
+def _load_entry_points():
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return False
+    _entry_points_loaded = True
+    from importlib.metadata import entry_points
+    try:
+        found = entry_points(group=ENTRY_POINT_GROUP)
+    except TypeError:  # Python < 3.10
+        found = entry_points().get(ENTRY_POINT_GROUP, [])
+    for entry_point in found:
+        entry_point.load()()
+    return bool(found)
+
+
+def find_backend(filename):
+    """
+    Find the backend for a file, by content first, then by extension.
+
+    Args:
+        filename (str): The file to open.
+
+    Returns:
+        Backend: The backend recognising the file.
+
+    Raises:
+        ValueError: If no backend recognises the file.
+    """
+    head = _read_head(filename) if os.path.isfile(filename) else None
+    while True:
+        if head:
+            for backend in _backends:
+                if not backend.weak and backend.matches_content(filename, head):
+                    return backend
+        for backend in _backends:
+            if backend.matches_extension(filename):
+                return backend
+        if not _load_entry_points():
+            break
+    if head:
+        for backend in _backends:
+            if backend.weak and backend.matches_content(filename, head):
+                return backend
+    raise ValueError("Unsupported file type")
+
+
+def sniff_xls(filename, head):
+    """
+    Recognise a BIFF (.xls) workbook by its OLE2 compound file signature.
+    """
+    return head.startswith(OLE2_MAGIC)
+
+
+def sniff_ods(filename, head):
+    """
+    Recognise an OpenDocument spreadsheet by the mimetype stored first in its zip.
+    """
+    return head.startswith(ZIP_MAGIC) and ODS_MIMETYPE in head[:128]
+
+
+def sniff_xlsx(filename, head):
+    """
+    Recognise an Office Open XML workbook by the workbook part in its zip.
+    """
+    if not head.startswith(ZIP_MAGIC):
+        return False
+    import zipfile
+    try:
+        with zipfile.ZipFile(filename) as archive:
+            return 'xl/workbook.xml' in archive.namelist()
+    except (OSError, zipfile.BadZipFile):
+        return False
+
+
+def sniff_csv(filename, head):
+    """
+    Guess whether a file is comma-separated text, compressed or not.
+    """
+    if compression_of(filename, head) is not None:
+        try:
+            head = read_head(filename, SNIFF_SIZE)
+        except (OSError, EOFError, ValueError, ImportError):
+            return False
+    if b'\x00' in head:
+        return False
+    try:
+        text = head.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # The read may have cut a multi-byte character at the end
+        if e.start < len(head) - 3:
+            return False
+        text = head[:e.start].decode('utf-8')
+    try:
+        return csv.Sniffer().sniff(text, delimiters=',').delimiter == ','
+    except csv.Error:
+        return False
@@ -0,0 +1,335 @@
+"""
+Batch mode: run several operations over a file in a single shared scan.
+
+A job file (JSON, or YAML when PyYAML is installed) lists the files to read
+and the operations to run on each of them:
+
+    {
+      "files": ["export.xlsx"],
+      "operations": [
+        {"extract": ["user", "host"], "newfile": "users.csv"},
+        {"search": "evil\\.com"},
+        {"searchcol": "host", "pattern": "\\.ru$", "output": "csv", "newfile": "ru.csv"}
+      ]
+    }
+
+Every file is read once; each row is handed to every operation in turn.
+An output file is written once per job: the rows that the operations write
+to it from every file of the job are appended to it in file order.
+Columns are resolved against the header row by name, then as a zero-based
+number or a spreadsheet column letter.
+"""
+import json
+import os
+
+from ufh_match import compile_matcher, load_patterns
+from ufh_rows import cell_at, resolve_column
+from ufh_unique import DEFAULT_UNIQUE_BUDGET_MB, UniqueValues
+from ufh_writers import open_row_writer
+
+DEFAULT_CSV_NAME = 'output.csv'
+
+
+def load_job(path):
+    """
+    Read a job file.
+
+    Args:
+        path (str): A .json, .yml or .yaml job file.
+
+    Returns:
+        dict: The job, with 'files' and 'operations' lists.
+    """
+    with open(path, mode='r', encoding='utf-8') as file:
+        if path.lower().endswith(('.yml', '.yaml')):
+            import yaml
+            job = yaml.safe_load(file)
+        else:
+            job = json.load(file)
+    if 'file' in job:
+        job.setdefault('files', []).append(job.pop('file'))
+    job.setdefault('files', [])
+    job.setdefault('operations', [])
+    return job
+
+
+def _matcher(spec, key):
+    if spec.get('patterns_file'):
+        patterns = load_patterns(spec['patterns_file'])
+    else:
+        patterns = spec[key]
+    return compile_matcher(patterns, spec.get('fixed_strings', False), spec.get('ignore_case', False))
+
+
+class JobOutputs:
+    """
+    The output files of a job, each opened on first use and kept open until
+    the job is done, so that every file of the job appends to it.
+    """
+    def __init__(self):
+        self._writers = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def writer(self, filename, header=None):
+        """
+        Return the writer of an output file, opening it and writing its
+        header row the first time.
+        """
+        key = os.path.abspath(filename)
+        writer = self._writers.get(key)
+        if writer is None:
+            writer = self._writers[key] = open_row_writer(filename)
+            if header is not None:
+                writer.writerow(header)
+        return writer
+
+    def close(self):
+        writers, self._writers = self._writers, {}
+        for writer in writers.values():
+            writer.close()
+
+
+class _Operation:
+    # Output files are shared with the rest of the job when it provides them,
+    # and owned by the operation otherwise
+    def __init__(self, outputs):
+        self._owned = outputs is None
+        self.outputs = JobOutputs() if outputs is None else outputs
+
+    def close(self):
+        if self._owned:
+            self.outputs.close()
+
+
+class ExtractOperation(_Operation):
+    """
+    Streams the selected columns of every row to a new file.
+    """
+    def __init__(self, spec, outputs=None):
+        super().__init__(outputs)
+        self.columns = spec['extract']
+        self.new_filename = spec.get('newfile', DEFAULT_CSV_NAME)
+
+    def start(self, header):
+        self._indexes = [resolve_column(header, column) for column in self.columns]
+        self._writer = self.outputs.writer(self.new_filename, self.columns)
+
+    def feed(self, row):
+        self._writer.writerow([cell_at(row, i) for i in self._indexes])
+
+    def finish(self):
+        self.close()
+        return f"Columns {self.columns} extracted to {self.new_filename} successfully."
+
+
+class SearchOperation(_Operation):
+    """
+    Collects the rows in which any cell matches, the header row included, or
+    streams them to a new file as they are found.
+    """
+    def __init__(self, spec, outputs=None):
+        super().__init__(outputs)
+        self.matcher = _matcher(spec, 'search')
+        self.new_filename = spec.get('newfile')
+        self.matches = []
+
+    def start(self, header):
+        self._writer = self.outputs.writer(self.new_filename) if self.new_filename else None
+        self.feed(header)
+
+    def feed(self, row):
+        if self.matcher.search_row(row):
+            if self._writer is None:
+                self.matches.append(row)
+            else:
+                self._writer.writerow(row)
+
+    def finish(self):
+        if self.new_filename:
+            # Created even when the file had no rows at all
+            self.outputs.writer(self.new_filename)
+            self.close()
+            return f"Search results saved to {self.new_filename}"
+        return self.matches
+
+
+class SearchColumnOperation(_Operation):
+    """
+    Collects the unique matching values of one column, in sorted order and
+    spilled to disk beyond "unique_budget" MB of memory.
+    """
+    def __init__(self, spec, outputs=None):
+        super().__init__(outputs)
+        self.column = spec['searchcol']
+        self.matcher = _matcher(spec, 'pattern')
+        self.output_choice = spec.get('output', 'print')
+        self.new_filename = spec.get('newfile', DEFAULT_CSV_NAME)
+        self.unique_results = UniqueValues(spec.get('unique_budget', DEFAULT_UNIQUE_BUDGET_MB))
+
+    def start(self, header):
+        self._index = resolve_column(header, self.column)
+
+    def feed(self, row):
+        value = cell_at(row, self._index)
+        if value is not None and value != '':
+            value = str(value)
+            if self.matcher.search(value):
+                self.unique_results.add(value)
+
+    def finish(self):
+        with self.unique_results:
+            if self.output_choice == 'csv':
+                output_path = os.path.join(os.getcwd(), self.new_filename)
+                writer = self.outputs.writer(output_path)
+                for result in self.unique_results:
+                    writer.writerow([result])
+                self.close()
+                return f"Search results saved to {output_path}"
+            return list(self.unique_results)
+
+    def close(self):
+        super().close()
+        self.unique_results.close()
+
+
+OPERATIONS = {
+    'extract': ExtractOperation,
+    'search': SearchOperation,
+    'searchcol': SearchColumnOperation,
+}
+
+
+def build_operation(spec, outputs=None):
+    """
+    Create the operation described by one entry of a job.
+
+    Args:
+        spec (dict): The operation, keyed by 'extract', 'search' or 'searchcol'.
+        outputs (JobOutputs): The output files shared by the job; by default
+            the operation writes its own.
+
+    Returns:
+        ExtractOperation, SearchOperation or SearchColumnOperation.
+
+    Raises:
+        ValueError: If the entry names no known operation.
+    """
+    for key, operation in OPERATIONS.items():
+        if key in spec:
+            return operation(spec, outputs)
+    if 'patterns_file' in spec:
+        return SearchOperation(spec, outputs)
+    raise ValueError(f"Unknown operation: {spec}")
+
+
+def run_operations(rows, operations):
+    """
+    Feed every row to every operation in a single pass.
+
+    An operation that fails is dropped from the scan and reports its error,
+    while the others carry on. The files of every operation are closed once
+    the scan ends, whether it completed or not.
+
+    Args:
+        rows (iterable): The rows of the file, header row first.
+        operations (list): Operations created by build_operation.
+
+    Returns:
+        list: The result of each operation, in order.
+    """
+    errors = {}
+    active = list(operations)
+
+    def guarded(step, operation, *args):
+        try:
+            step(*args)
+        except Exception as e:
+            errors[id(operation)] = f"Error occurred: {e}"
+            active.remove(operation)
+
+    try:
+        rows = iter(rows)
+        header = next(rows, None)
+        if header is not None:
+            for operation in list(active):
+                guarded(operation.start, operation, header)
+            for row in rows:
+                for operation in list(active):
+                    guarded(operation.feed, operation, row)
+
+        results = []
+        for operation in operations:
+            if id(operation) not in errors:
+                try:
+                    results.append(operation.finish())
+                    continue
+                except Exception as e:
+                    errors[id(operation)] = f"Error occurred: {e}"
+            results.append(errors[id(operation)])
+        return results
+    finally:
+        for operation in operations:
+            operation.close()
+
+
+def run_specs(read_rows, specs, outputs=None, build=build_operation):
+    """
+    Build the operation of every entry of a job and run them over one file in
+    a single pass. An entry that cannot be built (e.g. with an invalid regex)
+    reports its error while the others still run; a file that cannot be read
+    is reported by every operation built for it.
+
+    Args:
+        read_rows (callable): Returns the rows of the file, header row first;
+            not called when no operation could be built.
+        specs (list of dict): The operations of the job.
+        outputs (JobOutputs): The output files shared by the job.
+        build (callable): Creates an operation from a spec and outputs.
+
+    Returns:
+        list: The result of each operation, in order.
+    """
+    outcome = []
+    operations = []
+    for spec in specs:
+        try:
+            operations.append(build(spec, outputs))
+            outcome.append(None)
+        except Exception as e:
+            outcome.append(f"Error occurred: {e}")
+    if operations:
+        try:
+            results = run_operations(read_rows(), operations)
+        except Exception as e:
+            for operation in operations:
+                operation.close()
+            results = [f"Error occurred: {e}"] * len(operations)
+        results = iter(results)
+        outcome = [next(results) if result is None else result for result in outcome]
+    return outcome
+
+
+def run_job(job, get_handler):
+    """
+    Run every operation of a job on every file of the job; an output file
+    named by an operation receives the rows of every file.
+
+    Args:
+        job (dict): A job as returned by load_job.
+        get_handler (callable): Returns the handler for a filename; the
+            handler must provide iter_rows().
+
+    Returns:
+        list of tuple: (filename, operation spec, result) for every operation.
+    """
+    results = []
+    with JobOutputs() as outputs:
+        for filename in job['files']:
+            outcome = run_specs(lambda: get_handler(filename).iter_rows(), job['operations'], outputs)
+            results.extend((filename, spec, result) for spec, result in zip(job['operations'], outcome))
+    return results
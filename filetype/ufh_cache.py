@@ -0,0 +1,371 @@
+"""
+Columnar binary cache of spreadsheet sheets.
+
+Parsing XLS, XLSX and ODS files dominates the cost of every run, so the first
+full read of a sheet also stores it in a compact columnar file, next to the
+source (or in a cache directory). Later runs memory-map that file instead of
+parsing the workbook again, for as long as the size and modification time of
+the source are unchanged.
+
+Every column is stored as three arrays: a type tag per row, the end offset of
+every value in the column's string pool, and the pool itself (the UTF-8 text
+of all the values, back to back). A single column can therefore be read
+without touching the others.
+
+While the cache is built, the arrays are buffered up to BUILD_BUFFER bytes in
+all and then appended in chunks to a temporary file, so building takes little
+memory beyond that of reading the sheet; the cache file is assembled from the
+chunks at the end. A sheet whose cache would be larger than max_mb is not
+cached.
+
+Layout:
+
+    magic (8 bytes) | header length (8 bytes) | JSON header | sections
+
+Each section is aligned to 8 bytes and located by its (offset, length) in the
+header.
+"""
+import datetime
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+from array import array
+from collections import defaultdict
+
+CACHE_VERSION = '1'
+CACHE_SUFFIX = '.ufhcol'
+MAGIC = b'UFHCOL01'
+HEADER_LENGTH = struct.Struct('<Q')
+ALIGNMENT = 8
+MAX_SMALL_OFFSET = (1 << 32) - 1
+DEFAULT_MAX_CACHE_MB = 1024
+# Bytes of arrays held in memory while building, for all columns together
+BUILD_BUFFER = 8 << 20
+
+# Type tags; any other type of value is stored as its text
+NONE, STR, INT, FLOAT, BOOL, DATETIME, DATE, TIME = range(8)
+ENCODERS = (
+    (bool, BOOL, lambda value: '1' if value else ''),
+    (int, INT, str),
+    (float, FLOAT, repr),
+    (datetime.datetime, DATETIME, datetime.datetime.isoformat),
+    (datetime.date, DATE, datetime.date.isoformat),
+    (datetime.time, TIME, datetime.time.isoformat),
+)
+DECODERS = {
+    STR: str,
+    INT: int,
+    FLOAT: float,
+    BOOL: bool,
+    DATETIME: datetime.datetime.fromisoformat,
+    DATE: datetime.date.fromisoformat,
+    TIME: datetime.time.fromisoformat,
+}
+
+
+def _encode(value):
+    if value is None:
+        return NONE, b''
+    if isinstance(value, str):
+        return STR, value.encode('utf-8')
+    for kind, tag, encode in ENCODERS:
+        if isinstance(value, kind):
+            return tag, encode(value).encode('utf-8')
+    return STR, str(value).encode('utf-8')
+
+
+class _Spill:
+    # Sections written in chunks, interleaved, to one temporary file
+    def __init__(self, directory):
+        self.file = tempfile.TemporaryFile(prefix='.ufhcol-', dir=directory)
+        self.chunks = defaultdict(list)
+        self.size = 0
+
+    def write(self, key, data):
+        if data:
+            self.chunks[key].append((self.size, len(data)))
+            self.file.write(data)
+            self.size += len(data)
+
+    def copy(self, key, out, convert=None):
+        for offset, size in self.chunks[key]:
+            self.file.seek(offset)
+            data = self.file.read(size)
+            out.write(data if convert is None else convert(data))
+
+    def close(self):
+        self.file.close()
+
+
+class _ColumnBuilder:
+    # The three arrays of one column, grown row by row and spilled in chunks
+    def __init__(self, rows_before):
+        self.tags = array('B', bytes(rows_before))
+        self.ends = array('Q', [0]) * rows_before
+        self.pool = bytearray()
+        self.pool_size = 0
+
+    def append(self, value):
+        tag, data = _encode(value)
+        self.tags.append(tag)
+        self.pool += data
+        self.pool_size += len(data)
+        self.ends.append(self.pool_size)
+        return 9 + len(data)
+
+    def flush(self, spill, i):
+        spill.write((i, 'tags'), self.tags.tobytes())
+        spill.write((i, 'ends'), self.ends.tobytes())
+        spill.write((i, 'pool'), bytes(self.pool))
+        self.tags = array('B')
+        self.ends = array('Q')
+        self.pool = bytearray()
+
+
+class _SheetBuilder:
+    # Row lengths and column arrays of a sheet, grown row by row; gives up
+    # (full becomes True) once the arrays exceed max_bytes or cannot be spilled
+    def __init__(self, directory, max_bytes):
+        self.spill = _Spill(directory)
+        self.max_bytes = max_bytes
+        self.rows = 0
+        self.lengths = array('I')
+        self.columns = []
+        self.buffered = 0
+        self.total = 0
+        self.full = False
+
+    def append(self, row):
+        row = tuple(row)
+        added = 4 * (1 + len(self.columns))
+        while len(self.columns) < len(row):
+            self.columns.append(_ColumnBuilder(self.rows))
+            added += 9 * self.rows
+        for column, value in zip(self.columns, row):
+            added += column.append(value)
+        for column in self.columns[len(row):]:
+            column.append(None)
+        self.lengths.append(len(row))
+        self.rows += 1
+        self.buffered += added
+        self.total += added
+        try:
+            if self.total > self.max_bytes:
+                raise OSError('Cache size limit reached')
+            if self.buffered > BUILD_BUFFER:
+                self.flush()
+        except OSError:
+            self.full = True
+            self.columns = []
+            self.close()
+
+    def flush(self):
+        self.spill.write('lengths', self.lengths.tobytes())
+        self.lengths = array('I')
+        for i, column in enumerate(self.columns):
+            column.flush(self.spill, i)
+        self.buffered = 0
+
+    def close(self):
+        self.spill.close()
+
+
+class SheetCache:
+    """
+    Columnar cache of one sheet of a spreadsheet file.
+
+    Attributes:
+        filename (str): The source spreadsheet.
+        sheet (int or str): The cached sheet.
+        path (str): Location of the cache file.
+    """
+    def __init__(self, filename, sheet=0, cache_dir=None, max_mb=DEFAULT_MAX_CACHE_MB):
+        self.filename = filename
+        self.sheet = sheet
+        self.max_bytes = int(max_mb * (1 << 20))
+        # Sheet names may hold characters that are not allowed in file names;
+        # a clash only costs a rebuild, since the header records the sheet
+        suffix = '' if sheet == 0 else '.' + re.sub(r'[^\w.-]', '_', str(sheet))
+        self.directory = cache_dir or os.path.dirname(os.path.abspath(filename))
+        self.path = os.path.join(self.directory, f'.{os.path.basename(filename)}{suffix}{CACHE_SUFFIX}')
+
+    def _source_key(self):
+        stat = os.stat(self.filename)
+        return {
+            'version': CACHE_VERSION,
+            'byteorder': sys.byteorder,
+            'path': os.path.abspath(self.filename),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sheet': self.sheet,
+        }
+
+    def _read_header(self, file):
+        if file.read(len(MAGIC)) != MAGIC:
+            return None
+        (length,) = HEADER_LENGTH.unpack(file.read(HEADER_LENGTH.size))
+        return json.loads(file.read(length).decode('utf-8'))
+
+    def is_fresh(self):
+        """
+        Tell whether the cache exists and was built from the current file.
+
+        Returns:
+            bool: True if the cache can be used instead of the source.
+        """
+        try:
+            with open(self.path, mode='rb') as file:
+                header = self._read_header(file)
+        except (OSError, ValueError, struct.error):
+            return False
+        return header is not None and header.get('source') == self._source_key()
+
+    def build(self, rows):
+        """
+        Write the cache from the rows of the sheet, replacing any previous one.
+
+        Args:
+            rows (iterable): The rows of the sheet in order.
+        """
+        key = self._source_key()
+        builder = _SheetBuilder(self.directory, self.max_bytes)
+        try:
+            for row in rows:
+                builder.append(row)
+                if builder.full:
+                    return
+            self._write(key, builder)
+        finally:
+            builder.close()
+
+    def _write(self, key, builder):
+        builder.flush()
+        columns = builder.columns
+        # Offsets are stored on 32 bits unless the pool of the column is larger
+        typecodes = ['I' if column.pool_size <= MAX_SMALL_OFFSET else 'Q' for column in columns]
+        # Each section as its key in the spill file and its size in bytes
+        sections = [('lengths', 4 * builder.rows)]
+        for i, (column, typecode) in enumerate(zip(columns, typecodes)):
+            sections += [((i, 'tags'), builder.rows), ((i, 'ends'), builder.rows * array(typecode).itemsize),
+                         ((i, 'pool'), column.pool_size)]
+        # The header holds the section offsets, which depend on the header length
+        header = {'source': key, 'rows': builder.rows, 'offset_types': typecodes, 'sections': []}
+        while True:
+            encoded = json.dumps(header).encode('utf-8')
+            offset = _align(len(MAGIC) + HEADER_LENGTH.size + len(encoded))
+            placed = []
+            for _, size in sections:
+                placed.append([offset, size])
+                offset = _align(offset + size)
+            if placed == header['sections']:
+                break
+            header['sections'] = placed
+
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(temp_path, mode='wb') as file:
+            file.write(MAGIC + HEADER_LENGTH.pack(len(encoded)) + encoded)
+            for (section, _), (offset, _) in zip(sections, placed):
+                file.write(bytes(offset - file.tell()))
+                small = section != 'lengths' and section[1] == 'ends' and typecodes[section[0]] == 'I'
+                builder.spill.copy(section, file, _small_offsets if small else None)
+        os.replace(temp_path, self.path)
+
+    def _open(self):
+        # Map the cache and return the header with a view of every section
+        with open(self.path, mode='rb') as file:
+            header = self._read_header(file)
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(buffer)
+        sections = [view[offset:offset + size] for offset, size in header['sections']]
+        lengths = sections[0].cast('I')
+        columns = []
+        for i, typecode in enumerate(header['offset_types']):
+            tags, ends, pool = sections[3 * i + 1:3 * i + 4]
+            columns.append((tags, ends.cast(typecode), pool))
+        return header, lengths, columns
+
+    def iter_rows(self):
+        """
+        Read the rows of the sheet from the cache.
+
+        Yields:
+            tuple: The values of each row, with the types they were read with.
+        """
+        _, lengths, columns = self._open()
+        for r, length in enumerate(lengths):
+            yield tuple(_value(column, r) for column in columns[:length])
+
+    def iter_column(self, index):
+        """
+        Read the values of a single column from the cache.
+
+        Args:
+            index (int): Zero-based column index.
+
+        Yields:
+            The value of the column in each row, or None when the row is shorter.
+        """
+        header, lengths, columns = self._open()
+        if not 0 <= index < len(columns):
+            yield from [None] * header['rows']
+            return
+        column = columns[index]
+        for r in range(header['rows']):
+            yield _value(column, r) if index < lengths[r] else None
+
+    def cached_rows(self, read_rows):
+        """
+        Read the sheet from the cache when it is fresh; otherwise read it from
+        the source with read_rows() and build the cache once every row has
+        been read.
+
+        Args:
+            read_rows (callable): Returns an iterator over the source rows.
+
+        Yields:
+            tuple or list: The rows of the sheet.
+        """
+        if self.is_fresh():
+            yield from self.iter_rows()
+            return
+        key = self._source_key()
+        # The cache is an optimisation; an unwritable directory is not an error
+        try:
+            builder = _SheetBuilder(self.directory, self.max_bytes)
+        except OSError:
+            yield from read_rows()
+            return
+        try:
+            for row in read_rows():
+                if not builder.full:
+                    builder.append(row)
+                yield row
+            if not builder.full:
+                try:
+                    self._write(key, builder)
+                except OSError:
+                    pass
+        finally:
+            builder.close()
+
+
+def _value(column, r):
+    tags, ends, pool = column
+    tag = tags[r]
+    if tag == NONE:
+        return None
+    text = str(pool[ends[r - 1] if r else 0:ends[r]], 'utf-8')
+    return DECODERS[tag](text)
+
+
+def _small_offsets(data):
+    # Offsets spilled on 64 bits, stored on 32
+    return array('I', array('Q', data)).tobytes()
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
@@ -0,0 +1,201 @@
+"""
+Transparent gzip, bzip2 and Zstandard compression of CSV files.
+
+A compressed file is recognised by its magic bytes, or by its extension when
+it is being written. Reading decompresses on a background thread that feeds
+the parser through a bounded queue of chunks: zlib, bz2 and zstd release the
+GIL while they decompress, so decompression and CSV parsing run on two cores,
+and memory stays bounded by the queue however fast either side is.
+
+Zstandard needs the zstandard package (or Python 3.14's compression.zstd);
+gzip and bzip2 only need the standard library.
+"""
+import io
+import os
+import queue
+import threading
+
+GZIP = 'gzip'
+BZIP2 = 'bzip2'
+ZSTD = 'zstd'
+
+MAGIC = (
+    (b'\x1f\x8b', GZIP),
+    (b'BZh', BZIP2),
+    (b'\x28\xb5\x2f\xfd', ZSTD),
+)
+EXTENSIONS = {
+    '.gz': GZIP,
+    '.gzip': GZIP,
+    '.bz2': BZIP2,
+    '.zst': ZSTD,
+}
+CHUNK_SIZE = 1 << 20
+QUEUE_CHUNKS = 8
+
+
+def compression_of(filename, head=None):
+    """
+    Return the compression of a file: GZIP, BZIP2, ZSTD or None.
+
+    Existing files are recognised by their first bytes, given as head or read
+    from the file; files still to be written by their extension.
+    """
+    if head is None and os.path.isfile(filename):
+        with open(filename, mode='rb') as file:
+            head = file.read(4)
+    if head is not None:
+        for magic, name in MAGIC:
+            if head.startswith(magic):
+                return name
+        return None
+    return compression_of_name(filename)
+
+
+def compression_of_name(filename):
+    """
+    Return the compression implied by the extension of a file name, or None.
+    """
+    return EXTENSIONS.get(os.path.splitext(filename)[1].lower())
+
+
+def strip_compression(filename):
+    """
+    Return a file name without its compression extension, e.g. 'a.csv' for
+    'a.csv.gz'.
+    """
+    root, extension = os.path.splitext(filename)
+    return root if extension.lower() in EXTENSIONS else filename
+
+
+def _zstd():
+    try:
+        from compression import zstd  # Python 3.14
+        return zstd.open
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("Reading or writing .zst files requires the zstandard package") from None
+    return zstandard.open
+
+
+def _open_codec(filename, name, mode):
+    # A binary file object that (de)compresses on the calling thread
+    if name == GZIP:
+        import gzip
+        return gzip.open(filename, mode)
+    if name == BZIP2:
+        import bz2
+        return bz2.open(filename, mode)
+    return _zstd()(filename, mode)
+
+
+class ThreadedReader(io.RawIOBase):
+    """
+    A binary stream read ahead by a background thread.
+
+    The thread reads chunks from the source into a queue of at most
+    `max_chunks`, so the source (a decompressor) works while the consumer
+    parses the previous chunks.
+    """
+    def __init__(self, source, chunk_size=CHUNK_SIZE, max_chunks=QUEUE_CHUNKS):
+        super().__init__()
+        self._source = source
+        self._chunk_size = chunk_size
+        self._queue = queue.Queue(max_chunks)
+        self._buffer = memoryview(b'')
+        self._done = False
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._produce, name='ufh-decompress', daemon=True)
+        self._thread.start()
+
+    def _produce(self):
+        try:
+            while not self._stopped.is_set():
+                chunk = self._source.read(self._chunk_size)
+                self._put(chunk)
+                if not chunk:
+                    return
+        except BaseException as e:  # Raised again on the reading thread
+            self._put(e)
+
+    def _put(self, item):
+        # Give up waiting for room once the reader is closed
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._buffer:
+            if self._done:
+                return 0
+            chunk = self._queue.get()
+            if isinstance(chunk, BaseException):
+                self._done = True
+                raise chunk
+            if not chunk:
+                self._done = True
+                return 0
+            self._buffer = memoryview(chunk)
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            self._stopped.set()
+            self._thread.join()
+            self._source.close()
+        super().close()
+
+
+def open_input(filename, mode='r'):
+    """
+    Open a file for reading, decompressing it on a background thread when it
+    is compressed.
+
+    Args:
+        filename (str): The file to read.
+        mode (str): 'r' for UTF-8 text with newlines left to the csv module,
+            'rb' for bytes.
+
+    Returns:
+        A file object.
+    """
+    name = compression_of(filename)
+    if name is None:
+        if mode == 'rb':
+            return open(filename, mode='rb')
+        return open(filename, mode='r', newline='', encoding='utf-8')
+    stream = io.BufferedReader(ThreadedReader(_open_codec(filename, name, 'rb')), CHUNK_SIZE)
+    if mode == 'rb':
+        return stream
+    return io.TextIOWrapper(stream, encoding='utf-8', newline='')
+
+
+def open_output(filename):
+    """
+    Open a UTF-8 text file for writing CSV, compressed according to its
+    extension.
+    """
+    name = compression_of_name(filename)
+    if name is None:
+        return open(filename, mode='w', newline='', encoding='utf-8')
+    return io.TextIOWrapper(_open_codec(filename, name, 'wb'), encoding='utf-8', newline='')
+
+
+def read_head(filename, size):
+    """
+    Return the first `size` bytes of a file, decompressed if it is compressed.
+    """
+    with open_input(filename, mode='rb') as file:
+        return file.read(size)
@@ -0,0 +1,467 @@
+"""
+Fast scanning of large CSV files.
+
+For parallel scans the file is split into byte ranges, each range is parsed
+and matched in a worker process, and the results are merged back in file
+order. Split points are put after a newline preceded by an even number of
+quotes, which is a record boundary unless a quote stands in an unquoted
+field. Each worker therefore checks that its range ends between records; if
+one does not, the results from that range on are dropped and the rest of the
+file, from the start of that range, is scanned in a single range.
+
+When every pattern is a plain literal, the file is first memory-mapped and
+searched as raw bytes; only the records around a hit are decoded and parsed
+to verify the match cell by cell, so selective searches run at close to
+memchr speed instead of parsing every row.
+
+Counting quotes does not tell where records start, since csv.reader keeps a
+quote inside an unquoted field (12" pipe) as an ordinary character. Records
+are instead matched from a known record start with a regex accepting only
+well-formed records: fields without quotes, or quoted with every inner quote
+doubled. csv.reader splits such records exactly as the regex does, so the
+offsets it reaches are record starts. Where the regex stops short of a hit,
+the records from there on are parsed with csv.reader, keeping track of where
+each one ends.
+"""
+import csv
+import io
+import mmap
+import os
+import re
+from itertools import chain
+
+from ufh_match import compile_matcher
+from ufh_rows import resolve_column
+
+QUOTE = b'"'
+NEWLINE = b'\n'
+MAX_CHUNK_SIZE = 64 << 20
+MIN_CHUNK_SIZE = 1 << 20
+READ_SIZE = 1 << 22
+# A line appended to a range: parsed as a record of its own only if the range
+# ends between records (a noncharacter, which does not occur in text)
+CHUNK_END = '\ufdd0'
+# A well-formed record, and a run of them; possessive, so that matching never
+# backtracks and stops at the first record that is not well formed
+_FIELD = rb'(?:"(?:[^"]++|"")*+"|[^",\r\n]*+)'
+RECORD = re.compile(_FIELD + rb'(?:,' + _FIELD + rb')*+\r?\n')
+RECORDS = re.compile(rb'(?:' + RECORD.pattern + rb')*+')
+
+# Per-process state set up by the pool initializer
+_matcher = None
+_prefilter = None
+
+
+def _init_worker(patterns, fixed_strings, ignore_case):
+    global _matcher, _prefilter
+    _matcher = compile_matcher(patterns, fixed_strings, ignore_case)
+    _prefilter = _matcher.bytes_prefilter()
+
+
+def _count_quotes(task):
+    filename, start, end = task
+    count = 0
+    with open(filename, mode='rb') as file:
+        file.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = file.read(min(READ_SIZE, remaining))
+            if not block:
+                break
+            count += block.count(QUOTE)
+            remaining -= len(block)
+    return count
+
+
+def record_end(file, pos, odd_quotes=False):
+    """
+    Find the offset just past the first record boundary at or after a position.
+
+    Args:
+        file (file object): The CSV file opened in binary mode.
+        pos (int): Where to start looking.
+        odd_quotes (bool): Whether an odd number of quotes precedes pos,
+            i.e. pos lies inside a quoted field.
+
+    Returns:
+        int: Offset of the first byte of the next record, or the file size.
+    """
+    file.seek(pos)
+    while True:
+        block = file.read(READ_SIZE)
+        if not block:
+            return file.tell()
+        newline = block.find(NEWLINE)
+        start = 0
+        while newline != -1:
+            if block.count(QUOTE, start, newline) % 2:
+                odd_quotes = not odd_quotes
+            if not odd_quotes:
+                return pos + newline + 1
+            start = newline
+            newline = block.find(NEWLINE, newline + 1)
+        if block.count(QUOTE, start) % 2:
+            odd_quotes = not odd_quotes
+        pos += len(block)
+
+
+def split_records(filename, chunk_size, pool=None, start=0):
+    """
+    Split a CSV file into byte ranges that end after a newline preceded by an
+    even number of quotes. These are record boundaries as long as no quote
+    stands in an unquoted field, which the scan of each range checks.
+
+    Args:
+        filename (str): The CSV file.
+        chunk_size (int): Approximate size of each range in bytes.
+        pool (Pool): Optional pool used to count quotes in parallel.
+        start (int): Offset of the first record to include.
+
+    Returns:
+        list of tuple: (start, end) offsets, in file order.
+    """
+    size = os.path.getsize(filename)
+    nominal = list(range(start, size, chunk_size)) + [size]
+    tasks = [(filename, a, b) for a, b in zip(nominal, nominal[1:])]
+    counts = pool.map(_count_quotes, tasks) if pool else list(map(_count_quotes, tasks))
+
+    bounds = [start]
+    quotes = 0
+    with open(filename, mode='rb') as file:
+        for offset, count in zip(nominal[1:-1], counts):
+            quotes += count
+            if offset > bounds[-1]:
+                bounds.append(record_end(file, offset, quotes % 2 == 1))
+            # else the previous boundary already lies past this offset
+    if bounds[-1] < size:
+        bounds.append(size)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+
+class SplitInsideRecord(ValueError):
+    """
+    A range of a CSV file ends inside a record (within a quoted field).
+    """
+
+
+def iter_records(lines, start):
+    """
+    Parse CSV records with csv.reader, keeping track of where each one ends.
+
+    Args:
+        lines (iterable of bytes): Lines of the file, each ending with a
+            newline but possibly the last, the first one at a record start.
+        start (int): Offset of the first line in the file.
+
+    Yields:
+        tuple: (row, end, complete) for every record, where end is the offset
+            just past it and complete tells whether it ended with a newline
+            outside quotes, rather than being cut off by the end of the lines.
+    """
+    # csv.reader asks for another line only while a record is unfinished, so
+    # the lines read so far always end with the record just returned
+    state = {'end': start, 'newline': True, 'exhausted': False}
+
+    def decoded():
+        for line in lines:
+            state['end'] += len(line)
+            state['newline'] = line.endswith(NEWLINE)
+            yield line.decode('utf-8')
+        state['exhausted'] = True
+
+    for row in csv.reader(decoded()):
+        yield row, state['end'], state['newline'] and not state['exhausted']
+
+
+def _buffer_lines(buffer, start, end):
+    # The lines of buffer[start:end], read one at a time
+    pos = start
+    while pos < end:
+        newline = buffer.find(NEWLINE, pos, end)
+        stop = end if newline == -1 else newline + 1
+        yield buffer[pos:stop]
+        pos = stop
+
+
+def _record_start(buffer, pos, hit):
+    # The start of the record holding a hit, or where well-formed records stop
+    # before it, given a record start at or before the hit
+    if buffer.find(QUOTE, pos, hit) == -1:
+        # Without quotes every newline ends a record
+        newline = buffer.rfind(NEWLINE, pos, hit)
+        return pos if newline == -1 else newline + 1
+    return RECORDS.match(buffer, pos, hit).end()
+
+
+def _parse_from(buffer, pos, end, size):
+    # Records parsed by csv.reader from a record start; the last one must be
+    # complete unless the range reaches the end of the file
+    for row, stop, complete in iter_records(_buffer_lines(buffer, pos, end), pos):
+        if not complete and end < size:
+            raise SplitInsideRecord(f"Offset {end} is inside a record")
+        yield row, stop
+
+
+def iter_candidate_rows(filename, prefilter, start=0, end=None):
+    """
+    Memory-map a CSV file and parse only the records containing a prefilter hit.
+
+    Args:
+        filename (str): The CSV file.
+        prefilter (re.Pattern): Bytes regex from Matcher.bytes_prefilter().
+        start (int): Offset of a record start where the scan begins.
+        end (int): Offset where the scan stops, expected on a record boundary.
+
+    Yields:
+        list of str: The parsed candidate rows, in file order.
+
+    Raises:
+        SplitInsideRecord: If end is before the end of the file and turns out
+            to lie inside a record.
+    """
+    with open(filename, mode='rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            size = len(buffer)
+            end = size if end is None else end
+            pos = start
+            while pos < end:
+                hit = prefilter.search(buffer, pos, end)
+                if hit is None:
+                    # A range ending before the file must end on a record boundary
+                    if end < size:
+                        proven = RECORDS.match(buffer, pos, end).end()
+                        for _ in _parse_from(buffer, proven, end, size):
+                            pass
+                    return
+                pos = _record_start(buffer, pos, hit.start())
+                record = RECORD.match(buffer, pos, end)
+                if record is not None and record.end() > hit.start():
+                    text = buffer[pos:record.end()].decode('utf-8')
+                    yield next(csv.reader(io.StringIO(text, newline='')))
+                    pos = record.end()
+                    continue
+                # Not well formed: parse up to the record holding the hit
+                for row, stop in _parse_from(buffer, pos, end, size):
+                    pos = stop
+                    if stop > hit.start():
+                        yield row
+                        break
+
+
+def _read_records(filename, start, end):
+    with open(filename, mode='rb') as file:
+        at_end = end >= os.fstat(file.fileno()).st_size
+        file.seek(start)
+        data = file.read(end - start)
+    lines = io.StringIO(data.decode('utf-8'), newline='')
+    if at_end:
+        yield from csv.reader(lines)
+        return
+    for row in csv.reader(chain(lines, [CHUNK_END])):
+        if row and row[-1].endswith(CHUNK_END):
+            if row == [CHUNK_END]:
+                return
+            raise SplitInsideRecord(f"Offset {end} is inside a record")
+        yield row
+
+
+def _records(filename, start, end, prefilter):
+    if prefilter is not None:
+        return iter_candidate_rows(filename, prefilter, start, end)
+    return _read_records(filename, start, end)
+
+
+def _match_rows(rows, matcher, with_hits):
+    for row in rows:
+        if with_hits:
+            hits = matcher.row_hits(row)
+            if hits:
+                yield row, hits
+        elif matcher.search_row(row):
+            yield row
+
+
+def _iter_column_matches(rows, matcher, index):
+    for row in rows:
+        if len(row) > index and row[index] and matcher.search(row[index]):
+            yield row[index]
+
+
+def _match_column(rows, matcher, index):
+    return set(_iter_column_matches(rows, matcher, index))
+
+
+def _scan_rows(task):
+    # None when the range turns out to end inside a record
+    filename, start, end, with_hits = task
+    try:
+        return list(_match_rows(_records(filename, start, end, _prefilter), _matcher, with_hits))
+    except SplitInsideRecord:
+        return None
+
+
+def _scan_column(task):
+    filename, start, end, index = task
+    try:
+        return _match_column(_records(filename, start, end, _prefilter), _matcher, index)
+    except SplitInsideRecord:
+        return None
+
+
+def _header(filename):
+    with open(filename, mode='rb') as file:
+        header, end, _ = next(iter_records(file, 0), ([], 0, True))
+    return header, end
+
+
+def _column_index(filename, column):
+    header, data_start = _header(filename)
+    return resolve_column(header, column), data_start
+
+
+def _chunk_size(filename, jobs):
+    # Several ranges per worker keep all of them busy until the end
+    return min(MAX_CHUNK_SIZE, max(MIN_CHUNK_SIZE, os.path.getsize(filename) // (jobs * 4) + 1))
+
+
+def _run(filename, jobs, worker, make_task, matcher, start=0, chunk_size=None):
+    # Yield the result of every range in file order, as soon as it is ready
+    from multiprocessing import Pool
+    matcher = compile_matcher(matcher)
+    init_args = (matcher.patterns, matcher.fixed_strings, matcher.ignore_case)
+    chunk_size = chunk_size or _chunk_size(filename, jobs)
+    with Pool(jobs, initializer=_init_worker, initargs=init_args) as pool:
+        chunks = split_records(filename, chunk_size, pool, start)
+        for (a, _), result in zip(chunks, pool.imap(worker, [make_task(a, b) for a, b in chunks])):
+            if result is None:
+                # The range ends inside a record, so the later split points
+                # cannot be trusted either; every earlier range ended between
+                # records, so this one starts a record, and the rest of the
+                # file is scanned from there in this process
+                _init_worker(*init_args)
+                yield worker(make_task(a, os.path.getsize(filename)))
+                return
+            yield result
+
+
+def iter_parallel_rows(filename, pattern, jobs, with_hits=False, chunk_size=None):
+    """
+    Search every cell of a CSV file using several worker processes.
+
+    Args:
+        filename (str): The CSV file.
+        pattern (str, list of str or Matcher): What to search for.
+        jobs (int): Number of worker processes.
+        with_hits (bool): Yield (row, patterns) pairs instead of rows.
+        chunk_size (int): Size of the byte ranges handed to workers.
+
+    Yields:
+        list: Matching rows in file order.
+    """
+    for chunk in _run(filename, jobs, _scan_rows, lambda a, b: (filename, a, b, with_hits), pattern,
+                      chunk_size=chunk_size):
+        yield from chunk
+
+
+def iter_parallel_column(filename, column, pattern, jobs, chunk_size=None):
+    """
+    Search one column of a CSV file using several worker processes, without
+    collecting the values of the whole file.
+
+    Args:
+        filename (str): The CSV file.
+        column (str): Name of the column in the header row, or its zero-based number or letter.
+        pattern (str, list of str or Matcher): What to search for.
+        jobs (int): Number of worker processes.
+        chunk_size (int): Size of the byte ranges handed to workers.
+
+    Yields:
+        str: The unique matching values of each range, range after range; a
+            value found in several ranges is yielded once for each.
+
+    Raises:
+        KeyError: If the column cannot be resolved.
+    """
+    index, data_start = _column_index(filename, column)
+    for values in _run(filename, jobs, _scan_column, lambda a, b: (filename, a, b, index), pattern,
+                       start=data_start, chunk_size=chunk_size):
+        yield from values
+
+
+def parallel_search_column(filename, column, pattern, jobs, chunk_size=None):
+    """
+    Search one column of a CSV file using several worker processes.
+
+    Args:
+        filename (str): The CSV file.
+        column (str): Name of the column in the header row, or its zero-based number or letter.
+        pattern (str, list of str or Matcher): What to search for.
+        jobs (int): Number of worker processes.
+        chunk_size (int): Size of the byte ranges handed to workers.
+
+    Returns:
+        set: Unique matching values.
+
+    Raises:
+        KeyError: If the column cannot be resolved.
+    """
+    return set(iter_parallel_column(filename, column, pattern, jobs, chunk_size))
+
+
+def iter_prefiltered_rows(filename, pattern, with_hits=False):
+    """
+    Search every cell of a CSV file, parsing only the records that contain a
+    raw byte match.
+
+    Args:
+        filename (str): The CSV file.
+        pattern (str, list of str or Matcher): Literal patterns to search for.
+        with_hits (bool): Yield (row, patterns) pairs instead of rows.
+
+    Yields:
+        list: Matching rows in file order.
+    """
+    matcher = compile_matcher(pattern)
+    yield from _match_rows(iter_candidate_rows(filename, matcher.bytes_prefilter()), matcher, with_hits)
+
+
+def iter_prefiltered_column(filename, column, pattern):
+    """
+    Search one column of a CSV file, parsing only the records that contain a
+    raw byte match.
+
+    Args:
+        filename (str): The CSV file.
+        column (str): Name of the column in the header row, or its zero-based number or letter.
+        pattern (str, list of str or Matcher): Literal patterns to search for.
+
+    Yields:
+        str: Every matching value, duplicates included, in file order.
+
+    Raises:
+        KeyError: If the column cannot be resolved.
+    """
+    matcher = compile_matcher(pattern)
+    index, data_start = _column_index(filename, column)
+    yield from _iter_column_matches(iter_candidate_rows(filename, matcher.bytes_prefilter(), data_start), matcher, index)
+
+
+def prefiltered_search_column(filename, column, pattern):
+    """
+    Search one column of a CSV file, parsing only the records that contain a
+    raw byte match.
+
+    Args:
+        filename (str): The CSV file.
+        column (str): Name of the column in the header row, or its zero-based number or letter.
+        pattern (str, list of str or Matcher): Literal patterns to search for.
+
+    Returns:
+        set: Unique matching values.
+
+    Raises:
+        KeyError: If the column cannot be resolved.
+    """
+    return set(iter_prefiltered_column(filename, column, pattern))
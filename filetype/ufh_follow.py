@@ -0,0 +1,172 @@
+"""
+Follow mode: search only what was appended to a CSV file since the last run.
+
+A checkpoint records how far a file has been scanned for one query (the
+operation, its column and its patterns): the byte offset just past the last
+complete record, a hash of the header record, and for a column search the
+unique matching values found so far. The next run resumes at that offset,
+parses only the records appended since, and merges their values into the
+previous ones.
+
+Records are parsed with csv.reader, which also tells where each one ends. A
+record is complete once it ends with a newline outside quotes, so a record
+still being written is left for the next run. The file is scanned from the
+start again when it is shorter than the checkpoint, was replaced by another
+file, or has a different header.
+
+Checkpoints are small JSON files stored next to the data file (or at an
+explicit path), written atomically once a scan has been fully consumed.
+"""
+import hashlib
+import json
+import os
+
+from ufh_compress import compression_of
+from ufh_csvscan import iter_records
+
+FOLLOW_SUFFIX = '.ufhfollow'
+FOLLOW_VERSION = 1
+
+
+def checkpoint_path(filename, query):
+    """
+    Return the default checkpoint location of a file and a query.
+    """
+    digest = hashlib.sha1(json.dumps(query, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    directory = os.path.dirname(os.path.abspath(filename))
+    return os.path.join(directory, f'.{os.path.basename(filename)}.{digest}{FOLLOW_SUFFIX}')
+
+
+def follow_query(operation, matcher, column=None, where=()):
+    """
+    Describe a search for its checkpoint: a change in any part of it starts
+    the scan over.
+    """
+    query = {'operation': operation, 'column': column, 'where': [repr(f) for f in where]}
+    if matcher is not None:
+        query.update(patterns=matcher.patterns, fixed_strings=matcher.fixed_strings,
+                     ignore_case=matcher.ignore_case)
+    return query
+
+
+class Checkpoint:
+    """
+    How far one query has scanned a growing CSV file.
+
+    Attributes:
+        filename (str): The followed CSV file.
+        query (dict): The operation the checkpoint belongs to.
+        path (str): Location of the checkpoint file.
+        offset (int): Offset just past the last record scanned.
+        header (list of str): The header record.
+        values (list of str): Unique values found so far by a column search.
+        resumed (bool): Whether the scan resumes a previous one rather than
+            starting at the beginning of the file.
+    """
+    def __init__(self, filename, query, path=None):
+        if compression_of(filename) is not None:
+            raise ValueError("Compressed files cannot be followed")
+        self.filename = filename
+        self.query = query
+        self.path = path or checkpoint_path(filename, query)
+        self.offset = 0
+        self.header = None
+        self.values = []
+        self.resumed = False
+        self._header_end = 0
+        self._header_hash = None
+        self._identity = None
+        self._end = None
+        self._load()
+
+    def _file_identity(self):
+        stat = os.stat(self.filename)
+        return [stat.st_dev, stat.st_ino], stat.st_size
+
+    def _read_header(self, file):
+        # The first record, where it ends and a hash of its bytes; None while
+        # the file does not hold a complete one yet
+        file.seek(0)
+        header, end, complete = next(iter_records(file, 0), (None, 0, False))
+        if not complete:
+            return None, 0, None
+        file.seek(0)
+        return header, end, hashlib.sha1(file.read(end)).hexdigest()
+
+    def _load(self):
+        identity, size = self._file_identity()
+        self._identity = identity
+        try:
+            with open(self.path, mode='r', encoding='utf-8') as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return
+        if state.get('version') != FOLLOW_VERSION or state.get('query') != self.query:
+            return
+        if state.get('identity') != identity or state.get('offset', 0) > size:
+            return  # Rotated or truncated: scan from the start
+        with open(self.filename, mode='rb') as file:
+            file.seek(0)
+            if hashlib.sha1(file.read(state['header_end'])).hexdigest() != state['header_hash']:
+                return
+        self.offset = state['offset']
+        self.header = state['header']
+        self.values = state.get('values', [])
+        self._header_end = state['header_end']
+        self._header_hash = state['header_hash']
+        self.resumed = True
+
+    def new_rows(self):
+        """
+        Return the complete records appended since the checkpoint. When the
+        scan starts from the beginning of the file, the header record is read
+        first; it is not among the records returned either way.
+
+        Returns:
+            iterator of list of str: Each new record, in file order.
+        """
+        if not self.resumed:
+            with open(self.filename, mode='rb') as file:
+                self.header, self._header_end, self._header_hash = self._read_header(file)
+            self.offset = self._header_end
+        self._end = self.offset
+        if self.header is None:
+            return iter(())
+        return self._complete_records()
+
+    def _complete_records(self):
+        with open(self.filename, mode='rb') as file:
+            file.seek(self.offset)
+            for row, end, complete in iter_records(file, self.offset):
+                if not complete:
+                    break  # Still being written
+                self._end = end
+                yield row
+
+    def commit(self, values=None):
+        """
+        Record that the records returned by new_rows so far have been processed.
+
+        Args:
+            values (iterable of str): The unique values of a column search,
+                previous ones included.
+        """
+        if self._end is None:
+            return
+        self.offset = self._end
+        if values is not None:
+            self.values = sorted(values)
+        state = {
+            'version': FOLLOW_VERSION,
+            'query': self.query,
+            'identity': self._identity,
+            'offset': self.offset,
+            'header': self.header,
+            'header_end': self._header_end,
+            'header_hash': self._header_hash,
+            'values': self.values,
+        }
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(temp_path, mode='w', encoding='utf-8') as file:
+            json.dump(state, file)
+        os.replace(temp_path, self.path)
@@ -0,0 +1,229 @@
+"""
+Persistent sidecar index of a single column, for repeated column searches.
+
+The index is a small SQLite database stored next to the data file (or in an
+index directory). It maps every distinct value of the column to the numbers
+of the rows holding it, and keeps a trigram table of the distinct values so
+that literal patterns, and regexes containing a literal run, only have to be
+checked against the values sharing their trigrams. The index records the
+path, size and modification time of the file it was built from and is rebuilt
+automatically when any of them changes.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+from array import array
+from contextlib import closing
+
+from ufh_match import compile_matcher, is_literal
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+INDEX_VERSION = '1'
+INDEX_SUFFIX = '.ufhidx'
+# Enough trigrams to make the candidate set small without an oversized query
+MAX_QUERY_TRIGRAMS = 16
+# Stays below SQLite's limit on the number of host parameters
+QUERY_BATCH = 500
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE vals (id INTEGER PRIMARY KEY, value TEXT UNIQUE, rows BLOB);
+CREATE TABLE trigrams (trigram TEXT, value_id INTEGER, PRIMARY KEY (trigram, value_id)) WITHOUT ROWID;
+"""
+
+
+def trigrams(text):
+    """
+    Return the set of three-character substrings of a text.
+    """
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def required_literals(pattern, literal=False):
+    """
+    Find literal runs that every match of a pattern must contain.
+
+    Only runs at the top level of the regex are considered, so the result is
+    conservative: an empty list means nothing is known about the matches.
+
+    Args:
+        pattern (str): The string or regex pattern.
+        literal (bool): Treat the pattern as a literal string.
+
+    Returns:
+        list of str: Literal runs of at least three characters.
+    """
+    if literal or is_literal(pattern):
+        return [pattern] if len(pattern) >= 3 else []
+    try:
+        parsed = sre_parse.parse(pattern)
+    except (re.error, AttributeError, TypeError):
+        return []
+    if parsed.state.flags & (re.IGNORECASE | re.VERBOSE):
+        return []
+    runs, current = [], []
+    for op, value in parsed:
+        if op == sre_parse.LITERAL:
+            current.append(chr(value))
+        else:
+            runs.append(''.join(current))
+            current = []
+    runs.append(''.join(current))
+    return [run for run in runs if len(run) >= 3]
+
+
+class ColumnIndex:
+    """
+    On-disk index of the distinct values of one column of a file.
+
+    Attributes:
+        filename (str): The indexed data file.
+        column (str or int): The indexed column.
+        sheet (int or str): The sheet of the column; None for the first one.
+        path (str): Location of the index database.
+    """
+    def __init__(self, filename, column, index_dir=None, sheet=None):
+        self.filename = filename
+        self.column = column
+        self.sheet = sheet
+        key = column if sheet is None else (sheet, column)
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:16]
+        directory = index_dir or os.path.dirname(os.path.abspath(filename))
+        self.path = os.path.join(directory, f'.{os.path.basename(filename)}.{digest}{INDEX_SUFFIX}')
+
+    def _source_key(self):
+        stat = os.stat(self.filename)
+        return {
+            'version': INDEX_VERSION,
+            'path': os.path.abspath(self.filename),
+            'size': str(stat.st_size),
+            'mtime_ns': str(stat.st_mtime_ns),
+            'column': repr(self.column),
+            'sheet': repr(self.sheet),
+        }
+
+    def is_fresh(self):
+        """
+        Tell whether the index exists and was built from the current file.
+
+        Returns:
+            bool: True if the index can be used as is.
+        """
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with closing(sqlite3.connect(self.path)) as conn:
+                meta = dict(conn.execute('SELECT key, value FROM meta'))
+        except sqlite3.Error:
+            return False
+        return meta == self._source_key()
+
+    def build(self, values):
+        """
+        Build the index from the column values, replacing any previous index.
+
+        Args:
+            values (iterable): The column value of every row in order; None
+                marks a row without a value.
+        """
+        key = self._source_key()
+        postings = {}
+        for row_number, value in enumerate(values):
+            if value is not None:
+                postings.setdefault(value, array('q')).append(row_number)
+
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        with closing(sqlite3.connect(temp_path)) as conn:
+            conn.executescript(SCHEMA)
+            conn.executemany('INSERT INTO meta VALUES (?, ?)', key.items())
+            conn.executemany('INSERT INTO vals VALUES (?, ?, ?)',
+                             ((i, value, rows.tobytes()) for i, (value, rows) in enumerate(postings.items())))
+            conn.executemany('INSERT INTO trigrams VALUES (?, ?)',
+                             ((gram, i) for i, value in enumerate(postings) for gram in trigrams(value)))
+            conn.commit()
+        os.replace(temp_path, self.path)
+
+    def _candidates(self, conn, matcher):
+        # Ids of the values that may match, or None when every value must be checked
+        if matcher.ignore_case:
+            return None
+        candidates = set()
+        for pattern in matcher.patterns:
+            grams = set()
+            for run in required_literals(pattern, matcher.fixed_strings):
+                grams |= trigrams(run)
+            if not grams:
+                return None
+            grams = sorted(grams)[:MAX_QUERY_TRIGRAMS]
+            query = ' INTERSECT '.join(['SELECT value_id FROM trigrams WHERE trigram = ?'] * len(grams))
+            candidates.update(value_id for (value_id,) in conn.execute(query, grams))
+        return candidates
+
+    def search(self, pattern):
+        """
+        Find the distinct values of the column that match a pattern.
+
+        Args:
+            pattern (str, list of str or Matcher): What to search for.
+
+        Returns:
+            set: Unique matching values.
+        """
+        matcher = compile_matcher(pattern)
+        with closing(sqlite3.connect(self.path)) as conn:
+            candidates = self._candidates(conn, matcher)
+            if candidates is None:
+                return {value for (value,) in conn.execute('SELECT value FROM vals') if matcher.search(value)}
+            results = set()
+            candidates = sorted(candidates)
+            for i in range(0, len(candidates), QUERY_BATCH):
+                batch = candidates[i:i + QUERY_BATCH]
+                query = f"SELECT value FROM vals WHERE id IN ({', '.join('?' * len(batch))})"
+                results.update(value for (value,) in conn.execute(query, batch) if matcher.search(value))
+            return results
+
+    def rows(self, value):
+        """
+        Return the numbers of the rows holding a value.
+
+        Args:
+            value (str): The exact column value.
+
+        Returns:
+            list of int: Zero-based data row numbers, in file order.
+        """
+        with closing(sqlite3.connect(self.path)) as conn:
+            found = conn.execute('SELECT rows FROM vals WHERE value = ?', (value,)).fetchone()
+        if found is None:
+            return []
+        rows = array('q')
+        rows.frombytes(found[0])
+        return rows.tolist()
+
+
+def open_column_index(filename, column, values, index_dir=None, sheet=None):
+    """
+    Open the index of a column, building or rebuilding it when it is stale.
+
+    Args:
+        filename (str): The data file.
+        column (str or int): The column to index.
+        values (callable): Returns an iterable of the column values of every
+            row, used only when the index has to be built.
+        index_dir (str): Directory for the index instead of the file's own.
+        sheet (int or str): The sheet of the column; None for the first one.
+
+    Returns:
+        ColumnIndex: A fresh index.
+    """
+    index = ColumnIndex(filename, column, index_dir, sheet)
+    if not index.is_fresh():
+        index.build(values())
+    return index
@@ -0,0 +1,344 @@
+"""
+Compiled multi-pattern matching for the Universal File Handler.
+
+A Matcher is built once from one or many patterns and then reused for every
+cell of a scan. Plain literals (patterns without regex metacharacters, or all
+patterns when fixed_strings is set) are combined into a single Aho-Corasick
+automaton (or a plain alternation when there are only a few of them), the
+remaining regexes into a single alternation, so a whole watchlist is checked in
+one pass over the file.
+"""
+import re
+from bisect import bisect_right
+from itertools import accumulate, compress, count, zip_longest
+
+REGEX_METACHARS = frozenset('.^$*+?{}[]\\|()')
+# Joins the cells of a row for literal scanning; literals cannot span it
+ROW_SEPARATOR = '\x00'
+# Regexes that refer to their own groups cannot be merged into one alternation
+BACKREFERENCE = re.compile(r'\\[1-9]|\(\?P=')
+# Up to this many literals a C-level regex alternation beats the pure-Python
+# automaton; above it the automaton wins as its cost does not grow with size.
+LITERAL_ALTERNATION_LIMIT = 32
+
+try:
+    import ahocorasick  # Optional C implementation (pyahocorasick)
+except ImportError:
+    ahocorasick = None
+
+
+def is_literal(pattern):
+    """
+    Tell whether a pattern has no regex metacharacters.
+
+    Args:
+        pattern (str): The pattern to inspect.
+
+    Returns:
+        bool: True if the pattern matches only itself.
+    """
+    return bool(pattern) and not any(char in REGEX_METACHARS for char in pattern)
+
+
+def load_patterns(path):
+    """
+    Read patterns from a file, one per line. Blank lines and lines starting
+    with '#' are skipped.
+
+    Args:
+        path (str): The patterns file.
+
+    Returns:
+        list of str: The patterns in file order.
+    """
+    patterns = []
+    with open(path, mode='r', encoding='utf-8') as file:
+        for line in file:
+            line = line.rstrip('\r\n')
+            if line.strip() and not line.lstrip().startswith('#'):
+                patterns.append(line)
+    return patterns
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton reporting which of many literals occur in a text.
+
+    Attributes:
+        words (list of str): The literals, indexed by pattern id.
+    """
+    def __init__(self, words):
+        self.words = list(words)
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for pattern_id, word in enumerate(self.words):
+                ids = self._automaton.get(word, ())
+                self._automaton.add_word(word, ids + (pattern_id,))
+            self._automaton.make_automaton()
+            return
+        self._automaton = None
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        for pattern_id, word in enumerate(self.words):
+            state = 0
+            for char in word:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                state = next_state
+            self._out[state] += (pattern_id,)
+        # Breadth-first pass to fill failure links and merge outputs
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[next_state] = fail
+                self._out[next_state] += self._out[fail]
+
+    def iter_hits(self, text):
+        """
+        Yield the pattern ids found in a text, in order of occurrence.
+
+        Args:
+            text (str): The text to scan.
+
+        Yields:
+            int: Pattern id of each occurrence (may repeat).
+        """
+        if self._automaton is not None:
+            for _, ids in self._automaton.iter(text):
+                yield from ids
+            return
+        goto, fail, out = self._goto, self._fail, self._out
+        root = goto[0]
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0) if state else root.get(char, 0)
+            if out[state]:
+                yield from out[state]
+
+    def search(self, text):
+        """
+        Tell whether any literal occurs in a text, stopping at the first hit.
+        """
+        for _ in self.iter_hits(text):
+            return True
+        return False
+
+
+class Matcher:
+    """
+    One or many patterns compiled once and applied to cells or whole rows.
+
+    Attributes:
+        patterns (list of str): The patterns, in the order they were given.
+        fixed_strings (bool): Treat every pattern as a literal.
+        ignore_case (bool): Match without regard to case.
+    """
+    def __init__(self, patterns, fixed_strings=False, ignore_case=False):
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        self.patterns = list(patterns)
+        if not self.patterns:
+            raise ValueError("No pattern to search for")
+        self.fixed_strings = fixed_strings
+        self.ignore_case = ignore_case
+        flags = re.IGNORECASE if ignore_case else 0
+
+        literal_ids, regex_ids = [], []
+        for i, p in enumerate(self.patterns):
+            (literal_ids if p and (fixed_strings or is_literal(p)) else regex_ids).append(i)
+
+        self._literal_ids = literal_ids
+        self._words = [self._fold(self.patterns[i]) for i in literal_ids]
+        self._literals = None
+        if ahocorasick is not None or len(self._words) > LITERAL_ALTERNATION_LIMIT:
+            self._literals = AhoCorasick(self._words)
+        elif self._words:
+            by_length = sorted(set(self._words), key=len, reverse=True)
+            self._literals = re.compile('|'.join(map(re.escape, by_length)))
+
+        # Every regex is compiled on its own to report hits, and the mergeable
+        # ones are also combined into a single alternation that gates them.
+        self._regexes = [(i, re.compile(self.patterns[i], flags)) for i in regex_ids]
+        mergeable = [p.pattern for _, p in self._regexes if not BACKREFERENCE.search(p.pattern)]
+        self._combined = None
+        self._standalone = [p for _, p in self._regexes if BACKREFERENCE.search(p.pattern)]
+        if mergeable:
+            try:
+                self._combined = re.compile('|'.join(f'(?:{p})' for p in mergeable), flags)
+            except re.error:
+                # e.g. inline global flags that are only allowed at the start
+                self._standalone = [p for _, p in self._regexes]
+
+    def bytes_prefilter(self, quotechar='"'):
+        """
+        Build a regex over raw UTF-8 bytes that finds every place a match can
+        start, for scanning a CSV file before it is decoded.
+
+        A literal occurs in a decoded cell exactly when its UTF-8 encoding
+        occurs in the raw record, either as is or, inside a quoted field, with
+        the quote character doubled. This is only possible when every pattern
+        is a case-sensitive literal: regexes have different semantics on bytes
+        (e.g. '.' or '\\w' on multi-byte characters).
+
+        Args:
+            quotechar (str): The CSV quote character.
+
+        Returns:
+            re.Pattern or None: The bytes regex, or None if the patterns
+                cannot be prefiltered.
+        """
+        if self._regexes or self.ignore_case or len(self._words) > LITERAL_ALTERNATION_LIMIT:
+            return None
+        variants = set(self._words) | {word.replace(quotechar, quotechar * 2) for word in self._words}
+        by_length = sorted((word.encode('utf-8') for word in variants), key=len, reverse=True)
+        return re.compile(b'|'.join(map(re.escape, by_length)))
+
+    def _fold(self, text):
+        return text.lower() if self.ignore_case else text
+
+    def _regex_search(self, text):
+        if self._combined is not None and self._combined.search(text):
+            return True
+        return any(p.search(text) for p in self._standalone)
+
+    def search(self, text):
+        """
+        Tell whether any pattern matches a single value.
+
+        Args:
+            text (str): The cell value.
+
+        Returns:
+            bool: True if at least one pattern matches.
+        """
+        if self._literals is not None and self._literals.search(self._fold(text)):
+            return True
+        return bool(self._regexes) and self._regex_search(text)
+
+    def search_row(self, row):
+        """
+        Tell whether any pattern matches any cell of a row.
+
+        Args:
+            row (iterable): The cells; non-string values are matched on str().
+
+        Returns:
+            bool: True if at least one cell matches.
+        """
+        cells = [cell if isinstance(cell, str) else str(cell) for cell in row]
+        if self._literals is not None and self._literals.search(self._fold(ROW_SEPARATOR.join(cells))):
+            return True
+        return bool(self._regexes) and any(self._regex_search(cell) for cell in cells)
+
+    def matching_rows(self, rows):
+        """
+        Find the rows in which any pattern matches any cell, for a whole batch
+        of rows at once.
+
+        Literals are searched in a single pass over the rows joined together,
+        and regexes are mapped over each column of the remaining rows, so the
+        work per cell stays in C instead of in a Python call.
+
+        Args:
+            rows (list of sequence): The rows; non-string values are matched
+                on str().
+
+        Returns:
+            set of int: Indexes of the matching rows.
+        """
+        try:
+            texts = list(map(ROW_SEPARATOR.join, rows))
+        except TypeError:
+            rows = [list(map(str, row)) for row in rows]
+            texts = list(map(ROW_SEPARATOR.join, rows))
+        found = set()
+        if self._literals is not None:
+            if self.ignore_case:
+                texts = list(map(str.lower, texts))
+            if isinstance(self._literals, AhoCorasick):
+                found.update(compress(count(), map(self._literals.search, texts)))
+            else:
+                text = ROW_SEPARATOR.join(texts)
+                # ends[i] is where the row after row i starts in text
+                ends = list(accumulate(map((1).__add__, map(len, texts))))
+                match = self._literals.search(text)
+                while match:
+                    i = bisect_right(ends, match.start())
+                    found.add(i)
+                    match = self._literals.search(text, ends[i])
+        if self._regexes:
+            remaining = [i for i in range(len(rows)) if i not in found]
+            search = self._regex_search if self._standalone else self._combined.search
+            # Cells missing from short rows are filled with None and skipped
+            for column in zip_longest(*[rows[i] for i in remaining]):
+                if None in column:
+                    found.update(remaining[k] for k, cell in enumerate(column) if cell is not None and search(cell))
+                else:
+                    found.update(remaining[k] for k in compress(count(), map(search, column)))
+        return found
+
+    def hits(self, text):
+        """
+        List the patterns that match a single value.
+
+        Args:
+            text (str): The cell value.
+
+        Returns:
+            list of str: Matching patterns, in pattern order.
+        """
+        return self.row_hits([text])
+
+    def row_hits(self, row):
+        """
+        List the patterns that match any cell of a row.
+
+        Args:
+            row (iterable): The cells; non-string values are matched on str().
+
+        Returns:
+            list of str: Matching patterns, in pattern order.
+        """
+        cells = [cell if isinstance(cell, str) else str(cell) for cell in row]
+        found = set()
+        if self._literals is not None:
+            text = self._fold(ROW_SEPARATOR.join(cells))
+            if isinstance(self._literals, AhoCorasick):
+                found.update(self._literal_ids[i] for i in self._literals.iter_hits(text))
+            elif self._literals.search(text):
+                found.update(i for i, word in zip(self._literal_ids, self._words) if word in text)
+        if self._regexes and any(self._regex_search(cell) for cell in cells):
+            for pattern_id, regex in self._regexes:
+                if any(regex.search(cell) for cell in cells):
+                    found.add(pattern_id)
+        return [self.patterns[i] for i in sorted(found)]
+
+
+def compile_matcher(pattern, fixed_strings=False, ignore_case=False):
+    """
+    Build a Matcher from a pattern, a list of patterns, or an existing Matcher.
+
+    Args:
+        pattern (str, list of str or Matcher): What to search for.
+        fixed_strings (bool): Treat every pattern as a literal.
+        ignore_case (bool): Match without regard to case.
+
+    Returns:
+        Matcher: The compiled matcher.
+    """
+    if isinstance(pattern, Matcher):
+        return pattern
+    return Matcher(pattern, fixed_strings=fixed_strings, ignore_case=ignore_case)
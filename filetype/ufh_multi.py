@@ -0,0 +1,236 @@
+"""
+Multi-file mode: sweep many files of mixed formats in one run.
+
+Inputs may be files, directories (searched recursively for supported files)
+or glob patterns. A path that exists is never taken as a pattern, and a file
+named explicitly is read whatever its extension, its format being sniffed
+from its content. Each file is handed to a worker process, which opens it
+with the handler for its format and searches it; the results of all files are
+merged in input order, every result tagged with its source file and its
+one-based row number (the header row being row 1). A file that cannot be read
+is reported and skipped without stopping the others.
+
+With sheets, every requested sheet of every file is a task of its own, so the
+sheets of one workbook are scanned concurrently, each worker loading only its
+sheet; results are then tagged with the sheet name after the filename.
+"""
+import glob
+import os
+import sys
+
+from ufh_backends import supported_extensions
+from ufh_match import compile_matcher
+from ufh_rows import cell_at, resolve_column
+
+GLOB_CHARS = frozenset('*?[')
+
+# Per-process state set up by the pool initializer
+_matcher = None
+_open_handler = None
+
+
+def _is_pattern(path):
+    # Existing paths may contain '[', '?' or '*' and still be plain paths
+    return not os.path.exists(path) and bool(GLOB_CHARS.intersection(path))
+
+
+def expand_inputs(inputs):
+    """
+    Expand files, directories and glob patterns into a list of files.
+
+    Args:
+        inputs (iterable of str): The paths given on the command line.
+
+    Returns:
+        list of str: The files named explicitly, and the files with the
+            extension of a registered backend found in directories or by
+            patterns, sorted within each input and without duplicates, in
+            input order. A pattern that matches no such file is reported on
+            stderr.
+    """
+    files = []
+    seen = set()
+    extensions = supported_extensions()
+    for path in inputs:
+        if os.path.isdir(path):
+            found = [os.path.join(root, name) for root, _, names in os.walk(path) for name in names]
+        elif _is_pattern(path):
+            found = glob.glob(path, recursive=True)
+        else:
+            # Named explicitly: kept even when missing, to be reported when read
+            found = None
+        if found is None:
+            selected = [path]
+        else:
+            selected = [filename for filename in sorted(found) if filename.lower().endswith(extensions)]
+            if not selected and _is_pattern(path):
+                print(f"Warning: no supported files match {path}", file=sys.stderr)
+        for filename in selected:
+            if filename not in seen:
+                seen.add(filename)
+                files.append(filename)
+    return files
+
+
+def expand_sheets(files, sheets, open_handler):
+    """
+    List the (file, sheet) pairs to scan.
+
+    Args:
+        files (list of str): The files to scan.
+        sheets (str or list of str): 'all', or sheet names; a number that is
+            not the name of a sheet is a zero-based sheet index.
+        open_handler (callable): Returns the handler for a filename.
+
+    Returns:
+        list of tuple: (filename, sheet) for every sheet in order, where sheet
+            is None for formats without sheets, or for a file whose sheets
+            could not be listed so that its error is reported when scanned.
+    """
+    targets = []
+    for filename in files:
+        try:
+            names = open_handler(filename).sheet_names()
+        except Exception:
+            names = None
+        if names is None:
+            targets.append((filename, None))
+        elif sheets == 'all':
+            targets.extend((filename, name) for name in names)
+        else:
+            for name in sheets:
+                if name not in names and name.isdigit() and int(name) < len(names):
+                    name = names[int(name)]
+                targets.append((filename, name))
+    return targets
+
+
+def is_multi_file(inputs):
+    """
+    Tell whether the inputs name anything other than a single plain file.
+    """
+    return len(inputs) != 1 or os.path.isdir(inputs[0]) or _is_pattern(inputs[0])
+
+
+def _init_worker(patterns, fixed_strings, ignore_case, open_handler):
+    global _matcher, _open_handler
+    _matcher = compile_matcher(patterns, fixed_strings, ignore_case)
+    _open_handler = open_handler
+
+
+def _source(filename, sheet):
+    # What results are tagged with, and errors reported against
+    if sheet is None:
+        return filename, [filename]
+    return f'{filename}:{sheet}', [filename, sheet]
+
+
+def _open(filename, sheet):
+    return _open_handler(filename) if sheet is None else _open_handler(filename, sheet=sheet)
+
+
+def _search_file(task):
+    filename, sheet, with_hits = task
+    source, tags = _source(filename, sheet)
+    results = []
+    try:
+        for row_number, row in enumerate(_open(filename, sheet).iter_rows(), 1):
+            if with_hits:
+                hits = _matcher.row_hits(row)
+                if hits:
+                    results.append(([*tags, row_number, *row], hits))
+            elif _matcher.search_row(row):
+                results.append([*tags, row_number, *row])
+    except Exception as e:
+        return source, results, str(e)
+    return source, results, None
+
+
+def _search_column_file(task):
+    filename, sheet, column = task
+    source, tags = _source(filename, sheet)
+    results = []
+    try:
+        rows = iter(_open(filename, sheet).iter_rows())
+        index = resolve_column(next(rows, ()), column)
+        seen = set()
+        for row_number, row in enumerate(rows, 2):
+            value = cell_at(row, index)
+            if value is None or value == '':
+                continue
+            value = str(value)
+            if value not in seen and _matcher.search(value):
+                seen.add(value)
+                results.append([*tags, row_number, value])
+    except Exception as e:
+        return source, results, str(e)
+    return source, results, None
+
+
+def _targets(files, sheets, open_handler):
+    # Files may also be given as (filename, sheet) pairs from expand_sheets
+    if sheets is not None:
+        return expand_sheets(files, sheets, open_handler)
+    return [(target, None) if isinstance(target, str) else tuple(target) for target in files]
+
+
+def _run(jobs, worker, tasks, matcher, open_handler):
+    matcher = compile_matcher(matcher)
+    init_args = (matcher.patterns, matcher.fixed_strings, matcher.ignore_case, open_handler)
+    if jobs <= 1:
+        _init_worker(*init_args)
+        yield from map(worker, tasks)
+        return
+    from multiprocessing import Pool
+    with Pool(min(jobs, len(tasks)) or 1, initializer=_init_worker, initargs=init_args) as pool:
+        yield from pool.imap(worker, tasks)
+
+
+def iter_multi_matches(files, pattern, open_handler, jobs=1, with_hits=False, sheets=None):
+    """
+    Search every cell of many files, one worker process per file (or sheet)
+    at a time.
+
+    Args:
+        files (list): The files to search, or (filename, sheet) pairs.
+        pattern (str, list of str or Matcher): What to search for.
+        open_handler (callable): Returns the handler for a filename; must be
+            picklable, i.e. a module-level function.
+        jobs (int): Number of worker processes.
+        with_hits (bool): Give (row, patterns) pairs instead of rows.
+        sheets (str or list of str): Search these sheets of each file, or
+            'all' of them (see expand_sheets), instead of the first one.
+
+    Yields:
+        tuple: (source, results, error) for every file (or sheet) in order,
+            where each result row starts with the filename, the sheet name
+            when sheets are given, and the row number, and error is None or
+            the message of the failure that stopped the file.
+    """
+    tasks = [(filename, sheet, with_hits) for filename, sheet in _targets(files, sheets, open_handler)]
+    yield from _run(jobs, _search_file, tasks, pattern, open_handler)
+
+
+def iter_multi_unique(files, column, pattern, open_handler, jobs=1, sheets=None):
+    """
+    Search one column of many files. The column is resolved against the header
+    row of each file by name, then as a zero-based number or a column letter.
+
+    Args:
+        files (list): The files to search, or (filename, sheet) pairs.
+        column (str): The column name, number or letter.
+        pattern (str, list of str or Matcher): What to search for.
+        open_handler (callable): Returns the handler for a filename; must be
+            picklable, i.e. a module-level function.
+        jobs (int): Number of worker processes.
+        sheets (str or list of str): Search these sheets of each file, or
+            'all' of them, instead of the first one.
+
+    Yields:
+        tuple: (source, results, error) for every file (or sheet) in order,
+            where each result is [filename, row number, value], or
+            [filename, sheet, row number, value] when sheets are given, for
+            the first row holding each unique matching value of the sheet.
+    """
+    tasks = [(filename, sheet, column) for filename, sheet in _targets(files, sheets, open_handler)]
+    yield from _run(jobs, _search_column_file, tasks, pattern, open_handler)
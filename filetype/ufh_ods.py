@@ -0,0 +1,194 @@
+"""
+Streaming reader for OpenDocument spreadsheets (.ods).
+
+content.xml is read straight out of the zip archive and fed to an incremental
+XML parser, so rows are produced while the file is being parsed and parsed
+elements are discarded as soon as they have been turned into values. Repeated
+cells and rows (table:number-columns-repeated / table:number-rows-repeated)
+are expanded lazily, and the trailing run of empty cells or rows that
+spreadsheet applications pad every sheet with is dropped.
+"""
+import zipfile
+from xml.etree.ElementTree import XMLPullParser
+
+OFFICE_NS = 'urn:oasis:names:tc:opendocument:xmlns:office:1.0'
+TABLE_NS = 'urn:oasis:names:tc:opendocument:xmlns:table:1.0'
+TEXT_NS = 'urn:oasis:names:tc:opendocument:xmlns:text:1.0'
+
+SPREADSHEET = f'{{{OFFICE_NS}}}spreadsheet'
+TABLE = f'{{{TABLE_NS}}}table'
+TABLE_NAME = f'{{{TABLE_NS}}}name'
+TABLE_ROW = f'{{{TABLE_NS}}}table-row'
+TABLE_CELL = f'{{{TABLE_NS}}}table-cell'
+COVERED_CELL = f'{{{TABLE_NS}}}covered-table-cell'
+ROWS_REPEATED = f'{{{TABLE_NS}}}number-rows-repeated'
+COLUMNS_REPEATED = f'{{{TABLE_NS}}}number-columns-repeated'
+TEXT_P = f'{{{TEXT_NS}}}p'
+TEXT_H = f'{{{TEXT_NS}}}h'
+TEXT_S = f'{{{TEXT_NS}}}s'
+TEXT_C = f'{{{TEXT_NS}}}c'
+TEXT_TAB = f'{{{TEXT_NS}}}tab'
+TEXT_LINE_BREAK = f'{{{TEXT_NS}}}line-break'
+VALUE_TYPE = f'{{{OFFICE_NS}}}value-type'
+VALUE_ATTRIBUTES = tuple(f'{{{OFFICE_NS}}}{name}' for name in (
+    'string-value', 'value', 'date-value', 'time-value', 'boolean-value'))
+
+CHUNK_SIZE = 1 << 16
+# Stands for the text of a non-empty cell that was not asked for
+SKIPPED = object()
+
+
+def _paragraph_text(elem):
+    parts = [elem.text or '']
+    for child in elem:
+        if child.tag == TEXT_S:
+            parts.append(' ' * int(child.get(TEXT_C, '1')))
+        elif child.tag == TEXT_TAB:
+            parts.append('\t')
+        elif child.tag == TEXT_LINE_BREAK:
+            parts.append('\n')
+        else:
+            parts.append(_paragraph_text(child))
+        parts.append(child.tail or '')
+    return ''.join(parts)
+
+
+def cell_text(cell):
+    """
+    Return the displayed text of a table cell element.
+
+    Args:
+        cell (Element): A table:table-cell element.
+
+    Returns:
+        str: The paragraphs of the cell joined by newlines, or the typed
+            office value when the cell has no text.
+    """
+    paragraphs = [_paragraph_text(child) for child in cell if child.tag in (TEXT_P, TEXT_H)]
+    if paragraphs:
+        return '\n'.join(paragraphs)
+    for attribute in VALUE_ATTRIBUTES:
+        value = cell.get(attribute)
+        if value is not None:
+            return value
+    return ''
+
+
+def _is_empty(cell):
+    # Whether the cell holds nothing, without building its text: a value is
+    # always typed, and text is always in a child element
+    return not len(cell) and cell.get(VALUE_TYPE) is None
+
+
+def iter_events(filename):
+    """
+    Yield (event, element) pairs while content.xml is parsed incrementally.
+    """
+    parser = XMLPullParser(events=('start', 'end'))
+    with zipfile.ZipFile(filename) as archive, archive.open('content.xml') as content:
+        while True:
+            chunk = content.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            parser.feed(chunk)
+            yield from parser.read_events()
+        parser.close()
+        yield from parser.read_events()
+
+
+def iter_ods_rows(filename, sheet=0, columns=None):
+    """
+    Stream the rows of one sheet of an ODS file.
+
+    Args:
+        filename (str): The ODS file.
+        sheet (int or str): Index or name of the sheet to read.
+        columns (set of int): Zero-based indexes of the only cells whose text
+            is needed; other non-empty cells are given as SKIPPED.
+
+    Yields:
+        tuple of str: The cell texts of each row, without trailing empty cells.
+
+    Raises:
+        KeyError: If the file has no such sheet.
+    """
+    stack = []
+    table_index = -1
+    in_sheet = False
+    row = None
+    column = 0
+    pending_cells = 0
+    pending_rows = 0
+
+    for event, elem in iter_events(filename):
+        if event == 'start':
+            if elem.tag == TABLE and stack and stack[-1].tag == SPREADSHEET:
+                table_index += 1
+                in_sheet = sheet == table_index or sheet == elem.get(TABLE_NAME)
+            elif in_sheet and elem.tag == TABLE_ROW:
+                row = []
+                column = 0
+                pending_cells = 0
+            stack.append(elem)
+            continue
+
+        stack.pop()
+        if not in_sheet:
+            # Drop rows of the sheets that are skipped as soon as they are parsed
+            if elem.tag in (TABLE, TABLE_ROW) and stack:
+                stack[-1].remove(elem)
+            continue
+
+        if elem.tag in (TABLE_CELL, COVERED_CELL) and row is not None:
+            repeat = int(elem.get(COLUMNS_REPEATED, '1'))
+            if columns is None or (column in columns if repeat == 1 else
+                                   any(column <= c < column + repeat for c in columns)):
+                value = cell_text(elem)
+            else:
+                value = '' if _is_empty(elem) else SKIPPED
+            column += repeat
+            if value:
+                row.extend([''] * pending_cells)
+                row.extend([value] * repeat)
+                pending_cells = 0
+            else:
+                pending_cells += repeat
+            stack[-1].remove(elem)
+        elif elem.tag == TABLE_ROW:
+            repeat = int(elem.get(ROWS_REPEATED, '1'))
+            if row:
+                values = tuple(row)
+                for _ in range(pending_rows):
+                    yield ()
+                pending_rows = 0
+                for _ in range(repeat):
+                    yield values
+            else:
+                pending_rows += repeat
+            row = None
+            stack[-1].remove(elem)
+        elif elem.tag == TABLE and stack and stack[-1].tag == SPREADSHEET:
+            return
+    raise KeyError(f"Worksheet {sheet} does not exist.")
+
+
+def ods_sheet_names(filename):
+    """
+    Return the names of the sheets of an ODS file, in order.
+
+    content.xml holds every sheet, so it is parsed to the end, but rows are
+    discarded as soon as they are parsed.
+    """
+    names = []
+    stack = []
+    for event, elem in iter_events(filename):
+        if event == 'start':
+            if elem.tag == TABLE and stack and stack[-1].tag == SPREADSHEET:
+                names.append(elem.get(TABLE_NAME))
+            stack.append(elem)
+            continue
+        stack.pop()
+        if elem.tag in (TABLE, TABLE_ROW) and stack:
+            stack[-1].remove(elem)
+    return names
+
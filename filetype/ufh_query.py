@@ -0,0 +1,99 @@
+"""
+Query modes that answer from a stream of results without keeping it.
+
+    take             the first n results; reading stops at the n-th
+    any_result       whether there is a result; reading stops at the first
+    count_results    the number of results, none of them kept
+    reservoir_sample k results drawn uniformly at random in a single pass
+
+Results are the generators of the handlers, which read the file as they go,
+so stopping early leaves the rest of the file unread. The generator is
+closed as soon as the answer is known, which closes the file (and stops
+worker processes) right away instead of when it is garbage collected.
+"""
+import math
+import random
+from collections import deque
+from itertools import count, islice
+
+_END = object()
+
+
+def _close(results):
+    close = getattr(results, 'close', None)
+    if close is not None:
+        close()
+
+
+def take(results, n):
+    """
+    Yield the first n results, then stop reading.
+    """
+    results = iter(results)
+    try:
+        yield from islice(results, n)
+    finally:
+        _close(results)
+
+
+def any_result(results):
+    """
+    Tell whether there is at least one result, reading up to the first.
+    """
+    results = iter(results)
+    try:
+        return next(results, _END) is not _END
+    finally:
+        _close(results)
+
+
+def count_results(results):
+    """
+    Count the results without keeping any of them.
+    """
+    counter = count()
+    deque(zip(results, counter), maxlen=0)
+    return next(counter)
+
+
+def _unit(rng):
+    # Uniform in the open interval (0, 1), as logarithms are taken
+    while True:
+        u = rng.random()
+        if u:
+            return u
+
+
+def reservoir_sample(results, k, seed=None):
+    """
+    Draw k results uniformly at random, or all of them if there are fewer,
+    in a single pass and in O(k) memory (Li's algorithm L, 1994: the number
+    of results to skip before the next replacement is drawn directly, so
+    random numbers are only drawn for the O(k log(n / k)) replacements).
+
+    Args:
+        results (iterable): The results.
+        k (int): Size of the sample.
+        seed: Seed of the random generator, for a reproducible sample.
+
+    Returns:
+        list: The sampled results, in the order they came in.
+    """
+    if k <= 0:
+        return []
+    rng = random.Random(seed)
+    results = iter(results)
+    reservoir = list(enumerate(islice(results, k)))
+    if len(reservoir) == k:
+        position = k - 1
+        w = math.exp(math.log(_unit(rng)) / k)
+        while True:
+            skip = math.floor(math.log(_unit(rng)) / math.log1p(-w))
+            item = next(islice(results, skip, None), _END)
+            if item is _END:
+                break
+            position += skip + 1
+            reservoir[rng.randrange(k)] = (position, item)
+            w *= math.exp(math.log(_unit(rng)) / k)
+    reservoir.sort(key=lambda pair: pair[0])
+    return [item for _, item in reservoir]
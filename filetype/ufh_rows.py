@@ -0,0 +1,84 @@
+"""
+Row helpers shared by the Universal File Handler backends.
+"""
+from operator import itemgetter
+
+
+def column_letter_index(letters):
+    """
+    Convert a spreadsheet column letter such as 'A' or 'AB' to a zero-based index.
+
+    Args:
+        letters (str): The column letters.
+
+    Returns:
+        int: The column index.
+    """
+    index = 0
+    for letter in letters.upper():
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+
+def resolve_column(header, column):
+    """
+    Resolve a column to its index in a row, by header name first, then as a
+    zero-based number or a spreadsheet column letter ('A', 'AB') within the
+    width of the header, so that a misspelt name is an error rather than
+    another column.
+
+    Args:
+        header (sequence): The header row.
+        column (str or int): The column name, number or letter.
+
+    Returns:
+        int: The column index.
+
+    Raises:
+        KeyError: If the column cannot be resolved.
+    """
+    header = [str(name) if name is not None else '' for name in header]
+    if isinstance(column, int):
+        return column
+    if column in header:
+        return header.index(column)
+    if column.isdigit():
+        index = int(column)
+    elif column.isascii() and column.isalpha() and column.isupper():
+        index = column_letter_index(column)
+    else:
+        raise KeyError(column)
+    if index >= len(header):
+        raise KeyError(column)
+    return index
+
+
+def cell_at(row, index):
+    """
+    Return the cell at an index, or None when the row is shorter.
+    """
+    return row[index] if index < len(row) else None
+
+
+def projector(indexes):
+    """
+    Build a function selecting the cells at the given indexes of a row, in
+    that order, with None for the cells a short row does not have.
+
+    Args:
+        indexes (list of int): The column indexes.
+
+    Returns:
+        callable: Takes a row and returns the list of selected cells.
+    """
+    indexes = list(indexes)
+    getter = itemgetter(*indexes)
+    single = len(indexes) == 1
+
+    def project(row):
+        try:
+            values = getter(row)
+        except IndexError:
+            return [cell_at(row, index) for index in indexes]
+        return [values] if single else list(values)
+    return project
@@ -0,0 +1,297 @@
+"""
+Resident query daemon: keep parsed sheets in memory between queries.
+
+`ufh_v2.py --serve ADDRESS` starts a server that listens on a Unix socket
+(ADDRESS is a path) or on localhost TCP (ADDRESS is host:port). Each request
+is one line of JSON in the batch job format of ufh_batch, and each response is
+one line of JSON:
+
+    {"files": ["export.xlsx"], "operations": [{"search": "evil\\.com"}]}
+    {"results": [["export.xlsx", {"search": "evil\\.com"}, [[...], ...]]]}
+
+Parsed sheets are kept in a least recently used cache bounded by a memory
+budget. A sheet is parsed again when the size or modification time of its
+file changes, and a sheet larger than the whole budget is served without being
+kept. Requests are served concurrently, one thread each; a file requested by
+several clients at once is parsed only once.
+
+`ufh_v2.py --server ADDRESS ...` turns the usual command line into a thin
+client of a running server.
+
+Requests are not authenticated, so the server only does what any client may
+be trusted with: it reads the files named in requests, but does not read
+pattern files (clients send the patterns themselves) and only writes output
+files (extract, or results saved as CSV) inside the directory given with
+--serve-output-dir, refusing them otherwise. It listens on loopback
+addresses unless another interface is explicitly allowed.
+"""
+import ipaddress
+import json
+import os
+import socket
+import socketserver
+import stat
+import sys
+import threading
+from collections import OrderedDict
+from functools import partial
+
+from ufh_batch import DEFAULT_CSV_NAME, JobOutputs, build_operation, run_specs
+
+DEFAULT_BUDGET_MB = 1024
+
+
+def _row_size(row):
+    return sys.getsizeof(row) + sum(sys.getsizeof(cell) for cell in row)
+
+
+def _signature(filename):
+    status = os.stat(filename)
+    return status.st_size, status.st_mtime_ns
+
+
+class SheetStore:
+    """
+    Least recently used cache of parsed sheets, bounded by a memory budget.
+
+    Attributes:
+        budget (int): Bytes the cached rows may take, estimated with
+            sys.getsizeof.
+        used (int): Bytes taken by the cached rows.
+    """
+    def __init__(self, open_handler, budget_mb=DEFAULT_BUDGET_MB):
+        self.budget = int(budget_mb * (1 << 20))
+        self.used = 0
+        self._open_handler = open_handler
+        self._sheets = OrderedDict()  # filename -> (signature, rows, size)
+        self._lock = threading.Lock()
+        self._loading = {}  # filename -> lock held while the file is parsed
+
+    def rows(self, filename):
+        """
+        Return the rows of a file, parsing it unless a fresh copy is cached.
+
+        Args:
+            filename (str): The file to read.
+
+        Returns:
+            list of tuple: The rows of the file, header row first.
+        """
+        filename = os.path.abspath(filename)
+        signature = _signature(filename)
+        with self._lock:
+            rows = self._lookup(filename, signature)
+            if rows is not None:
+                return rows
+            loading = self._loading.setdefault(filename, threading.Lock())
+        try:
+            with loading:
+                # Another request may have parsed the file while this one waited
+                with self._lock:
+                    rows = self._lookup(filename, signature)
+                if rows is None:
+                    rows = [tuple(row) for row in self._open_handler(filename).iter_rows()]
+                    self._store(filename, signature, rows)
+            return rows
+        finally:
+            # A request that waited may find the lock already replaced by a later one
+            with self._lock:
+                if self._loading.get(filename) is loading:
+                    del self._loading[filename]
+
+    def _lookup(self, filename, signature):
+        entry = self._sheets.get(filename)
+        if entry is None:
+            return None
+        if entry[0] != signature:
+            self._evict(filename)
+            return None
+        self._sheets.move_to_end(filename)
+        return entry[1]
+
+    def _evict(self, filename):
+        _, _, size = self._sheets.pop(filename)
+        self.used -= size
+
+    def _store(self, filename, signature, rows):
+        size = sum(map(_row_size, rows)) + sys.getsizeof(rows)
+        with self._lock:
+            if filename in self._sheets:
+                self._evict(filename)
+            if size > self.budget:
+                return
+            while self._sheets and self.used + size > self.budget:
+                self._evict(next(iter(self._sheets)))
+            self._sheets[filename] = (signature, rows, size)
+            self.used += size
+
+    def status(self):
+        """
+        Return the budget, the memory used and the cached files, most recently
+        used last.
+        """
+        with self._lock:
+            return {
+                'budget_mb': round(self.budget / (1 << 20), 1),
+                'used_mb': round(self.used / (1 << 20), 1),
+                'files': [{'file': filename, 'rows': len(rows), 'mb': round(size / (1 << 20), 1)}
+                          for filename, (_, rows, size) in self._sheets.items()],
+            }
+
+
+def _jsonable(result):
+    # Sets of unique values are sent sorted; cells such as dates as text
+    if isinstance(result, (set, frozenset)):
+        return sorted(result, key=str)
+    return result
+
+
+def _checked_spec(spec, output_dir):
+    # The operation with its output file confined to output_dir
+    spec = dict(spec)
+    if 'patterns_file' in spec:
+        raise ValueError("patterns_file is not read by the server; send the patterns instead")
+    writes = 'extract' in spec or 'newfile' in spec or spec.get('output') == 'csv'
+    if 'searchcol' in spec and spec.get('output', 'print') != 'csv':
+        writes = False  # newfile is only used by output 'csv'
+    if not writes:
+        return spec
+    if output_dir is None:
+        raise ValueError("Output files are disabled; start the server with --serve-output-dir")
+    newfile = os.path.realpath(os.path.join(output_dir, spec.get('newfile', DEFAULT_CSV_NAME)))
+    if os.path.commonpath([newfile, output_dir]) != output_dir:
+        raise ValueError(f"Output file outside {output_dir}: {spec.get('newfile')}")
+    spec['newfile'] = newfile
+    return spec
+
+
+def handle_request(store, request, output_dir=None):
+    """
+    Run one request against the cached sheets.
+
+    Args:
+        store (SheetStore): The sheet cache.
+        request (dict): A batch job, or {"command": "status"}.
+        output_dir (str): The only directory output files may be written to
+            (relative names are taken from it), or None to refuse them.
+
+    Returns:
+        dict: {"results": [[filename, spec, result], ...]}, {"status": ...}
+            or {"error": message}.
+    """
+    if request.get('command') == 'status':
+        return {'status': store.status()}
+    if 'file' in request:
+        request.setdefault('files', []).append(request.pop('file'))
+    results = []
+    with JobOutputs() as outputs:
+        for filename in request.get('files', []):
+            outcome = run_specs(partial(store.rows, filename), request.get('operations', []), outputs,
+                                lambda spec, outputs: build_operation(_checked_spec(spec, output_dir), outputs))
+            results.extend([filename, spec, _jsonable(result)]
+                           for spec, result in zip(request.get('operations', []), outcome))
+    return {'results': results}
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = handle_request(self.server.store, json.loads(line), self.server.output_dir)
+            except Exception as e:
+                response = {'error': f"Error occurred: {e}"}
+            self.wfile.write(json.dumps(response, default=str).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+if hasattr(socketserver, 'UnixStreamServer'):
+    class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+else:
+    _UnixServer = None  # Windows: TCP only
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def _tcp_address(address):
+    # 'host:port' or ':port' for TCP, anything else is the path of a Unix socket
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit() and '/' not in address:
+        return host or '127.0.0.1', int(port)
+    return None
+
+
+def _is_loopback(host):
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+
+def serve(address, open_handler, budget_mb=DEFAULT_BUDGET_MB, output_dir=None, allow_remote=False):
+    """
+    Serve requests until interrupted.
+
+    Args:
+        address (str): Path of a Unix socket, or host:port to listen on TCP.
+        open_handler (callable): Returns the handler for a filename.
+        budget_mb (float): Memory budget of the sheet cache in MB.
+        output_dir (str): Directory output files are written to, or None to
+            refuse requests that write files.
+        allow_remote (bool): Listen on an address other than loopback.
+
+    Raises:
+        ValueError: If the address is an existing file other than a socket,
+            or a non-loopback address that is not allowed.
+    """
+    tcp = _tcp_address(address)
+    if tcp is None:
+        if _UnixServer is None:
+            raise ValueError("Unix sockets are not available here; listen on host:port")
+        if os.path.lexists(address):
+            # Only a socket left behind by a server that did not shut down is replaced
+            if not stat.S_ISSOCK(os.lstat(address).st_mode):
+                raise ValueError(f"{address} exists and is not a socket")
+            os.unlink(address)
+        server = _UnixServer(address, _RequestHandler)
+    else:
+        if not allow_remote and not _is_loopback(tcp[0]):
+            raise ValueError(f"Refusing to listen on {tcp[0]}, which is not a loopback address; "
+                             "requests are not authenticated (use --allow-remote to force it)")
+        server = _TCPServer(tcp, _RequestHandler)
+    server.store = SheetStore(open_handler, budget_mb)
+    server.output_dir = os.path.realpath(output_dir) if output_dir is not None else None
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if tcp is None and os.path.lexists(address) and stat.S_ISSOCK(os.lstat(address).st_mode):
+            os.unlink(address)
+
+
+def request(address, payload):
+    """
+    Send one request to a running server and return its response.
+
+    Args:
+        address (str): Path of a Unix socket, or host:port.
+        payload (dict): The request.
+
+    Returns:
+        dict: The response.
+    """
+    tcp = _tcp_address(address)
+    if tcp is None:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(address)
+    else:
+        connection = socket.create_connection(tcp)
+    with connection, connection.makefile('rwb') as stream:
+        stream.write(json.dumps(payload).encode('utf-8') + b'\n')
+        stream.flush()
+        return json.loads(stream.readline())
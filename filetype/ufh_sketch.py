@@ -0,0 +1,200 @@
+"""
+Value frequencies of a column in bounded memory.
+
+ValueCounter counts values exactly while the number of distinct values stays
+under a limit. Past it, the exact counts are folded into fixed-size sketches
+and counting carries on in constant memory:
+
+    SpaceSaving     the most frequent values, each count an upper bound with a
+                    known maximum overestimate
+    CountMinSketch  an upper bound for the count of any value, which tightens
+                    the SpaceSaving counts
+    HyperLogLog     the number of distinct values, within about 1%
+
+Values are hashed with blake2b, so sketches are the same in every process.
+"""
+import hashlib
+import math
+from array import array
+from collections import Counter
+
+DEFAULT_MAX_EXACT = 1_000_000
+DEFAULT_CAPACITY = 10_000
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8', 'surrogatepass'), digest_size=8).digest(), 'little')
+
+
+class SpaceSaving:
+    """
+    The heavy hitters of a stream (Metwally et al., 2005).
+
+    At most `capacity` values are monitored. A new value replaces one with the
+    smallest count and inherits that count as its possible overestimate, so
+    every value occurring more than n / capacity times is monitored.
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self._buckets = {}  # count -> values with that count
+        self._min = 0
+
+    def _unlink(self, value, count):
+        bucket = self._buckets[count]
+        bucket.discard(value)
+        if not bucket:
+            del self._buckets[count]
+
+    def _link(self, value, count):
+        self._buckets.setdefault(count, set()).add(value)
+        self.counts[value] = count
+
+    def add(self, value, n=1):
+        count = self.counts.get(value)
+        if count is not None:
+            self._unlink(value, count)
+        elif len(self.counts) < self.capacity:
+            count = 0
+        else:
+            # Replace a value with the smallest count, which becomes the
+            # possible overestimate of the new one
+            count = self._min
+            evicted = next(iter(self._buckets[count]))
+            self._unlink(evicted, count)
+            del self.counts[evicted]
+            self.errors.pop(evicted, None)
+            self.errors[value] = count
+        self._link(value, count + n)
+        if count == 0:
+            self._min = n if len(self.counts) == 1 else min(self._min, n)
+        elif count == self._min and count not in self._buckets:
+            self._min = count + n if n == 1 else min(self._buckets)
+
+    def most_common(self, k=None):
+        """
+        Return (value, count, overestimate) for the k most frequent values.
+        """
+        ranked = sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))
+        return [(value, count, self.errors.get(value, 0)) for value, count in ranked[:k]]
+
+
+class CountMinSketch:
+    """
+    Upper bounds for the count of any value (Cormode and Muthukrishnan, 2005),
+    off by at most e * n / width with probability 1 - exp(-depth).
+    """
+    def __init__(self, width=1 << 16, depth=4):
+        self.width = width
+        self.depth = depth
+        self.rows = [array('Q', bytes(8 * width)) for _ in range(depth)]
+
+    def _indexes(self, hashed):
+        # Double hashing: depth indexes from the two halves of one hash
+        h1, h2 = hashed & 0xFFFFFFFF, hashed >> 32
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, value, n=1, hashed=None):
+        for row, index in zip(self.rows, self._indexes(_hash64(value) if hashed is None else hashed)):
+            row[index] += n
+
+    def estimate(self, value):
+        return min(row[index] for row, index in zip(self.rows, self._indexes(_hash64(value))))
+
+
+class HyperLogLog:
+    """
+    Number of distinct values (Flajolet et al., 2007), with a standard error
+    of 1.04 / sqrt(2 ** precision).
+    """
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(self.size)
+
+    def add(self, value, hashed=None):
+        hashed = _hash64(value) if hashed is None else hashed
+        index = hashed >> (64 - self.precision)
+        rest = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = 64 - self.precision - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def estimate(self):
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            return round(m * math.log(m / zeros))  # Linear counting for small cardinalities
+        return round(raw)
+
+
+class ValueCounter:
+    """
+    Counts of the values of a column, exact until more than `max_exact`
+    distinct values have been seen, then estimated in fixed memory.
+
+    Attributes:
+        total (int): Number of values counted.
+        exact (bool): Whether the counts and the distinct count are exact.
+    """
+    def __init__(self, max_exact=DEFAULT_MAX_EXACT, capacity=DEFAULT_CAPACITY):
+        self.max_exact = max_exact
+        self.capacity = capacity
+        self.total = 0
+        self.exact = True
+        self._counts = Counter()
+        self._heavy = None
+        self._sketch = None
+        self._distinct = None
+
+    def _switch(self):
+        # Fold the exact counts into the sketches, most frequent values first
+        self.exact = False
+        self._heavy = SpaceSaving(self.capacity)
+        self._sketch = CountMinSketch()
+        self._distinct = HyperLogLog()
+        for value, count in self._counts.most_common():
+            self._add_estimated(value, count)
+        self._counts = None
+
+    def _add_estimated(self, value, n=1):
+        hashed = _hash64(value)
+        self._heavy.add(value, n)
+        self._sketch.add(value, n, hashed)
+        self._distinct.add(value, hashed)
+
+    def add(self, value):
+        self.total += 1
+        if self.exact:
+            counts = self._counts
+            counts[value] += 1
+            if len(counts) > self.max_exact:
+                self._switch()
+        else:
+            self._add_estimated(value)
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+        return self
+
+    def distinct(self):
+        """
+        Return the number of distinct values, estimated once counting is no
+        longer exact.
+        """
+        return len(self._counts) if self.exact else self._distinct.estimate()
+
+    def most_common(self, k=None):
+        """
+        Return (value, count) pairs for the k most frequent values, or for all
+        of them while counting is exact. Estimated counts are upper bounds.
+        """
+        if self.exact:
+            return sorted(self._counts.items(), key=lambda item: (-item[1], item[0]))[:k]
+        k = self.capacity if k is None else k
+        return [(value, min(count, self._sketch.estimate(value)))
+                for value, count, _ in self._heavy.most_common(k)]
@@ -0,0 +1,237 @@
+"""
+Per-phase instrumentation of handler runs.
+
+A Stats object attached to a handler (handler.stats, or the stats argument of
+UniversalHandler) records where the time of a run goes:
+
+    read      parsing the file into rows (workbook loading included)
+    convert   turning cell values into strings for matching
+    match     evaluating the compiled patterns
+    write     writing results to a file or to stdout
+
+together with the number of rows scanned and matched, the size of the files
+read, the number of pattern evaluations and the peak memory of the process.
+Handlers only wrap their iterators, matcher and writers when stats are
+attached, so a run without stats pays nothing per row.
+"""
+import json
+import os
+import sys
+import time
+
+from ufh_match import Matcher
+
+PHASES = ('read', 'convert', 'match', 'write')
+COUNTERS = ('rows_scanned', 'rows_matched', 'bytes_read', 'regex_evaluations')
+
+
+def peak_memory_mb():
+    """
+    Return the peak resident set size of the process in MB, or None when it
+    cannot be measured.
+    """
+    try:
+        import resource  # Unix only
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        # peak_wset on Windows; elsewhere only the current size is known
+        return getattr(info, 'peak_wset', info.rss) / (1 << 20)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+
+class Stats:
+    """
+    Wall time per phase and counters of a run.
+
+    Attributes:
+        phases (dict): Seconds spent in each phase.
+        counters (dict): Rows scanned and matched, bytes read and pattern
+            evaluations.
+    """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self._sources = set()
+        self._accounted = 0.0
+
+    def add_time(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+        self._accounted += seconds
+
+    def count(self, counter, n=1):
+        self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def add_source(self, filename):
+        """
+        Count the size of a file read by the run, once per file.
+        """
+        if filename not in self._sources:
+            self._sources.add(filename)
+            try:
+                self.count('bytes_read', os.path.getsize(filename))
+            except OSError:
+                pass
+
+    def timed(self, iterable, phase='read', counter='rows_scanned'):
+        """
+        Wrap an iterable so that the time spent producing each item is
+        charged to a phase and every item is counted. Time already charged
+        to another phase meanwhile (e.g. by a nested timed iterable or by a
+        TimedMatcher) is not counted twice.
+
+        Yields:
+            The items of the iterable.
+        """
+        iterator = iter(iterable)
+        clock = time.perf_counter
+        elapsed = 0.0
+        items = 0
+        try:
+            while True:
+                started = clock()
+                accounted = self._accounted
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += clock() - started - (self._accounted - accounted)
+                items += 1
+                yield item
+        finally:
+            self.add_time(phase, elapsed)
+            if counter:
+                self.count(counter, items)
+
+    def counted(self, iterable, counter):
+        """
+        Wrap an iterable so that every item is counted, without timing it.
+        """
+        items = 0
+        try:
+            for item in iterable:
+                items += 1
+                yield item
+        finally:
+            self.count(counter, items)
+
+    def matcher(self, matcher):
+        """
+        Return a Matcher that records its evaluations in these stats.
+        """
+        if isinstance(matcher, TimedMatcher):
+            return matcher
+        return TimedMatcher(matcher, self)
+
+    def writer(self, writer):
+        """
+        Return a row writer or sink whose writes are charged to 'write'.
+        """
+        return TimedWriter(writer, self)
+
+    def report(self):
+        """
+        Return the stats as a dict, with the wall time and peak memory so far.
+        """
+        wall = time.perf_counter() - self.start
+        peak = peak_memory_mb()
+        phases = {phase: round(seconds, 4) for phase, seconds in self.phases.items()}
+        phases['other'] = round(max(0.0, wall - sum(self.phases.values())), 4)
+        return {
+            'wall_s': round(wall, 4),
+            'phases_s': phases,
+            **self.counters,
+            'peak_memory_mb': None if peak is None else round(peak, 1),
+        }
+
+    def format(self, kind='text'):
+        """
+        Render the report as human readable text or as JSON.
+        """
+        report = self.report()
+        if kind == 'json':
+            return json.dumps(report)
+        wall = report['wall_s'] or 1.0
+        lines = [f"{'wall time':<18} {report['wall_s']:12.3f} s"]
+        for phase, seconds in report['phases_s'].items():
+            lines.append(f"  {phase:<16} {seconds:12.3f} s  {100 * seconds / wall:5.1f}%")
+        for counter in COUNTERS:
+            lines.append(f"{counter.replace('_', ' '):<18} {report[counter]:12d}")
+        if report['peak_memory_mb'] is not None:
+            lines.append(f"{'peak memory':<18} {report['peak_memory_mb']:12.1f} MB")
+        return '\n'.join(lines)
+
+
+class TimedMatcher(Matcher):
+    """
+    A Matcher that charges cell conversion and matching to a Stats object.
+    """
+    def __init__(self, matcher, stats):
+        self.__dict__.update(matcher.__dict__)
+        self._stats = stats
+
+    def _convert(self, row):
+        started = time.perf_counter()
+        cells = [cell if isinstance(cell, str) else str(cell) for cell in row]
+        self._stats.add_time('convert', time.perf_counter() - started)
+        return cells
+
+    def _timed(self, method, arg):
+        started = time.perf_counter()
+        result = method(arg)
+        self._stats.add_time('match', time.perf_counter() - started)
+        self._stats.count('regex_evaluations')
+        return result
+
+    def search(self, text):
+        return self._timed(super().search, text)
+
+    def search_row(self, row):
+        return self._timed(super().search_row, self._convert(row))
+
+    def row_hits(self, row):
+        return self._timed(super().row_hits, self._convert(row))
+
+    def matching_rows(self, rows):
+        # A batch of rows is matched in one call, and counted as one evaluation per row
+        started = time.perf_counter()
+        found = super().matching_rows(rows)
+        self._stats.add_time('match', time.perf_counter() - started)
+        self._stats.count('regex_evaluations', len(rows))
+        return found
+
+
+class TimedWriter:
+    """
+    Wraps a row writer or sink and charges its writes to a Stats object.
+    """
+    def __init__(self, writer, stats):
+        self._writer = writer
+        self._stats = stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def writerow(self, *args, **kwargs):
+        started = time.perf_counter()
+        self._writer.writerow(*args, **kwargs)
+        self._stats.add_time('write', time.perf_counter() - started)
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def close(self):
+        started = time.perf_counter()
+        self._writer.close()
+        self._stats.add_time('write', time.perf_counter() - started)
@@ -0,0 +1,130 @@
+"""
+Exact unique values in bounded memory, in sorted order.
+
+UniqueValues keeps the values it is given in a set while they fit in a
+memory budget. Past it, the set is written to disk as a sorted run and
+emptied, and collection carries on. Iterating merges the runs and what is
+left in memory, dropping duplicates, so the values come out sorted (by code
+point) and each exactly once, whatever their number. Results that fit in the
+budget never touch the disk.
+
+Runs are CSV files of one value per line, so values may hold any text,
+newlines included. At most MAX_RUNS runs are kept: more are merged into one.
+"""
+import csv
+import heapq
+import os
+import shutil
+import sys
+import tempfile
+import weakref
+from itertools import groupby
+from operator import itemgetter
+
+DEFAULT_UNIQUE_BUDGET_MB = 256
+# Bytes per value in a set besides the string itself: its slot in the hash
+# table, which is kept at most 60% full
+SET_ENTRY_OVERHEAD = 48
+MAX_RUNS = 64
+
+
+def _unique(sorted_values):
+    return map(itemgetter(0), groupby(sorted_values))
+
+
+class UniqueValues:
+    """
+    A set of strings that spills to sorted runs on disk beyond a memory budget.
+
+    Attributes:
+        budget (int): Bytes of values kept in memory before spilling.
+        spill_dir (str): Directory of the temporary runs; the system
+            temporary directory by default.
+        spilled (bool): Whether some values were written to disk.
+    """
+    def __init__(self, budget_mb=DEFAULT_UNIQUE_BUDGET_MB, spill_dir=None):
+        self.budget = int(budget_mb * (1 << 20))
+        self.spill_dir = spill_dir
+        self._values = set()
+        self._size = 0
+        self._runs = []
+        self._written = 0
+        self._directory = None
+        self._cleanup = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def spilled(self):
+        return bool(self._runs)
+
+    def add(self, value):
+        values = self._values
+        if value not in values:
+            values.add(value)
+            self._size += sys.getsizeof(value) + SET_ENTRY_OVERHEAD
+            if self._size > self.budget:
+                self._spill()
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+        return self
+
+    def _new_run(self):
+        if self._directory is None:
+            self._directory = tempfile.mkdtemp(prefix='ufh-unique-', dir=self.spill_dir)
+            # Runs are removed by close, or else once the object is collected
+            self._cleanup = weakref.finalize(self, shutil.rmtree, self._directory, True)
+        self._written += 1
+        return os.path.join(self._directory, f'run{self._written}.csv')
+
+    def _write_run(self, sorted_values):
+        path = self._new_run()
+        with open(path, mode='w', newline='', encoding='utf-8', errors='surrogatepass') as file:
+            csv.writer(file).writerows((value,) for value in sorted_values)
+        return path
+
+    def _spill(self):
+        # The values in memory become one more sorted run
+        self._runs.append(self._write_run(sorted(self._values)))
+        self._values = set()
+        self._size = 0
+        if len(self._runs) >= MAX_RUNS:
+            runs, self._runs = self._runs, []
+            merged = self._write_run(_unique(heapq.merge(*map(self._read_run, runs))))
+            for path in runs:
+                os.remove(path)
+            self._runs = [merged]
+
+    @staticmethod
+    def _read_run(path):
+        with open(path, mode='r', newline='', encoding='utf-8', errors='surrogatepass') as file:
+            yield from map(itemgetter(0), csv.reader(file))
+
+    def __iter__(self):
+        """
+        Yield every value once, in sorted order.
+        """
+        in_memory = sorted(self._values)
+        if not self._runs:
+            return iter(in_memory)
+        return _unique(heapq.merge(in_memory, *map(self._read_run, self._runs)))
+
+    def __len__(self):
+        if not self._runs:
+            return len(self._values)
+        return sum(1 for _ in self)
+
+    def close(self):
+        """
+        Remove the runs written to disk.
+        """
+        if self._directory is not None:
+            self._cleanup()
+            self._directory = None
+        self._runs = []
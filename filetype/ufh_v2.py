@@ -1,12 +1,28 @@
 import csv
 import re
-import openpyxl
-import xlrd
-from openpyxl import Workbook
-from odf.opendocument import load
-from odf.table import Table, TableRow, TableCell
 import argparse
+import json
 import os
+import sys
+from functools import partial
+from itertools import chain
+from ufh_backends import find_backend, register_backend, sniff_csv, sniff_ods, sniff_xls, sniff_xlsx
+from ufh_batch import load_job, run_job
+from ufh_cache import DEFAULT_MAX_CACHE_MB, SheetCache
+from ufh_compress import compression_of, open_input, open_output
+from ufh_csvscan import iter_parallel_column, iter_parallel_rows, iter_prefiltered_column, iter_prefiltered_rows
+from ufh_follow import Checkpoint, follow_query
+from ufh_index import open_column_index
+from ufh_match import compile_matcher, load_patterns
+from ufh_multi import expand_inputs, expand_sheets, is_multi_file, iter_multi_matches, iter_multi_unique
+from ufh_query import any_result, count_results, reservoir_sample, take
+from ufh_rows import cell_at, projector, resolve_column
+from ufh_server import DEFAULT_BUDGET_MB, request, serve
+from ufh_sketch import DEFAULT_CAPACITY, DEFAULT_MAX_EXACT, ValueCounter
+from ufh_stats import Stats
+from ufh_unique import DEFAULT_UNIQUE_BUDGET_MB, UniqueValues
+from ufh_vector import DEFAULT_BATCH_SIZE, ENGINES, ROW_ENGINE, filter_rows, iter_vector_matches, parse_filter
+from ufh_writers import SINKS, open_row_writer, open_sink
 
 # Constants for file types and default output filename
 CSV = 'csv'
@@ -14,6 +30,8 @@ XLSX = 'xlsx'
 XLS = 'xls'
 ODS = 'ods'
 DEFAULT_CSV_NAME = 'output.csv'
+PROFILE_LINES = 25
+DEFAULT_TOP = 20
 
 def strip_quotes(arg):
     if arg.startswith(("'", '"')) and arg.endswith(("'", '"')):
@@ -21,246 +39,786 @@ def strip_quotes(arg):
     return arg
 
 class UniversalHandler:
-    def __init__(self, filename):
+    def __init__(self, filename, cache_dir=None, use_cache=True, stats=None, sheet=None,
+                 cache_max_mb=DEFAULT_MAX_CACHE_MB):
         self.filename = filename
+        self.cache_dir = cache_dir
+        self.use_cache = use_cache
+        self.cache_max_mb = cache_max_mb
+        self.sheet = sheet
         self.handler = self.get_handler()
+        self.handler.stats = stats
+        self.handler.sheet = sheet
 
     def get_handler(self):
-        if self.filename.lower().endswith('.csv'):
-            return CSVHandler(self.filename)
-        elif self.filename.lower().endswith('.xlsx'):
-            return ExcelHandler(self.filename, XLSX)
-        elif self.filename.lower().endswith('.xls'):
-            return ExcelHandler(self.filename, XLS)
-        elif self.filename.lower().endswith('.ods'):
-            return ODSHandler(self.filename)
+        # The backend is chosen from the content of the file, then its extension (see ufh_backends)
+        backend = find_backend(self.filename)
+        # Spreadsheets are read through a columnar cache that is rebuilt whenever the file changes
+        if self.use_cache and backend.cacheable:
+            cache = SheetCache(self.filename, 0 if self.sheet is None else self.sheet, self.cache_dir, self.cache_max_mb)
         else:
-            raise ValueError("Unsupported file type")
+            cache = None
+        return backend.open(self.filename, cache)
 
-class CSVHandler:
-    def __init__(self, filename):
+def open_handler(filename, cache_dir=None, use_cache=True, stats=None, sheet=None, cache_max_mb=DEFAULT_MAX_CACHE_MB):
+    return UniversalHandler(filename, cache_dir, use_cache, stats, sheet, cache_max_mb).handler
+
+def _first_seen(values):
+    seen = set()
+    for value in values:
+        if value not in seen:
+            seen.add(value)
+            yield value
+
+class FileHandler:
+    # Operations shared by every format, built on the iter_rows and
+    # iter_column generators of each handler
+    def __init__(self, filename, cache=None):
         self.filename = filename
+        self.cache = cache
+        self.stats = None  # A ufh_stats.Stats to instrument the handler with
+        self.sheet = None  # Name of the sheet to read; None for the first (or active) one
 
-    def extract_columns(self, columns, new_filename):
-        try:
-            with open(self.filename, mode='r', newline='', encoding='utf-8') as file, open(new_filename, mode='w', newline='', encoding='utf-8') as new_file:
-                reader = csv.DictReader(file)
-                writer = csv.DictWriter(new_file, fieldnames=columns)
-                writer.writeheader()
-                for row in reader:
-                    writer.writerow({column: row[column] for column in columns})
-            return f"Columns {columns} extracted to {new_filename} successfully."
-        except Exception as e:
-            return f"Error occurred: {e}"
+    def _scanned(self, rows, counter='rows_scanned'):
+        # Rows read from the file, timed and counted when stats are attached
+        if self.stats is None:
+            return rows
+        self.stats.add_source(self.filename)
+        return self.stats.timed(rows, 'read', counter)
 
-    def search_csv(self, pattern):
-        matches = []
+    def _compile(self, pattern):
+        matcher = compile_matcher(pattern)
+        return matcher if self.stats is None else self.stats.matcher(matcher)
+
+    def _open_writer(self, new_filename):
+        writer = open_row_writer(new_filename)
+        return writer if self.stats is None else self.stats.writer(writer)
+
+    def sheet_names(self):
+        # Formats without sheets have a single, unnamed one
+        return None
+
+    def iter_rows(self):
+        if self.cache is None:
+            return self._scanned(self.read_rows())
+        return self._scanned(self.cache.cached_rows(self.read_rows))
+
+    def iter_cells(self, index):
+        # The cells of one column, straight from the columnar cache when it is fresh
+        if self.cache is not None and self.cache.is_fresh():
+            return self._scanned(self.cache.iter_column(index))
+        return (cell_at(row, index) for row in self.iter_rows())
+
+    def iter_column(self, column):
+        # The values of one column below the header row, as text; None for
+        # empty cells and short rows, which Excel reads as None but CSV and
+        # ODS as ''
+        cells = iter(self.iter_cells(self.resolve_columns([column])[0]))
+        next(cells, None)  # Skip the header row
+        for cell in cells:
+            if cell is None or cell == '':
+                yield None
+            else:
+                yield cell if isinstance(cell, str) else str(cell)
+
+    def header(self):
+        # The first row, read on its own
+        fresh = self.cache is not None and self.cache.is_fresh()
+        rows = self.cache.iter_rows() if fresh else iter(self.read_rows())
         try:
-            with open(self.filename, mode='r', newline='', encoding='utf-8') as file:
-                reader = csv.reader(file)
-                for row in reader:
-                    if any(re.search(pattern, cell) for cell in row):
-                        matches.append(row)
-            return matches
-        except Exception as e:
-            return f"Error occurred: {e}"
+            return next(rows, ())
+        finally:
+            if hasattr(rows, 'close'):
+                rows.close()
+
+    def resolve_columns(self, columns):
+        # Column names, numbers or letters to indexes; the header is only read for names
+        if all(isinstance(column, int) for column in columns):
+            return list(columns)
+        header = self.header()
+        return [resolve_column(header, column) for column in columns]
+
+    def read_projected(self, indexes):
+        # Formats able to skip the other columns while parsing override this
+        return map(projector(indexes), self.read_rows())
+
+    def iter_projected(self, indexes):
+        # Only the given columns of every row; read from the columnar cache
+        # when it is fresh, otherwise parsed without building the cache
+        if self.cache is not None and self.cache.is_fresh():
+            return self._scanned(zip(*(self.cache.iter_column(index) for index in indexes)))
+        return self._scanned(self.read_projected(indexes))
+
+    def iter_matches(self, pattern, with_hits=False, engine=ROW_ENGINE, where=(), batch_size=DEFAULT_BATCH_SIZE):
+        # pattern may be None to select rows by the where filters only
+        matcher = self._compile(pattern) if pattern is not None else None
+        return self._match_rows(self.iter_rows(), matcher, with_hits, engine, where, batch_size)
+
+    def _match_rows(self, rows, matcher, with_hits, engine, where, batch_size):
+        # The matching rows of a stream of rows, header row first
+        if engine != ROW_ENGINE:
+            matches = iter_vector_matches(rows, matcher, with_hits, where, batch_size)
+            yield from matches if self.stats is None else self.stats.counted(matches, 'rows_matched')
+            return
+        rows = filter_rows(rows, where) if where else rows
+        for row in rows:
+            if matcher is None:
+                if self.stats is not None:
+                    self.stats.count('rows_matched')
+                yield row
+            elif with_hits:
+                hits = matcher.row_hits(row)
+                if hits:
+                    if self.stats is not None:
+                        self.stats.count('rows_matched')
+                    yield row, hits
+            elif matcher.search_row(row):
+                if self.stats is not None:
+                    self.stats.count('rows_matched')
+                yield row
 
-    def search_column(self, column, pattern, output_choice='print', new_filename=DEFAULT_CSV_NAME):
-        unique_results = set()
+    def first_matches(self, pattern, limit, with_hits=False, **options):
+        # The scan stops at the limit-th matching row
+        return list(take(self.iter_matches(pattern, with_hits, **options), limit))
+
+    def has_match(self, pattern, **options):
+        # The scan stops at the first matching row
+        return any_result(self.iter_matches(pattern, **options))
+
+    def count_matches(self, pattern, **options):
+        return count_results(self.iter_matches(pattern, **options))
+
+    def sample_matches(self, pattern, size, seed=None, with_hits=False, **options):
+        # A uniform sample of the matching rows, drawn in one pass (see ufh_query)
+        return reservoir_sample(self.iter_matches(pattern, with_hits, **options), size, seed)
+
+    def iter_unique(self, column, pattern, use_index=False, index_dir=None):
+        matcher = self._compile(pattern)
+        if use_index:
+            index = open_column_index(self.filename, column, lambda: self.iter_column(column), index_dir, self.sheet)
+            yield from index.search(matcher)
+            return
+        yield from _first_seen(self.iter_values(column, matcher))
+
+    def iter_values(self, column, pattern):
+        # Every matching value of a column, duplicates included
+        matcher = self._compile(pattern)
+        for value in self.iter_column(column):
+            if value is not None and matcher.search(value):
+                yield value
+
+    def unique_values(self, column, pattern, budget_mb=DEFAULT_UNIQUE_BUDGET_MB, spill_dir=None, use_index=False,
+                      index_dir=None, **options):
+        # The exact unique matching values, iterated in sorted order; beyond
+        # budget_mb they are spilled to sorted runs on disk (see ufh_unique)
+        if use_index or options.get('follow'):
+            # Already unique, read from the index or the checkpoint
+            values = self.iter_unique(column, pattern, use_index, index_dir, **options)
+        else:
+            values = self.iter_values(column, pattern, **options)
+        unique = UniqueValues(budget_mb, spill_dir)
         try:
-            with open(self.filename, mode='r', newline='', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    if re.search(pattern, row[column]):
-                        unique_results.add(row[column])
-
-            if output_choice == 'print':
-                for result in unique_results:
-                    print(result)
-            elif output_choice == 'csv':
-                output_path = os.path.join(os.getcwd(), new_filename)
-                with open(output_path, mode='w', newline='', encoding='utf-8') as new_file:
-                    writer = csv.writer(new_file)
-                    for result in unique_results:
-                        writer.writerow([result])
-                return f"Search results saved to {output_path}"
-            return unique_results
-        except Exception as e:
-            return f"Error occurred: {e}"
+            return unique.update(values)
+        except BaseException:
+            unique.close()
+            raise
 
-class ExcelHandler:
-    def __init__(self, filename, file_type):
-        self.filename = filename
-        self.file_type = file_type
+    def count_values(self, column, pattern=None, max_exact=DEFAULT_MAX_EXACT, capacity=DEFAULT_CAPACITY):
+        # Frequencies of the (matching) values of a column, exact while they
+        # fit in max_exact distinct values and sketched in fixed memory beyond
+        matcher = self._compile(pattern) if pattern is not None else None
+        counter = ValueCounter(max_exact, capacity)
+        for value in self.iter_column(column):
+            # Empty cells are not values, whatever the format
+            if value is not None and (matcher is None or matcher.search(value)):
+                counter.add(value)
+        return counter
 
     def extract_columns(self, columns, new_filename):
+        # Every row, the header row included, reduced to the requested columns
         try:
-            if self.file_type == XLSX:
-                wb = openpyxl.load_workbook(self.filename)
-                ws = wb.active
-                new_wb = Workbook()
-                new_ws = new_wb.active
-                for row in ws.iter_rows(values_only=True):
-                    new_ws.append([row[col] for col in columns if col in columns])
-                new_wb.save(new_filename)
-            elif self.file_type == XLS:
-                workbook = xlrd.open_workbook(self.filename)
-                sheet = workbook.sheet_by_index(0)
-                new_wb = Workbook()
-                new_ws = new_wb.active
-                for rx in range(sheet.nrows):
-                    row = sheet.row(rx)
-                    new_ws.append([row[col].value for col in columns if col in columns])
-                new_wb.save(new_filename)
+            indexes = self.resolve_columns(columns)
+            with self._open_writer(new_filename) as writer:
+                for row in self.iter_projected(indexes):
+                    writer.writerow(row)
             return f"Columns {columns} extracted to {new_filename} successfully."
         except Exception as e:
             return f"Error occurred: {e}"
 
-    def search_csv(self, pattern):
-        matches = []
+    def search_csv(self, pattern, with_hits=False, **options):
         try:
-            if self.file_type == XLSX:
-                wb = openpyxl.load_workbook(self.filename)
-                ws = wb.active
-                for row in ws.iter_rows(values_only=True):
-                    if any(re.search(pattern, str(cell)) for cell in row):
-                        matches.append(row)
-            elif self.file_type == XLS:
-                workbook = xlrd.open_workbook(self.filename)
-                sheet = workbook.sheet_by_index(0)
-                for rx in range(sheet.nrows):
-                    row = sheet.row(rx)
-                    if any(re.search(pattern, str(cell.value)) for cell in row):
-                        matches.append([cell.value for cell in row])
-            return matches
+            return list(self.iter_matches(pattern, with_hits, **options))
         except Exception as e:
             return f"Error occurred: {e}"
 
-    def search_column(self, column, pattern, output_choice='print', new_filename=DEFAULT_CSV_NAME):
-        unique_results = set()
+    def search_column(self, column, pattern, output_choice='print', new_filename=DEFAULT_CSV_NAME, **options):
         try:
-            if self.file_type == XLSX:
-                wb = openpyxl.load_workbook(self.filename)
-                ws = wb.active
-                for row in ws.iter_rows(values_only=True):
-                    cell_value = str(row[column])
-                    if re.search(pattern, cell_value):
-                        unique_results.add(cell_value)
-            elif self.file_type == XLS:
-                workbook = xlrd.open_workbook(self.filename)
-                sheet = workbook.sheet_by_index(0)
-                for rx in range(1, sheet.nrows):
-                    cell_value = str(sheet.cell(rx, column).value)
-                    if re.search(pattern, cell_value):
-                        unique_results.add(cell_value)
-
-            if output_choice == 'print':
-                for result in unique_results:
-                    print(result)
-            elif output_choice == 'csv':
-                output_path = os.path.join(os.getcwd(), new_filename)
-                with open(output_path, mode='w', newline='', encoding='utf-8') as new_file:
-                    writer = csv.writer(new_file)
+            with self.unique_values(column, pattern, **options) as unique_results:
+                if output_choice == 'print':
                     for result in unique_results:
-                        writer.writerow([result])
-                return f"Search results saved to {output_path}"
-            return unique_results
+                        print(result)
+                elif output_choice == 'csv':
+                    output_path = os.path.join(os.getcwd(), new_filename)
+                    with open_output(output_path) as new_file:
+                        writer = csv.writer(new_file)
+                        for result in unique_results:
+                            writer.writerow([result])
+                    return f"Search results saved to {output_path}"
+                return list(unique_results)
         except Exception as e:
             return f"Error occurred: {e}"
 
-class ODSHandler:
-    def __init__(self, filename):
-        self.filename = filename
+class CSVHandler(FileHandler):
+    def __init__(self, filename, cache=None):
+        super().__init__(filename, cache)
+        # Compressed files are read as a stream (see ufh_compress), so the
+        # scans that seek or map the file do not apply to them
+        self.compression = compression_of(filename)
+
+    def read_rows(self):
+        with open_input(self.filename) as file:
+            yield from csv.reader(file)
+
+    def iter_column(self, column):
+        with open_input(self.filename) as file:
+            reader = csv.reader(file)
+            index = resolve_column(next(reader, []), column)
+            # Blank lines are skipped, as by csv.DictReader; empty cells are None
+            for row in self._scanned(reader):
+                if row:
+                    yield cell_at(row, index) or None
+
+    def iter_matches(self, pattern, with_hits=False, jobs=1, engine=ROW_ENGINE, where=(), batch_size=DEFAULT_BATCH_SIZE,
+                     follow=False, state_file=None):
+        # Rows scanned by worker processes or skipped by the prefilter are not counted.
+        # Both beat the vectorized engine, which is used when neither applies.
+        if follow:
+            return self._follow_matches(pattern, with_hits, engine, where, batch_size, state_file)
+        if pattern is None or where or self.compression is not None:
+            return super().iter_matches(pattern, with_hits, engine, where, batch_size)
+        matcher = self._compile(pattern)
+        if engine != ROW_ENGINE and jobs <= 1 and matcher.bytes_prefilter() is None:
+            return super().iter_matches(matcher, with_hits, engine, where, batch_size)
+        if jobs > 1:
+            return self._scanned(iter_parallel_rows(self.filename, matcher, jobs, with_hits), 'rows_matched')
+        if matcher.bytes_prefilter() is not None:
+            return self._scanned(iter_prefiltered_rows(self.filename, matcher, with_hits), 'rows_matched')
+        return super().iter_matches(matcher, with_hits)
+
+    def _follow_matches(self, pattern, with_hits, engine, where, batch_size, state_file):
+        # Only the rows appended since the previous run of the same search
+        # (see ufh_follow); the checkpoint moves on once they have all been read
+        matcher = self._compile(pattern) if pattern is not None else None
+        checkpoint = Checkpoint(self.filename, follow_query('search', matcher, where=where), state_file)
+        rows = checkpoint.new_rows()
+        header = checkpoint.header
+        if header is not None:
+            # The header row binds the filters, but was already searched by an earlier run
+            matches = self._match_rows(chain([header], self._scanned(rows)), matcher, with_hits, engine, where, batch_size)
+            for match in matches:
+                if checkpoint.resumed and (match[0] if with_hits else match) is header:
+                    continue
+                yield match
+        checkpoint.commit()
+
+    def _follow_unique(self, column, matcher, state_file):
+        # The values found by earlier runs of the same search, then the new
+        # ones found in the rows appended since
+        checkpoint = Checkpoint(self.filename, follow_query('unique', matcher, column=column), state_file)
+        rows = checkpoint.new_rows()
+        index = resolve_column(checkpoint.header or [], column)
+        seen = set(checkpoint.values)
+        yield from checkpoint.values
+        for row in self._scanned(rows):
+            if row:
+                value = cell_at(row, index)
+                if value and value not in seen and matcher.search(value):
+                    seen.add(value)
+                    yield value
+        checkpoint.commit(seen)
+
+    def iter_unique(self, column, pattern, use_index=False, index_dir=None, jobs=1, follow=False, state_file=None):
+        matcher = self._compile(pattern)
+        if follow:
+            return self._follow_unique(column, matcher, state_file)
+        if not use_index and self.compression is None and (jobs > 1 or matcher.bytes_prefilter() is not None):
+            # Streamed in the order values are first found, so that a caller can stop early
+            return _first_seen(self.iter_values(column, matcher, jobs))
+        return super().iter_unique(column, matcher, use_index, index_dir)
+
+    def iter_values(self, column, pattern, jobs=1):
+        matcher = self._compile(pattern)
+        if self.compression is None:
+            if jobs > 1:
+                return self._scanned(iter_parallel_column(self.filename, column, matcher, jobs), None)
+            if matcher.bytes_prefilter() is not None:
+                return self._scanned(iter_prefiltered_column(self.filename, column, matcher), None)
+        return super().iter_values(column, matcher)
 
     def extract_columns(self, columns, new_filename):
         try:
-            ods_file = load(self.filename)
-            sheet = ods_file.spreadsheet.getElementsByType(Table)[0]
-            new_ods = load()  # Create a new blank ODS file
-            new_sheet = Table()  # Create a new sheet
-            for row in sheet.getElementsByType(TableRow):
-                new_row = TableRow()  # Create a new row for the new sheet
-                for i, cell in enumerate(row.getElementsByType(TableCell)):
-                    if i in columns:
-                        new_row.addElement(cell)
-                new_sheet.addElement(new_row)
-            new_ods.spreadsheet.addElement(new_sheet)
-            new_ods.save(new_filename)
+            with open_input(self.filename) as file, self._open_writer(new_filename) as writer:
+                reader = csv.reader(file)
+                # Names are resolved to indexes once, then every row is a plain list lookup
+                header = next(reader, [])
+                project = projector([resolve_column(header, column) for column in columns])
+                writer.writerow(columns)
+                for row in self._scanned(reader):
+                    if row:
+                        writer.writerow(project(row))
             return f"Columns {columns} extracted to {new_filename} successfully."
         except Exception as e:
             return f"Error occurred: {e}"
 
-    def search_ods(self, pattern):
+class ExcelHandler(FileHandler):
+    def __init__(self, filename, file_type, cache=None):
+        super().__init__(filename, cache)
+        self.file_type = file_type
+
+    def sheet_names(self):
+        # Only the workbook part is read, not the sheets themselves
+        if self.file_type == XLSX:
+            import openpyxl
+            with open(self.filename, mode='rb') as file:
+                wb = openpyxl.load_workbook(file, read_only=True)
+                try:
+                    return wb.sheetnames
+                finally:
+                    wb.close()
+        import xlrd
+        workbook = xlrd.open_workbook(self.filename, on_demand=True)
+        try:
+            return workbook.sheet_names()
+        finally:
+            workbook.release_resources()
+
+    def read_rows(self):
+        return self._read_range()
+
+    def read_projected(self, indexes):
+        # Cells outside the span of the requested columns are never built
+        low, high = min(indexes), max(indexes)
+        return map(projector([index - low for index in indexes]), self._read_range(low, high))
+
+    def _read_range(self, low=0, high=None):
+        # Stream rows of one sheet, columns low to high (zero-based, inclusive),
+        # instead of materialising the workbook
+        if self.file_type == XLSX:
+            import openpyxl  # Imported on first use so that CSV runs never load it
+            # A file object, as openpyxl rejects a workbook whose name does not end in .xlsx
+            with open(self.filename, mode='rb') as file:
+                wb = openpyxl.load_workbook(file, read_only=True)
+                try:
+                    ws = wb.active if self.sheet is None else wb[self.sheet]
+                    yield from ws.iter_rows(min_col=low + 1, max_col=None if high is None else high + 1,
+                                            values_only=True)
+                finally:
+                    wb.close()
+        elif self.file_type == XLS:
+            import xlrd
+            # Only the requested sheet is loaded
+            workbook = xlrd.open_workbook(self.filename, on_demand=True)
+            try:
+                if self.sheet is None:
+                    sheet = workbook.sheet_by_index(0)
+                else:
+                    sheet = workbook.sheet_by_name(self.sheet)
+                end = None if high is None else high + 1
+                for rx in range(sheet.nrows):
+                    yield sheet.row_values(rx, low, end)
+            finally:
+                workbook.release_resources()
+
+class ODSHandler(FileHandler):
+    def read_rows(self):
+        # Stream content.xml rather than building an odfpy DOM of the document
+        from ufh_ods import iter_ods_rows
+        return iter_ods_rows(self.filename, 0 if self.sheet is None else self.sheet)
+
+    def read_projected(self, indexes):
+        # The text of the other cells is never extracted
+        from ufh_ods import iter_ods_rows
+        rows = iter_ods_rows(self.filename, 0 if self.sheet is None else self.sheet, set(indexes))
+        return map(projector(indexes), rows)
+
+    def sheet_names(self):
+        from ufh_ods import ods_sheet_names
+        return ods_sheet_names(self.filename)
+
+    def search_ods(self, pattern, with_hits=False, **options):
+        # Unlike search_csv, only the matching cells of each row are returned
         matches = []
         try:
-            ods_file = load(self.filename)
-            sheet = ods_file.spreadsheet.getElementsByType(Table)[0]
-            for row in sheet.getElementsByType(TableRow):
-                matched_row = []
-                for cell in row.getElementsByType(TableCell):
-                    cell_value = str(cell)
-                    if re.search(pattern, cell_value):
-                        matched_row.append(cell_value)
-                if matched_row:
-                    matches.append(matched_row)
+            matcher = self._compile(pattern) if pattern is not None else None
+            for row in self.iter_matches(matcher, **options):
+                matched_row = row if matcher is None else [cell for cell in row if matcher.search(cell)]
+                matches.append((matched_row, matcher.row_hits(matched_row)) if with_hits else matched_row)
             return matches
         except Exception as e:
             return f"Error occurred: {e}"
 
-    def search_column(self, column, pattern, output_choice='print', new_filename=DEFAULT_CSV_NAME):
-        unique_results = set()
-        try:
-            ods_file = load(self.filename)
-            sheet = ods_file.spreadsheet.getElementsByType(Table)[0]
-            for row in sheet.getElementsByType(TableRow):
-                cells = row.getElementsByType(TableCell)
-                if len(cells) > column:
-                    cell_value = str(cells[column])
-                    if re.search(pattern, cell_value):
-                        unique_results.add(cell_value)
-
-            if output_choice == 'print':
-                for result in unique_results:
-                    print(result)
-            elif output_choice == 'csv':
-                output_path = os.path.join(os.getcwd(), new_filename)
-                with open(output_path, mode='w', newline='', encoding='utf-8') as new_file:
-                    writer = csv.writer(new_file)
-                    for result in unique_results:
-                        writer.writerow([result])
-                return f"Search results saved to {output_path}"
-            return unique_results
-        except Exception as e:
-            return f"Error occurred: {e}"
+register_backend(CSV, lambda filename, cache: CSVHandler(filename), ('.csv', '.csv.gz', '.csv.bz2', '.csv.zst'), sniff_csv,
+                 weak=True)
+register_backend(XLS, lambda filename, cache: ExcelHandler(filename, XLS, cache), ('.xls',), sniff_xls, cacheable=True)
+register_backend(XLSX, lambda filename, cache: ExcelHandler(filename, XLSX, cache), ('.xlsx',), sniff_xlsx,
+                 cacheable=True)
+register_backend(ODS, lambda filename, cache: ODSHandler(filename, cache), ('.ods',), sniff_ods, cacheable=True)
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description="Handle CSV, Excel, and ODS files for various operations.")
-    parser.add_argument('filename', help='The file to process')
+    parser.add_argument('filename', nargs='*', help='The file to process; several files, directories or glob patterns are searched in parallel')
     parser.add_argument('--extract', nargs='+', help='Columns to extract. Provide column names separated by spaces.')
     parser.add_argument('--newfile', help='Name of the new file when extracting columns or saving search results')
     parser.add_argument('--search', help='String or regex to search in the entire file')
     parser.add_argument('--searchcol', help='Column to perform search on')
     parser.add_argument('--pattern', help='String or regex pattern to search for')
+    parser.add_argument('--patterns-file', help='File with one string or regex pattern per line, searched in a single pass')
+    parser.add_argument('--fixed-strings', action='store_true', help='Treat every pattern as a literal string')
+    parser.add_argument('--ignore-case', action='store_true', help='Match patterns without regard to case')
+    parser.add_argument('--sheets', help="Sheets to read: 'all' or comma-separated names (or zero-based numbers); several sheets are searched in parallel with --jobs")
+    parser.add_argument('--jobs', type=int, default=1, help='Number of worker processes used to scan CSV files, or to search several files at once')
+    parser.add_argument('--index', action='store_true', help='Answer --searchcol from a sidecar column index, building it if missing or stale')
+    parser.add_argument('--index-dir', help='Directory for column indexes instead of the directory of the file')
+    parser.add_argument('--follow', action='store_true',
+                        help='Search only the records appended to a CSV file since the previous run of the same search, merging --searchcol values with earlier ones')
+    parser.add_argument('--state-file', help='Checkpoint file of --follow instead of a hidden file next to the CSV file')
+    parser.add_argument('--unique-budget', type=float, default=DEFAULT_UNIQUE_BUDGET_MB, metavar='MB',
+                        help='Memory for the unique values of --searchcol, beyond which they are spilled to disk')
+    parser.add_argument('--spill-dir', help='Directory for the unique values spilled to disk instead of the temporary directory')
+    parser.add_argument('--counts', action='store_true',
+                        help='With --searchcol, count how often each (matching) value occurs, in bounded memory')
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP, help='Number of most frequent values reported by --counts')
+    parser.add_argument('--max-exact', type=int, default=DEFAULT_MAX_EXACT,
+                        help='Distinct values --counts keeps exact counts for before switching to estimates')
+    parser.add_argument('--engine', choices=ENGINES, default=ROW_ENGINE,
+                        help='Match row by row, or batch rows into columns and match whole columns at once')
+    parser.add_argument('--batch-rows', type=int, default=DEFAULT_BATCH_SIZE, help='Rows per batch of the vectorized engine')
+    parser.add_argument('--where', action='append', metavar='EXPR',
+                        help="Keep only rows meeting a condition on a column, e.g. 'host==evil.com' or 'size>=1024'; may be repeated")
+    query = parser.add_mutually_exclusive_group()
+    query.add_argument('--limit', type=int, metavar='N', help='Print only the first N matches, stopping the scan at the N-th')
+    query.add_argument('--count', action='store_true', help='Print the number of matches instead of the matches')
+    query.add_argument('--exists', action='store_true',
+                       help='Print whether there is a match, stopping at the first; the exit status is 1 when there is none')
+    query.add_argument('--sample', type=int, metavar='N', help='Print N matches drawn uniformly at random in a single scan')
+    parser.add_argument('--seed', type=int, help='Seed of --sample, for a reproducible sample')
     parser.add_argument('--output', choices=['print', 'csv'], default='print', help='Output choice for search results')
+    parser.add_argument('--format', choices=['list'] + list(SINKS), default='list',
+                        help='Print search results as one list once the scan is done, or stream them as lines, CSV or JSON lines')
+    parser.add_argument('--cache-dir', help='Directory for the columnar cache of spreadsheets instead of the directory of the file')
+    parser.add_argument('--no-cache', action='store_true', help='Always parse spreadsheets instead of reading or writing the columnar cache')
+    parser.add_argument('--cache-max-mb', type=float, default=DEFAULT_MAX_CACHE_MB, metavar='MB',
+                        help='Do not write a columnar cache larger than this')
+    parser.add_argument('--stats', nargs='?', const='text', choices=['text', 'json'],
+                        help='Report time per phase, rows scanned and matched, bytes read and peak memory on stderr')
+    parser.add_argument('--profile', action='store_true', help='Print the most expensive functions of the run on stderr')
+    parser.add_argument('--batch', metavar='JOB_FILE', help='JSON or YAML job file of operations to run in a single scan of each file')
+    parser.add_argument('--serve', metavar='ADDRESS', help='Run a query server on a Unix socket path or host:port, keeping parsed sheets in memory')
+    parser.add_argument('--serve-output-dir', metavar='DIR',
+                        help='Directory where --serve writes the output files of requests; without it, requests writing files are refused')
+    parser.add_argument('--allow-remote', action='store_true',
+                        help='Let --serve listen on an address other than loopback, although requests are not authenticated')
+    parser.add_argument('--server', metavar='ADDRESS', help='Send the operation to a query server started with --serve instead of reading the file here')
+    parser.add_argument('--cache-budget', type=float, default=DEFAULT_BUDGET_MB, metavar='MB',
+                        help='Memory for the parsed sheets kept by --serve')
     return parser.parse_args()
 
+def iter_multi_rows(results):
+    # Results of each file (or sheet) in input order; a failed one is reported on stderr and skipped
+    for source, file_results, error in results:
+        yield from file_results
+        if error is not None:
+            print(f"Error occurred: {source}: {error}", file=sys.stderr)
+
+def stream_multi_results(results, kind, with_hits=False):
+    stream_results(iter_multi_rows(results), kind, with_hits)
+
+def run_query(results, args, kind, with_hits=False, stats=None):
+    # --limit streams the first results and stops reading; --exists, --count
+    # and --sample print their answer once they have read what they need
+    if args.limit is not None:
+        stream_results(take(results, args.limit), kind, with_hits, stats)
+        return
+    try:
+        if args.exists:
+            found = any_result(results)
+            print(found)
+            if not found:
+                sys.exit(1)
+        elif args.count:
+            print(count_results(results))
+        else:
+            stream_results(reservoir_sample(results, args.sample, args.seed), kind, with_hits, stats)
+    except Exception as e:
+        print(f"Error occurred: {e}")
+
+def stream_results(results, kind, with_hits=False, stats=None):
+    # Write each result as soon as it is found; a closed pipe (e.g. `| head`) ends the scan
+    try:
+        sink = open_sink(kind)
+        with sink if stats is None else stats.writer(sink) as sink:
+            for result in results:
+                if with_hits:
+                    sink.writerow(*result)
+                else:
+                    sink.writerow(result)
+    except BrokenPipeError:
+        # Keep the interpreter from reporting the closed pipe again at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error occurred: {e}")
+
+def server_job(args):
+    # The operation of the command line as a job for a query server, with
+    # absolute paths since the server runs in its own directory. Patterns are
+    # sent rather than read by the server, and output files are written in
+    # the output directory of the server.
+    spec = {'fixed_strings': args.fixed_strings, 'ignore_case': args.ignore_case}
+    patterns = load_patterns(strip_quotes(args.patterns_file)) if args.patterns_file else None
+    newfile = strip_quotes(args.newfile) if args.newfile else DEFAULT_CSV_NAME
+    if args.extract:
+        spec.update(extract=args.extract, newfile=newfile)
+    elif args.searchcol:
+        spec.update(searchcol=strip_quotes(args.searchcol), output=args.output, newfile=newfile)
+        if patterns or args.pattern:
+            spec['pattern'] = patterns or strip_quotes(args.pattern)
+    elif args.search or patterns:
+        spec['search'] = patterns or strip_quotes(args.search)
+    return {'files': [os.path.abspath(strip_quotes(name)) for name in args.filename], 'operations': [spec]}
+
+def remote_unsupported(args):
+    # Options the server does not apply, rejected rather than silently dropped;
+    # query modes and formats are applied here to the results of a search
+    flags = [('--where', args.where), ('--engine', args.engine != ROW_ENGINE), ('--counts', args.counts),
+             ('--follow', args.follow), ('--index', args.index), ('--sheets', args.sheets),
+             ('--jobs', args.jobs > 1), ('--no-cache', args.no_cache), ('--cache-dir', args.cache_dir),
+             ('--cache-max-mb', args.cache_max_mb != DEFAULT_MAX_CACHE_MB), ('--stats', args.stats)]
+    if args.batch or args.extract or args.output == 'csv':
+        flags += [('--limit', args.limit is not None), ('--count', args.count), ('--exists', args.exists),
+                  ('--sample', args.sample is not None), ('--format', args.format != 'list')]
+    return [flag for flag, used in flags if used]
+
+def iter_remote_results(results):
+    # The values or rows found in each file; a failed file is reported on stderr
+    for job_filename, _, result in results:
+        if isinstance(result, list):
+            yield from result
+        else:
+            print(f"{job_filename}: {result}", file=sys.stderr)
+
+def run_remote(args):
+    unsupported = remote_unsupported(args)
+    if unsupported:
+        print(f"Error occurred: {', '.join(unsupported)} cannot be used with --server")
+        return
+    try:
+        if args.batch:
+            job = load_job(strip_quotes(args.batch))
+            job['files'].extend(strip_quotes(name) for name in args.filename)
+            job['files'] = [os.path.abspath(name) for name in job['files']]
+            for spec in job['operations']:
+                if spec.get('patterns_file'):
+                    spec['pattern' if 'searchcol' in spec else 'search'] = load_patterns(spec.pop('patterns_file'))
+        else:
+            job = server_job(args)
+        response = request(strip_quotes(args.server), job)
+    except (OSError, ValueError, ImportError) as e:
+        print(f"Error occurred: {e}")
+        return
+    if 'error' in response:
+        print(response['error'])
+        return
+    query = args.limit is not None or args.count or args.exists or args.sample is not None
+    if query or args.format != 'list':
+        results = iter_remote_results(response['results'])
+        if args.searchcol:
+            # Values found in several files are reported once
+            results = ([value] for value in _first_seen(results))
+        # Printed as the same run would print them without --server
+        if args.format != 'list':
+            kind = args.format
+        else:
+            kind = 'csv' if args.searchcol else 'lines'
+        if query:
+            run_query(results, args, kind)
+        else:
+            stream_results(results, kind)
+        return
+    for job_filename, spec, result in response['results']:
+        if args.batch or len(job['files']) > 1:
+            print(f"# {job_filename}: {json.dumps(spec)}")
+        if 'searchcol' in spec and spec.get('output') == 'print' and isinstance(result, list):
+            for value in result:
+                print(value)
+        else:
+            print(result)
+
+def print_counts(counter, top, kind):
+    if kind != 'list':
+        stream_results(([value, count] for value, count in counter.most_common(top)), kind)
+        return
+    for value, count in counter.most_common(top):
+        print(f"{count}\t{value}")
+    estimated = '' if counter.exact else ' (estimated)'
+    print(f"# {counter.total} values, {counter.distinct()} distinct{estimated}")
+
 def main():
     args = parse_arguments()
+    # The server does its own reading, so there is nothing to report here
+    stats = Stats() if args.stats and not args.server else None
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        run(args, stats)
+    finally:
+        if profiler is not None:
+            import pstats
+            profiler.disable()
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(PROFILE_LINES)
+        if stats is not None:
+            print(stats.format(args.stats), file=sys.stderr)
+
+def run(args, stats=None):
+    cache_dir = strip_quotes(args.cache_dir) if args.cache_dir else None
+    get_handler = partial(open_handler, cache_dir=cache_dir, use_cache=not args.no_cache, cache_max_mb=args.cache_max_mb)
+    if args.serve:
+        try:
+            serve(strip_quotes(args.serve), get_handler, args.cache_budget,
+                  strip_quotes(args.serve_output_dir) if args.serve_output_dir else None, args.allow_remote)
+        except (OSError, ValueError) as e:
+            print(f"Error occurred: {e}")
+        return
+    if args.server:
+        run_remote(args)
+        return
+    if args.batch:
+        try:
+            job = load_job(strip_quotes(args.batch))
+        except (OSError, ValueError, ImportError) as e:
+            print(f"Error occurred: {e}")
+            return
+        job['files'].extend(strip_quotes(name) for name in args.filename)
+        for job_filename, spec, result in run_job(job, partial(get_handler, stats=stats)):
+            print(f"# {job_filename}: {json.dumps(spec)}")
+            print(result)
+        return
+    if not args.filename:
+        print("Error occurred: no file to process")
+        return
 
-    filename = strip_quotes(args.filename)
+    filenames = [strip_quotes(name) for name in args.filename]
     searchcol = strip_quotes(args.searchcol) if args.searchcol else None
     pattern = strip_quotes(args.pattern) if args.pattern else None
     output = strip_quotes(args.output)
     newfile = strip_quotes(args.newfile) if args.newfile else DEFAULT_CSV_NAME
+    patterns_file = strip_quotes(args.patterns_file) if args.patterns_file else None
+
+    matcher = None
+    try:
+        where = [parse_filter(strip_quotes(expression)) for expression in args.where or ()]
+        if patterns_file:
+            matcher = compile_matcher(load_patterns(patterns_file), args.fixed_strings, args.ignore_case)
+        elif args.search or pattern:
+            matcher = compile_matcher(strip_quotes(args.search or pattern), args.fixed_strings, args.ignore_case)
+    except (OSError, ValueError, re.error) as e:
+        print(f"Error occurred: {e}")
+        return
+    # --where alone selects rows by their values, without a pattern
+    row_search = bool(args.search or (patterns_file and not searchcol) or (where and not searchcol))
+    # Modes answering from the stream of results without keeping all of it
+    query = args.limit is not None or args.count or args.exists or args.sample is not None
 
-    handler = UniversalHandler(filename).handler
+    targets = None
+    sheet = None
+    if args.sheets:
+        sheets = 'all' if args.sheets == 'all' else [name.strip() for name in strip_quotes(args.sheets).split(',')]
+        inputs = expand_inputs(filenames) if is_multi_file(filenames) else filenames
+        targets = expand_sheets(inputs, sheets, get_handler)
+        # A single sheet of a single file is read like the first sheet
+        if len(targets) == 1 and not is_multi_file(filenames):
+            sheet, targets = targets[0][1], None
+
+    if is_multi_file(filenames) or targets is not None:
+        if args.counts or where or args.index or args.follow:
+            print("Error occurred: --counts, --where, --index and --follow run on a single sheet of a single file")
+            return
+        if targets is None:
+            targets = expand_inputs(filenames)
+        if args.search or (patterns_file and not searchcol):
+            results = iter_multi_matches(targets, matcher, get_handler, args.jobs, bool(patterns_file))
+        elif searchcol and (pattern or patterns_file):
+            results = iter_multi_unique(targets, searchcol, matcher, get_handler, args.jobs)
+        else:
+            print("Error occurred: only --search and --searchcol can be run on several files or sheets")
+            return
+        kind = 'lines' if args.format == 'list' else args.format
+        if query:
+            run_query(iter_multi_rows(results), args, kind, with_hits=bool(patterns_file and not searchcol))
+            return
+        stream_multi_results(results, kind, with_hits=bool(patterns_file and not searchcol))
+        return
+
+    filename = filenames[0]
+    handler = UniversalHandler(filename, cache_dir, not args.no_cache, stats, sheet, args.cache_max_mb).handler
+    search = handler.search_ods if isinstance(handler, ODSHandler) else handler.search_csv
+    # Only CSV files are split across worker processes
+    scan_options = {'jobs': args.jobs} if isinstance(handler, CSVHandler) and args.jobs > 1 else {}
+    if args.follow:
+        if not isinstance(handler, CSVHandler):
+            print("Error occurred: --follow only reads CSV files")
+            return
+        scan_options = {'follow': True, 'state_file': strip_quotes(args.state_file) if args.state_file else None}
+    match_options = dict(scan_options)
+    if args.engine != ROW_ENGINE or where:
+        match_options.update(engine=args.engine, where=where, batch_size=args.batch_rows)
+    if args.index:
+        scan_options.update(use_index=True, index_dir=strip_quotes(args.index_dir) if args.index_dir else None)
 
     if args.extract and newfile:
         print(handler.extract_columns(args.extract, newfile))
-    elif args.search:
-        print(handler.search_ods(pattern))
-    elif searchcol and pattern:
-        print(handler.search_column(searchcol, pattern, output, new_filename=newfile))
+    elif row_search and query:
+        run_query(handler.iter_matches(matcher, with_hits=bool(patterns_file), **match_options),
+                  args, 'lines' if args.format == 'list' else args.format, with_hits=bool(patterns_file), stats=stats)
+    elif args.format != 'list' and row_search:
+        stream_results(handler.iter_matches(matcher, with_hits=bool(patterns_file), **match_options),
+                       args.format, with_hits=bool(patterns_file), stats=stats)
+    elif row_search:
+        if patterns_file:
+            results = search(matcher, with_hits=True, **match_options)
+            if isinstance(results, str):
+                print(results)
+                return
+            for row, hits in results:
+                print(f"{', '.join(hits)}\t{row}")
+        else:
+            print(search(matcher, **match_options))
+    elif searchcol and args.counts:
+        try:
+            counter = handler.count_values(searchcol, matcher if pattern or patterns_file else None, args.max_exact)
+        except Exception as e:
+            print(f"Error occurred: {e}")
+            return
+        print_counts(counter, args.top, args.format)
+    elif searchcol and (pattern or patterns_file) and query:
+        # Unique values in the order they are first found, so that --limit and --exists stop early
+        run_query(([value] for value in handler.iter_unique(searchcol, matcher, **scan_options)),
+                  args, 'csv' if args.format == 'list' else args.format, stats=stats)
+    elif searchcol and (pattern or patterns_file):
+        scan_options.update(budget_mb=args.unique_budget, spill_dir=strip_quotes(args.spill_dir) if args.spill_dir else None)
+        if args.format != 'list':
+            try:
+                unique = handler.unique_values(searchcol, matcher, **scan_options)
+            except Exception as e:
+                print(f"Error occurred: {e}")
+                return
+            with unique:
+                stream_results(([value] for value in unique), args.format, stats=stats)
+            return
+        print(handler.search_column(searchcol, matcher, output, new_filename=newfile, **scan_options))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,207 @@
+"""
+Vectorized matching engine (--engine vectorized).
+
+The row engine calls the matcher once per row, so a scan is dominated by
+interpreter overhead. This engine reads rows in batches and matches a whole
+batch with one call (see Matcher.matching_rows): literals are found in a
+single pass over the joined rows of the batch, and regexes are mapped over
+each column of the batch in C. When pyarrow is installed, searches for
+case-sensitive literals only use its compute kernels instead.
+
+Filters (--where) select rows on the value of a column:
+
+    host==evil.com    status!=200    size>=1024    date<2024-01-01
+
+== and != compare numbers when both sides are numbers, and text otherwise;
+<, <=, > and >= compare numbers when the value is a number, and text
+otherwise (so ISO dates compare as expected). A cell that cannot be compared
+fails the filter. Columns are resolved against the header row by name, then
+as a zero-based number or a column letter.
+
+Both engines return the same rows in the same order.
+"""
+import operator
+import re
+from itertools import chain, compress, count, islice
+
+from ufh_match import ROW_SEPARATOR, is_literal
+from ufh_rows import cell_at, resolve_column
+
+ROW_ENGINE = 'row'
+VECTORIZED_ENGINE = 'vectorized'
+ENGINES = (ROW_ENGINE, VECTORIZED_ENGINE)
+DEFAULT_BATCH_SIZE = 4096
+
+FILTER_EXPRESSION = re.compile(r'^(.+?)\s*(==|!=|<=|>=|<|>|=)\s*(.*)$')
+OPERATORS = {
+    '==': operator.eq,
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class Filter:
+    """
+    A comparison of one column with a value.
+
+    Attributes:
+        column (str): The column name, number or letter.
+        op (str): The comparison operator.
+        value (str): The value compared with.
+    """
+    def __init__(self, column, op, value):
+        self.column = column
+        self.op = op
+        self.value = value
+        self._compare = OPERATORS[op]
+        self._number = _number(value)
+        self.index = None
+
+    def __repr__(self):
+        return f'Filter({self.column!r}, {self.op!r}, {self.value!r})'
+
+    def bind(self, header):
+        """
+        Resolve the column against the header row.
+        """
+        self.index = resolve_column(header, self.column)
+        return self
+
+    def test(self, cell):
+        """
+        Tell whether a cell passes the filter.
+        """
+        if cell is None:
+            return False
+        if self._number is not None:
+            number = _number(cell)
+            if number is not None:
+                return self._compare(number, self._number)
+            if self.op not in ('==', '=', '!='):
+                return False
+        return self._compare(cell if isinstance(cell, str) else str(cell), self.value)
+
+    def select(self, batch, indexes):
+        """
+        Return the indexes, among those given, of the rows of a batch passing
+        the filter.
+        """
+        test, index = self.test, self.index
+        return [i for i in indexes if test(cell_at(batch[i], index))]
+
+
+def parse_filter(expression):
+    """
+    Parse a filter expression such as 'host==evil.com' or 'size>=1024'.
+
+    Raises:
+        ValueError: If the expression is not a comparison.
+    """
+    match = FILTER_EXPRESSION.match(expression)
+    if match is None:
+        raise ValueError(f"Invalid filter: {expression}")
+    column, op, value = match.groups()
+    return Filter(column.strip(), op, value)
+
+
+def filter_rows(rows, filters):
+    """
+    Yield the rows passing every filter, one row at a time, the filters being
+    resolved against the first row (the header).
+    """
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        return
+    filters = [f.bind(header) for f in filters]
+    for row in chain([header], rows):
+        if all(f.test(cell_at(row, f.index)) for f in filters):
+            yield row
+
+
+def iter_batches(rows, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Yield lists of up to batch_size rows.
+    """
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _arrow_kernel(matcher):
+    # pyarrow matches substrings exactly like `in` only for case-sensitive literals
+    if matcher.ignore_case:
+        return None
+    if not all(p and (matcher.fixed_strings or is_literal(p)) for p in matcher.patterns):
+        return None
+    # Imported here, as loading pyarrow costs more than most scans that never use it
+    try:
+        import pyarrow
+        import pyarrow.compute
+    except ImportError:
+        return None
+    words = list(dict.fromkeys(matcher.patterns))
+
+    def matching_rows(rows):
+        try:
+            texts = list(map(ROW_SEPARATOR.join, rows))
+        except TypeError:
+            texts = [ROW_SEPARATOR.join(map(str, row)) for row in rows]
+        array = pyarrow.array(texts, type=pyarrow.string())
+        mask = None
+        for word in words:
+            hit = pyarrow.compute.match_substring(array, pattern=word)
+            mask = hit if mask is None else pyarrow.compute.or_(mask, hit)
+        return set(compress(count(), mask.to_pylist()))
+    return matching_rows
+
+
+def iter_vector_matches(rows, matcher=None, with_hits=False, filters=(), batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Stream the rows in which any pattern matches any cell and which pass every
+    filter, matching a batch of rows at a time.
+
+    Args:
+        rows (iterable): The rows, header row first.
+        matcher (Matcher): The patterns, or None to select rows by filters only.
+        with_hits (bool): Yield (row, patterns) pairs instead of rows.
+        filters (list of Filter): Conditions every selected row must meet.
+        batch_size (int): Rows per batch.
+
+    Yields:
+        The matching rows, or (row, patterns) pairs, in file order.
+    """
+    kernel = None
+    if matcher is not None:
+        kernel = _arrow_kernel(matcher) or matcher.matching_rows
+    bound = False
+    for batch in iter_batches(rows, batch_size):
+        if not bound:
+            filters = [f.bind(batch[0]) for f in filters]
+            bound = True
+        selected = range(len(batch)) if kernel is None else sorted(kernel(batch))
+        for f in filters:
+            selected = f.select(batch, selected)
+        for i in selected:
+            if with_hits:
+                yield batch[i], matcher.row_hits(batch[i])
+            else:
+                yield batch[i]
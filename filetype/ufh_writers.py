@@ -0,0 +1,234 @@
+"""
+Streaming row writers for the Universal File Handler.
+
+Rows are flushed to disk as they are written rather than collected in an
+in-memory workbook, so the output size is not bounded by RAM. The format is
+chosen from the extension of the output file.
+
+CSV output is compressed when the file name ends with a compression
+extension (see ufh_compress).
+
+Sinks write search results to a stream (stdout by default) one row at a time,
+as lines, CSV or JSON lines, so that output starts with the first match.
+"""
+import csv
+import html
+import io
+import json
+import numbers
+import sys
+
+from ufh_compress import compression_of_name, open_output
+
+ODS_MIMETYPE = 'application/vnd.oasis.opendocument.spreadsheet'
+ODS_MANIFEST = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<manifest:manifest xmlns:manifest="urn:oasis:names:tc:opendocument:xmlns:manifest:1.0" manifest:version="1.2">'
+    f'<manifest:file-entry manifest:full-path="/" manifest:media-type="{ODS_MIMETYPE}"/>'
+    '<manifest:file-entry manifest:full-path="content.xml" manifest:media-type="text/xml"/>'
+    '</manifest:manifest>'
+)
+ODS_CONTENT_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<office:document-content'
+    ' xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0"'
+    ' xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0"'
+    ' xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0"'
+    ' office:version="1.2"><office:body><office:spreadsheet>'
+)
+ODS_CONTENT_TAIL = '</table:table></office:spreadsheet></office:body></office:document-content>'
+
+
+class RowWriter:
+    """
+    Base class for writers that append rows to a file one at a time.
+
+    Attributes:
+        filename (str): The name of the output file.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def writerow(self, row):
+        raise NotImplementedError
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def close(self):
+        pass
+
+
+class CSVRowWriter(RowWriter):
+    """
+    Writes rows to a CSV file.
+    """
+    def __init__(self, filename):
+        super().__init__(filename)
+        self._file = open_output(filename)
+        self._writer = csv.writer(self._file)
+
+    def writerow(self, row):
+        self._writer.writerow(['' if cell is None else cell for cell in row])
+
+    def close(self):
+        self._file.close()
+
+
+class XLSXRowWriter(RowWriter):
+    """
+    Writes rows to an XLSX file through an openpyxl write-only workbook, which
+    spools rows to a temporary file instead of keeping cell objects around.
+    """
+    def __init__(self, filename):
+        super().__init__(filename)
+        from openpyxl import Workbook
+        self._wb = Workbook(write_only=True)
+        self._ws = self._wb.create_sheet()
+
+    def writerow(self, row):
+        self._ws.append(list(row))
+
+    def close(self):
+        self._wb.save(self.filename)
+
+
+class ODSRowWriter(RowWriter):
+    """
+    Writes rows to an ODS file by streaming content.xml straight into the
+    zip archive.
+    """
+    def __init__(self, filename, sheet_name='Sheet1'):
+        super().__init__(filename)
+        import zipfile
+        self._zip = zipfile.ZipFile(filename, mode='w', compression=zipfile.ZIP_DEFLATED)
+        # The mimetype entry must come first and be stored uncompressed
+        self._zip.writestr(zipfile.ZipInfo('mimetype'), ODS_MIMETYPE, compress_type=zipfile.ZIP_STORED)
+        self._zip.writestr('META-INF/manifest.xml', ODS_MANIFEST)
+        self._content = io.TextIOWrapper(self._zip.open('content.xml', mode='w'), encoding='utf-8')
+        self._content.write(ODS_CONTENT_HEAD)
+        self._content.write(f'<table:table table:name="{html.escape(sheet_name)}">')
+
+    @staticmethod
+    def _cell(value):
+        if value is None or value == '':
+            return '<table:table-cell/>'
+        if isinstance(value, numbers.Number) and not isinstance(value, bool):
+            return (f'<table:table-cell office:value-type="float" office:value="{value}">'
+                    f'<text:p>{value}</text:p></table:table-cell>')
+        paragraphs = ''.join(f'<text:p>{html.escape(line, quote=False)}</text:p>' for line in str(value).split('\n'))
+        return f'<table:table-cell office:value-type="string">{paragraphs}</table:table-cell>'
+
+    def writerow(self, row):
+        self._content.write('<table:table-row>' + ''.join(self._cell(cell) for cell in row) + '</table:table-row>')
+
+    def close(self):
+        self._content.write(ODS_CONTENT_TAIL)
+        self._content.close()
+        self._zip.close()
+
+
+class Sink:
+    """
+    Base class for sinks writing result rows to a text stream.
+
+    Attributes:
+        stream (file object): Where rows are written; stdout by default.
+    """
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def writerow(self, row, hits=None):
+        raise NotImplementedError
+
+    def close(self):
+        self.stream.flush()
+
+
+class LinesSink(Sink):
+    """
+    Writes each row on its own line, preceded by the matching patterns if any.
+    """
+    def writerow(self, row, hits=None):
+        prefix = f"{', '.join(hits)}\t" if hits else ''
+        self.stream.write(f'{prefix}{list(row)}\n')
+
+
+class CSVSink(Sink):
+    """
+    Writes each row as a CSV record, with the matching patterns as an extra
+    first field if any.
+    """
+    def __init__(self, stream=None):
+        super().__init__(stream)
+        self._writer = csv.writer(self.stream)
+
+    def writerow(self, row, hits=None):
+        cells = ['' if cell is None else cell for cell in row]
+        self._writer.writerow(['|'.join(hits)] + cells if hits else cells)
+
+
+class JSONLSink(Sink):
+    """
+    Writes each row as a JSON array, or as an object with 'row' and
+    'patterns' keys when the matching patterns are given.
+    """
+    def writerow(self, row, hits=None):
+        record = {'row': list(row), 'patterns': hits} if hits else list(row)
+        self.stream.write(json.dumps(record, default=str, ensure_ascii=False) + '\n')
+
+
+SINKS = {
+    'lines': LinesSink,
+    'csv': CSVSink,
+    'jsonl': JSONLSink,
+}
+
+
+def open_sink(kind, stream=None):
+    """
+    Open a streaming sink for result rows.
+
+    Args:
+        kind (str): 'lines', 'csv' or 'jsonl'.
+        stream (file object): Where to write; stdout by default.
+
+    Returns:
+        Sink: A sink to use as a context manager.
+    """
+    return SINKS[kind](stream)
+
+
+def open_row_writer(filename):
+    """
+    Open a streaming row writer for a file, based on its extension.
+
+    Args:
+        filename (str): The output file; '.xlsx' and '.ods' select those
+            formats, anything else is written as CSV, compressed when the
+            name ends with '.gz', '.bz2' or '.zst'.
+
+    Returns:
+        RowWriter: A writer to use as a context manager.
+    """
+    lower = filename.lower()
+    if compression_of_name(lower) is not None:
+        return CSVRowWriter(filename)
+    if lower.endswith('.xlsx'):
+        return XLSXRowWriter(filename)
+    elif lower.endswith('.ods'):
+        return ODSRowWriter(filename)
+    return CSVRowWriter(filename)